@@ -3,11 +3,13 @@
 #
 #  Author: Maurik Holtrop - 2020
 #
-#  This file currently only contains one class "Resistor" which helps with computations involving resistors.
+#  This file contains the class "Resistor" which helps with computations involving resistors, and the
+#  class "ResistorArray" which does the same computations for whole arrays of resistors at once.
 #
 #
 import numbers
 import math
+import numpy as np
 
 
 class Resistor:
@@ -19,6 +21,8 @@ class Resistor:
         self.p_max = power
 
     def __add__(self, other):        # Implement the "+" operation.
+        if isinstance(other, ResistorArray):
+            return ResistorArray(self.r, self.p_max) + other
         value = self.r + other.r
         if math.isinf(self.r) or math.isinf(other.r):
             power = 0.
@@ -35,6 +39,8 @@ class Resistor:
         if isinstance(other, numbers.Number) or \
                 isinstance(other, numbers.Real):         # But if other is a number, then multiply.
             return Resistor(self.r * other, self.p_max * other)  # Power rating for n series is just n*p
+        if isinstance(other, ResistorArray):
+            return ResistorArray(self.r, self.p_max) * other
         if self.r == 0 or other.r == 0:
             return Resistor(0, math.inf)                # A zero ohm resistor has infinite power :-)
         elif math.isinf(self.r):
@@ -118,3 +124,166 @@ class Resistor:
         else:
             print("Error - we cannot have negative power.")
             self._power = 0
+
+
+class ResistorArray:
+    """An array of resistors, with the same rules as the Resistor class, but computed with numpy for all the
+    resistors at once. The resistance and power arrays are broadcast against each other, and so are the
+    arrays in a series (+) or parallel (*) combination, so tables of combinations can be made in one go:
+
+        E12 = ResistorArray([1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2])
+        table = E12[:, np.newaxis] + E12[np.newaxis, :]     # All 12x12 series combinations.
+    """
+
+    def __init__(self, resistance=0., power=1./8.):
+        if isinstance(resistance, Resistor):
+            resistance, power = resistance.r, resistance.p_max
+        elif isinstance(resistance, ResistorArray):
+            resistance, power = resistance.r, resistance.p_max
+        elif len(np.shape(resistance)) > 0 and len(resistance) > 0 and isinstance(resistance[0], Resistor):
+            power = [x.p_max for x in resistance]              # A list of Resistor objects.
+            resistance = [x.r for x in resistance]
+        r, p = np.broadcast_arrays(np.asarray(resistance, dtype=float), np.asarray(power, dtype=float))
+        self.r = r
+        self.p_max = p
+
+    @property
+    def r(self):
+        return self._resistance
+
+    @r.setter
+    def r(self, r_new):
+        r_new = np.array(r_new, dtype=float)
+        if np.any(r_new < 0):
+            print("Error, you cannot have a negative resistance. (At least not here.)")
+            r_new[r_new < 0] = 0
+        self._resistance = r_new
+
+    @property
+    def p_max(self):
+        return self._power
+
+    @p_max.setter
+    def p_max(self, power):
+        power = np.array(power, dtype=float)
+        if np.any(power < 0):
+            print("Error - we cannot have negative power.")
+            power[power < 0] = 0
+        self._power = power
+
+    @staticmethod
+    def _as_array(other):                            # Turn a Resistor into a ResistorArray.
+        if isinstance(other, ResistorArray):
+            return other
+        return ResistorArray(other)
+
+    def __add__(self, other):                        # Series combination, same rules as Resistor.__add__
+        other = self._as_array(other)
+        ra, pa, rb, pb = self.r, self.p_max, other.r, other.p_max
+        with np.errstate(divide='ignore', invalid='ignore'):
+            power = np.minimum(pa / ra, pb / rb) * (ra + rb)   # I_max squared times R.
+        power = np.where(np.isinf(ra) | np.isinf(rb), 0.,
+                         np.where(ra == 0, pb, np.where(rb == 0, pa, power)))
+        return ResistorArray(ra + rb, power)
+
+    def __radd__(self, other):                       # For Resistor + ResistorArray and sum().
+        if isinstance(other, numbers.Number) and other == 0:
+            return self
+        return self._as_array(other) + self
+
+    def __mul__(self, other):                        # Parallel combination, or multiply by a number.
+        if isinstance(other, numbers.Number):
+            return ResistorArray(self.r * other, self.p_max * other)
+        other = self._as_array(other)
+        ra, pa, rb, pb = self.r, self.p_max, other.r, other.p_max
+        zero = (ra == 0) | (rb == 0)                  # A zero ohm resistor has infinite power :-)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            value = ra * rb / (ra + rb)
+            power = np.minimum(pa * ra, pb * rb) * (1 / ra + 1 / rb)   # V_max squared times 1/R.
+        value = np.where(zero, 0., np.where(np.isinf(ra), rb, np.where(np.isinf(rb), ra, value)))
+        power = np.where(zero, math.inf, np.where(np.isinf(ra), pb, np.where(np.isinf(rb), pa, power)))
+        return ResistorArray(value, power)
+
+    def __or__(self, other):
+        return self.__mul__(other)
+
+    def __rmul__(self, other):                       # 2*R, or Resistor*ResistorArray
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        if isinstance(other, numbers.Number):
+            return ResistorArray(self.r / other, self.p_max)
+        other = self._as_array(other)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(other.r == 0, math.inf, self.r / other.r)   # Returns numbers, inf for open.
+
+    def __floordiv__(self, other):
+        if isinstance(other, numbers.Number):
+            return ResistorArray(self.r // other, self.p_max)
+        other = self._as_array(other)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(other.r == 0, math.inf, self.r // other.r)
+
+    def __rtruediv__(self, other):
+        return other / self.r
+
+    def __rfloordiv__(self, other):
+        return other // self.r
+
+    def series(self, axis=-1):
+        """Combine all the resistors along axis in series."""
+        return self._reduce(ResistorArray.__add__, axis)
+
+    def parallel(self, axis=-1):
+        """Combine all the resistors along axis in parallel."""
+        return self._reduce(ResistorArray.__mul__, axis)
+
+    def _reduce(self, operation, axis):
+        r = np.moveaxis(self.r, axis, 0)
+        p = np.moveaxis(self.p_max, axis, 0)
+        out = ResistorArray(r[0], p[0])
+        for i in range(1, r.shape[0]):
+            out = operation(out, ResistorArray(r[i], p[i]))
+        return out
+
+    def power_i(self, current):                      # Calculate the power used for current I.
+        return current * current * self.r
+
+    def check_power_i(self, current):
+        return self.power_i(current) < self.p_max
+
+    def power_v(self, v_in):                         # Calculate the power used if connected to voltage V
+        with np.errstate(divide='ignore'):
+            return v_in * v_in / self.r
+
+    def check_power_v(self, v_in):
+        return self.power_v(v_in) < self.p_max
+
+    @property
+    def shape(self):
+        return self.r.shape
+
+    def __len__(self):
+        return len(self.r)
+
+    def __getitem__(self, index):                    # Slicing returns a ResistorArray.
+        return ResistorArray(self.r[index], self.p_max[index])
+
+    def reshape(self, *shape):
+        return ResistorArray(self.r.reshape(*shape), self.p_max.reshape(*shape))
+
+    def ravel(self):
+        return ResistorArray(self.r.ravel(), self.p_max.ravel())
+
+    def resistor(self, index):                       # Return a single element as a Resistor object.
+        return Resistor(float(self.r[index]), float(self.p_max[index]))
+
+    def to_list(self):
+        """Return a list of Resistor objects, for a 1D array."""
+        return [Resistor(float(r), float(p)) for r, p in zip(self.r.ravel(), self.p_max.ravel())]
+
+    def __str__(self):
+        return "ResistorArray(r=" + str(self.r) + "Ω, p_max=" + str(self.p_max) + "W)"
+
+    def __repr__(self):
+        return "ResistorArray(" + repr(self.r) + ", " + repr(self.p_max) + ")"
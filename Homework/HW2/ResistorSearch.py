@@ -0,0 +1,286 @@
+#
+#  ResistorSearch.py
+#
+#  Author: Maurik Holtrop
+#
+#  Find networks of 1 to 4 standard (E12, E24 or E96) resistors that come closest to a target resistance.
+#  The networks are built with the series (+) and parallel (|) rules of the Resistor and ResistorArray classes
+#  in Electronics.py, including the rules for the power rating of the network.
+#
+#  Trying all combinations of 4 resistors from E96 over 5 decades is 480^4 = 5e10 networks, which is far too many.
+#  Instead, this uses a "meet-in-the-middle" search:
+#    * A table of all 2 resistor networks (series and parallel) is made once per E-series, and sorted by resistance.
+#      The tables are cached, so the next search with the same series is fast.
+#    * For a network "X op Y" with a target T, the Y that is needed for each X can be calculated:
+#      T - X for series, or 1/(1/T - 1/X) for parallel. A binary search (np.searchsorted) in the sorted table
+#      finds the Y values closest to it, for all X at once.
+#    * 3 resistors: X is a single resistor, Y a 2 resistor network.
+#      4 resistors: X and Y are both 2 resistor networks, or X is a single resistor and Y is a 3 resistor network
+#      (a single resistor combined with a 2 resistor network), for which the target is worked out in two steps.
+#
+#  Usage:
+#      from ResistorSearch import find_networks
+#      for net in find_networks(1234., tolerance=0.001, power=0.25, series='E24')[3]:
+#          print(net)
+#
+import functools
+import sys
+import time
+import numpy as np
+from Electronics import ResistorArray
+
+E12 = [1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2]
+E24 = [1.0, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
+       3.3, 3.6, 3.9, 4.3, 4.7, 5.1, 5.6, 6.2, 6.8, 7.5, 8.2, 9.1]
+E96 = [1.00, 1.02, 1.05, 1.07, 1.10, 1.13, 1.15, 1.18, 1.21, 1.24, 1.27, 1.30,
+       1.33, 1.37, 1.40, 1.43, 1.47, 1.50, 1.54, 1.58, 1.62, 1.65, 1.69, 1.74,
+       1.78, 1.82, 1.87, 1.91, 1.96, 2.00, 2.05, 2.10, 2.15, 2.21, 2.26, 2.32,
+       2.37, 2.43, 2.49, 2.55, 2.61, 2.67, 2.74, 2.80, 2.87, 2.94, 3.01, 3.09,
+       3.16, 3.24, 3.32, 3.40, 3.48, 3.57, 3.65, 3.74, 3.83, 3.92, 4.02, 4.12,
+       4.22, 4.32, 4.42, 4.53, 4.64, 4.75, 4.87, 4.99, 5.11, 5.23, 5.36, 5.49,
+       5.62, 5.76, 5.90, 6.04, 6.19, 6.34, 6.49, 6.65, 6.81, 6.98, 7.15, 7.32,
+       7.50, 7.68, 7.87, 8.06, 8.25, 8.45, 8.66, 8.87, 9.09, 9.31, 9.53, 9.76]
+SERIES = {"E12": E12, "E24": E24, "E96": E96}
+
+SERIES_OP = 0
+PARALLEL_OP = 1
+_OP_SYMBOL = [" + ", " | "]
+
+
+def format_ohm(r):
+    """Format a resistance the way it is printed on a schematic: 470, 4.7k, 1M"""
+    for scale, unit in ((1e6, "M"), (1e3, "k"), (1., "")):
+        if r >= scale:
+            return "{:.3g}{}".format(r / scale, unit)
+    return "{:.3g}".format(r)
+
+
+class Network:
+    """A resistor network found by the search."""
+
+    def __init__(self, r, p_max, target, text, resistors):
+        self.r = r
+        self.p_max = p_max
+        self.error = r / target - 1.         # Relative error.
+        self.text = text
+        self.resistors = resistors           # The values of the resistors used.
+
+    @property
+    def n(self):
+        return len(self.resistors)
+
+    def __str__(self):
+        return f"{self.text:40s} = {self.r:.6g}Ω ({100 * self.error:+.4f}%), {self.p_max:.3g}W"
+
+    def __repr__(self):
+        return "Network(" + self.text + ")"
+
+
+def series_values(series="E24", decades=(1, 2, 3, 4, 5)):
+    """Return the sorted array of resistor values in series for the given powers of 10.
+    The default decades give 10Ω to 910kΩ (for E24)."""
+    base = np.array(SERIES[series])
+    return np.sort(np.concatenate([np.round(base * 10. ** k, 6) for k in decades]))
+
+
+@functools.lru_cache(maxsize=8)
+def _tables(series, decades, power):
+    """Make the table of single resistors and the sorted table of all 2 resistor networks.
+    The result is cached, per series, decades and power rating."""
+    r1 = series_values(series, decades)
+    p1 = np.full_like(r1, power)
+    i, j = np.triu_indices(len(r1))     # All unordered pairs, including twice the same value.
+    pair = ResistorArray(r1[i], p1[i]), ResistorArray(r1[j], p1[j])
+    s = pair[0] + pair[1]
+    p = pair[0] * pair[1]
+    r2 = np.concatenate((s.r, p.r))
+    p2 = np.concatenate((s.p_max, p.p_max))
+    ops = np.concatenate((np.full(len(i), SERIES_OP), np.full(len(i), PARALLEL_OP)))
+    order = np.argsort(r2, kind="stable")
+    table = {
+        "r1": r1, "p1": p1,
+        "r2": r2[order], "p2": p2[order], "i2": np.concatenate((i, i))[order], "j2": np.concatenate((j, j))[order],
+        "op2": ops[order]
+    }
+    for arr in table.values():
+        arr.setflags(write=False)      # The tables are shared by all the searches.
+    return table
+
+
+def _combine(op, ra, pa, rb, pb):
+    """Combine two arrays of resistors in series (op=0) or parallel (op=1), with the Resistor power rules."""
+    a = ResistorArray(ra, pa)
+    b = ResistorArray(rb, pb)
+    c = a + b if op == SERIES_OP else a * b
+    return c.r, c.p_max
+
+
+def _partner(op, x, target):
+    """The value Y needed so that X op Y = target. inf if there is no such Y."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if op == SERIES_OP:
+            y = target - x
+        else:
+            y = x * target / (x - target)
+    return np.where(y > 0, y, np.inf)
+
+
+def _nearest(sorted_r, want, k):
+    """Binary search for the k values on either side of each value in want.
+    Returns an array of shape (len(want), 2k) with indices into sorted_r."""
+    idx = np.searchsorted(sorted_r, want)
+    return np.clip(idx[:, np.newaxis] + np.arange(-k, k), 0, len(sorted_r) - 1)
+
+
+class _Candidates:
+    """Collects the candidate networks for one number of resistors."""
+
+    def __init__(self, target, tolerance, power):
+        self.target = target
+        self.tolerance = tolerance
+        self.power = power
+        self.parts = []
+
+    def add(self, r, p, describe, *keys):
+        """Add the candidates with resistances r and power ratings p. describe(*key) builds the Network text."""
+        err = np.abs(r / self.target - 1.)
+        ok = (err <= self.tolerance) & (p >= self.power)
+        self.parts.append((r[ok], p[ok], err[ok], describe, [key[ok] for key in keys]))
+
+    def best(self, results):
+        """Return the best networks, sorted by error, and then by larger power rating."""
+        found = []
+        for r, p, err, describe, keys in self.parts:
+            m = 20 * results                               # Extra, since some will be duplicates.
+            if len(err) > m:                               # Only sort the best ones.
+                sel = np.argpartition(err, m)[:m]
+                order = sel[np.lexsort((-p[sel], err[sel]))]
+            else:
+                order = np.lexsort((-p, err))
+            order = order[:4 * results]
+            for n in order:
+                text, resistors = describe(*[int(key[n]) for key in keys])
+                found.append((err[n], -p[n], text, Network(float(r[n]), float(p[n]), self.target, text,
+                                                            resistors)))
+        found.sort(key=lambda x: x[:3])
+        out = []
+        seen = set()
+        for item in found:
+            net = item[3]
+            key = (round(net.r, 9), tuple(sorted(net.resistors)))
+            if key not in seen:
+                seen.add(key)
+                out.append(net)
+            if len(out) == results:
+                break
+        return out
+
+
+def find_networks(target, tolerance=0.01, power=0., series="E24", decades=(1, 2, 3, 4, 5), resistor_power=0.25,
+                  derating=1., max_resistors=4, results=5, neighbors=2):
+    """Find the best networks of 1 up to max_resistors resistors for the resistance target.
+    Input:
+     * target         = the resistance wanted in Ω.
+     * tolerance      = the largest relative error allowed, 0.01 = 1%.
+     * power          = the power the network must be able to dissipate in W.
+     * series         = "E12", "E24" or "E96".
+     * decades        = the powers of 10 of the resistor values to use.
+     * resistor_power = the power rating of the individual resistors in W.
+     * derating       = the fraction of the power rating that may be used, e.g. 0.5 to stay at half the rating.
+     * results        = the number of networks returned for each number of resistors.
+     * neighbors      = the number of table values on either side of the exact match that are tried.
+    Returns a dictionary {n: [Network, ...]} for n = 1 .. max_resistors."""
+    t = _tables(series, tuple(decades), resistor_power * derating)
+    r1, p1 = t["r1"], t["p1"]
+    r2, p2, i2, j2, op2 = t["r2"], t["p2"], t["i2"], t["j2"], t["op2"]
+    k = neighbors
+
+    def text2(n):
+        return format_ohm(r1[i2[n]]) + _OP_SYMBOL[op2[n]] + format_ohm(r1[j2[n]]), [r1[i2[n]], r1[j2[n]]]
+
+    out = {}
+    cand = _Candidates(target, tolerance, power)
+    idx = _nearest(r1, np.array([target]), k).ravel()
+    cand.add(r1[idx], p1[idx], lambda n: (format_ohm(r1[n]), [r1[n]]), idx)
+    out[1] = cand.best(results)
+
+    if max_resistors >= 2:
+        cand = _Candidates(target, tolerance, power)
+        idx = _nearest(r2, np.array([target]), k).ravel()
+        cand.add(r2[idx], p2[idx], text2, idx)
+        out[2] = cand.best(results)
+
+    if max_resistors >= 3:                           # Single resistor X op 2 resistor network Y.
+        cand = _Candidates(target, tolerance, power)
+        for op in (SERIES_OP, PARALLEL_OP):
+            y = _nearest(r2, _partner(op, r1, target), k)
+            x = np.repeat(np.arange(len(r1)), y.shape[1])
+            y = y.ravel()
+            r, p = _combine(op, r1[x], p1[x], r2[y], p2[y])
+
+            def text3(a, b, op=op):
+                inner, res = text2(b)
+                return format_ohm(r1[a]) + _OP_SYMBOL[op] + "(" + inner + ")", [r1[a]] + res
+            cand.add(r, p, text3, x, y)
+        out[3] = cand.best(results)
+
+    if max_resistors >= 4:
+        cand = _Candidates(target, tolerance, power)
+        for op in (SERIES_OP, PARALLEL_OP):          # 2 resistor network X op 2 resistor network Y.
+            y = _nearest(r2, _partner(op, r2, target), k)
+            x = np.repeat(np.arange(len(r2)), y.shape[1])
+            y = y.ravel()
+            r, p = _combine(op, r2[x], p2[x], r2[y], p2[y])
+
+            def text4a(a, b, op=op):
+                left, res_a = text2(a)
+                right, res_b = text2(b)
+                return "(" + left + ")" + _OP_SYMBOL[op] + "(" + right + ")", res_a + res_b
+            cand.add(r, p, text4a, x, y)
+
+        d, a = np.divmod(np.arange(len(r1) * len(r1)), len(r1))   # All pairs of single resistors.
+        for outer in (SERIES_OP, PARALLEL_OP):       # D outer (A middle Y), with Y a 2 resistor network.
+            t1 = _partner(outer, r1[d], target)
+            for middle in (SERIES_OP, PARALLEL_OP):
+                y = _nearest(r2, _partner(middle, r1[a], t1), k)
+                n = np.repeat(np.arange(len(d)), y.shape[1])
+                y = y.ravel()
+                rm, pm = _combine(middle, r1[a[n]], p1[a[n]], r2[y], p2[y])
+                r, p = _combine(outer, r1[d[n]], p1[d[n]], rm, pm)
+
+                def text4b(dd, aa, b, outer=outer, middle=middle):
+                    inner, res = text2(b)
+                    return (format_ohm(r1[dd]) + _OP_SYMBOL[outer] + "(" + format_ohm(r1[aa]) + _OP_SYMBOL[middle] +
+                            "(" + inner + "))", [r1[dd], r1[aa]] + res)
+                cand.add(r, p, text4b, d[n], a[n], y)
+        out[4] = cand.best(results)
+    return out
+
+
+def main(argv):
+    """Find networks for a target resistance, and time the search.
+    Usage: python ResistorSearch.py target [tolerance] [power] [series]"""
+    target = float(argv[1]) if len(argv) > 1 else 1234.
+    tolerance = float(argv[2]) if len(argv) > 2 else 0.001
+    power = float(argv[3]) if len(argv) > 3 else 0.
+    series = argv[4] if len(argv) > 4 else "E96"
+
+    start = time.perf_counter()
+    _tables(series, (1, 2, 3, 4, 5), 0.25)
+    t_tables = time.perf_counter() - start
+    start = time.perf_counter()
+    found = find_networks(target, tolerance, power, series)
+    t_search = time.perf_counter() - start
+    for n, nets in found.items():
+        print(f"{n} resistor(s):")
+        for net in nets:
+            print("   ", net)
+    print(f"Tables for {series}: {t_tables:.3f}s (cached after the first search), search: {t_search:.3f}s")
+    start = time.perf_counter()
+    for target in np.logspace(2, 5, 20):
+        find_networks(target, tolerance, power, series)
+    print(f"Average search time for 20 targets: {(time.perf_counter() - start) / 20:.3f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -31,14 +31,17 @@ try:
     from DevLib import SN74HC165, MAX7219
 except ImportError:
     pass
+from DevLib.OnlineStats import FrequencyStats
 import time
 import sys
-import math
 import csv
 
 Counter_Clear = 17
 Counter_Gate = 16
 
+Run_Time = 3600*1  # Run for 1 hour.
+Csv_Every = 1      # Write every Csv_Every-th row to the csv file. Set to 0 for no csv file.
+
 
 Serial_In = 18   # GPIO pin for the SER pin of the shifter
 Serial_CLK = 19   # GPIO pin for the CLK pin of the shifter
@@ -100,25 +103,27 @@ def main():
     sys.stdout.flush()
 
 # To store the data in a csv file.
-    fout = open("counter_dat.csv", "w")
-    wr = csv.writer(fout)
-    df_cols = ["idx", "count", "dtime", "freq", "freq_now", "freq_now_ave", "freq_now_sigma"]
-    wr.writerow(df_cols)
+    fout = None
+    if Csv_Every:
+        fout = open("counter_dat.csv", "w")
+        wr = csv.writer(fout)
+        df_cols = ["idx", "count", "dtime", "freq", "freq_now", "freq_now_ave", "freq_now_sigma"]
+        wr.writerow(df_cols)
     clear_counter()
     itt = 0
-    freq_now_sum = 0
-    freq_now_ssq = 0
+    stats = FrequencyStats(tau0=1.)  # Mean, sigma, drift and Allan deviation in constant memory.
 
     time_start = time.time()
     GPIO.output(Counter_Gate, 1)  # Start the counter
     last_count = 0
     last_now = time_start
     try:
-        while time_now < time_start+3600*1:  # Run for 1 hour
+        while time_now < time_start + Run_Time:
             itt += 1
             time.sleep(0.9976)              # Sleep for not quite 1 second while the counter counts.
             count = load_and_shift()
             now = time.time()
+            time_now = now
             diff_count = count-last_count
             diff_time = now-last_now
             last_count = count
@@ -127,25 +132,32 @@ def main():
             freq = count/dt
             freq_now = diff_count/diff_time
             if itt != 1:                  # The first call often has extra count(s), so skip in the averaging.
-                freq_now_sum += freq_now
-                freq_now_ssq += freq_now*freq_now
-                freq_now_ave = freq_now_sum/itt
-                freq_now_sigma = math.sqrt(freq_now_ssq/itt - freq_now_ave*freq_now_ave)
+                stats.add(freq_now, dt)
+                freq_now_ave = stats.mean
+                freq_now_sigma = stats.std if stats.n > 1 else 0.
                 M.write_float(freq)
                 print("{:14d} ({:9d}), {:12.4f} ({:4.3f}), {:16.8f}, {:16.8f}, {:16.8f}+/-{:12.8f} "
                       .format(count, diff_count, dt, diff_time, freq, freq_now, freq_now_ave, freq_now_sigma))
                 # Print the itteration and the counts.
                 sys.stdout.flush()
-                wr.writerow([itt, count, dt, freq, freq_now, freq_now_ave, freq_now_sigma])
+                if Csv_Every and itt % Csv_Every == 0:
+                    wr.writerow([itt, count, dt, freq, freq_now, freq_now_ave, freq_now_sigma])
     except KeyboardInterrupt:
         print("Interrupted.")
     except Exception as e:
         print("Error")
         print(e)
     finally:
-        fout.close()
+        if fout is not None:
+            fout.close()
         cleanup()
 
+    print("Mean frequency: {:16.8f} +/- {:12.8f} Hz, drift: {:12.4e} +/- {:9.1e} Hz/s".format(
+        stats.mean, stats.std, stats.drift, stats.drift_error))
+    print("Allan deviation:")
+    for tau, adev, n in zip(*stats.allan.result()):
+        print("  tau = {:8.0f} s  sigma = {:12.8f} Hz  ({} terms)".format(tau, adev, n))
+
 
 if __name__ == "__main__":
     main()
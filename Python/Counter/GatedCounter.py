@@ -17,6 +17,9 @@
 #     bits from the Serial_In.
 #  8) Print the resulting number to the screen.
 #
+# Steps 2) to 7) are done by the DevLib.GatedCounter class, which opens and closes the gate at
+# precise deadlines and measures the actual gate time, so the counts can be converted to a rate.
+#
 # Notes:
 #     * When using the SN74HC193 chip for counting, you can gate by
 #       sending the Counter_Gate signal to the "down" clock, and the Clock
@@ -28,7 +31,7 @@
 #
 try:
     import RPi.GPIO as GPIO
-    from DevLib import SN74HC165, MAX7219
+    from DevLib import SN74HC165, MAX7219, GatedCounter
 except ImportError:
     pass
 import time
@@ -36,6 +39,7 @@ import sys
 
 Counter_Clear = 17
 Counter_Gate = 16
+Gate_Time = 2.0    # Gate time in seconds.
 
 
 Serial_In = 18   # GPIO pin for the SER pin of the shifter
@@ -54,21 +58,21 @@ Max_cs_bar = 6
 
 S = None  # Placeholder, make sure you run Setup() before using.
 M = None
+C = None
 
 
 def setup():
     """Set the RPi to read the shifters and communucate with the MAX7219 """
     global S
     global M
+    global C
 
     GPIO.setmode(GPIO.BCM)  # Set the numbering scheme to correspond to numbers on Pi Wedge.
 
     S = SN74HC165(Serial_In, Serial_CLK, Serial_Load, Serial_N)  # Initialize serial shifter.
     M = MAX7219(Max_data, Max_clock, Max_cs_bar)                 # Initialize the display.
 
-    GPIO.setup(Counter_Clear, GPIO.OUT)                          # Set the Clear and Gate to output.
-    GPIO.setup(Counter_Gate, GPIO.OUT)
-    GPIO.output(Counter_Gate, 0)
+    C = GatedCounter(S, Counter_Gate, Counter_Clear, gate_time=Gate_Time)  # Sets up the Clear and Gate pins.
     clear_counter()
 
 
@@ -99,13 +103,9 @@ def main():
     try:
         while True:
             itt += 1
-            clear_counter()                 # Clear the counter
-            GPIO.output(Counter_Gate, 1)    # Start the counter by opening the gate.
-            time.sleep(1.9989611300233423)  # Sleep for not quite 1 second while the counter counts.
-            GPIO.output(Counter_Gate, 0)    # Stop the counter.
-            count = load_and_shift()        # Load the data from the shifter.
+            count, duration = C.gate()      # Clear, open the gate for Gate_Time, close and read out.
             M.write_int(count)               # Write it to the display.
-            print("{:04d}, {:6d}".format(itt, count))  # Print the iteration and the counts.
+            print("{:04d}, {:6d}, {:12.9f}, {:14.4f}".format(itt, count, duration, C.rate(count, duration)))
             sys.stdout.flush()
             time.sleep(1.)                 # Wait a sec before starting again.
 
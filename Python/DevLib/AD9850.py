@@ -23,15 +23,7 @@
 # The phase bits shift the output by 11.25 degrees time the value.
 #
 import time
-try:
-    import RPi.GPIO as GPIO
-except ImportError:
-    pass
-
-try:
-    import Adafruit_BBIO as GPIO
-except ImportError:
-    pass
+from DevLib.backends import GPIO
 
 
 class AD9850:
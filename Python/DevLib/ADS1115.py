@@ -67,10 +67,8 @@
 #   * Further reduce the number of reads of the control register.
 #
 import time
-try:
-    import smbus
-except ImportError:
-    pass
+from DevLib.backends import smbus
+from DevLib.Profiling import profiled
 
 from DevLib.MyValues import MyValues
 
@@ -285,6 +283,16 @@ class ADS1115(object):
         """Return the stored fullscale setting"""
         return self._FSR
 
+    @profiled
+    def _wait_conversion(self):
+        """Wait for the single shot conversion to complete."""
+        time.sleep(1/self._data_rate + 0.0001)
+        conv_done = False
+        while not conv_done:
+            control = self._read_control()
+            conv_done = ((control & 0x8000) > 0)   # Check bit 15
+
+    @profiled
     def read_adc(self, inchan=None):
         """Read the ADC for given input, without changing other settings in the control register.
         If inchan=None, read the current input.
@@ -303,11 +311,7 @@ class ADS1115(object):
             control = self._read_control()
             control |= 0b01 << 15         # Set Bit 15, going out of low power mode.
             self._set_control(control)  # Start conversion.
-            time.sleep(1/self._data_rate + 0.0001)
-            conv_done = False
-            while not conv_done:
-                control = self._read_control()
-                conv_done = ((control & 0x8000) > 0)   # Check bit 15
+            self._wait_conversion()
             adc_raw = self._read_adc()
             return adc_raw
         else:
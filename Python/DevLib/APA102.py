@@ -21,20 +21,9 @@
 # However, if you want this to run glitch free at high data rates and full brightness,
 # 5V power and logic are recommended.
 #
-try:
-    import RPi.GPIO as GPIO
-except ImportError:
-    pass
-try:
-    import Adafruit_BBIO as GPIO
-except ImportError:
-    pass
-
-try:
-    import spidev
-    import DevLib.BBSpiDev
-except ImportError:
-    pass
+from DevLib.backends import spidev
+from DevLib.Profiling import profiled
+from DevLib import BBSpiDev
 
 import colorsys
 import numpy as np
@@ -94,6 +83,7 @@ class APA102(np.ndarray):
         obj._CLK = clk
         obj._dev = None
         obj._brightness = 31
+        obj._hdr_error = None
 
         return obj
 
@@ -109,6 +99,7 @@ class APA102(np.ndarray):
         self._CLK = getattr(obj, '_CLK', None)
         self._dev = getattr(obj, '_dev', None)
         self._brightness = getattr(obj, '_brightness', None)
+        self._hdr_error = getattr(obj, '_hdr_error', None)
 
     def __init__(self, input_array, cs=None, clk=None, mosi=None):
         """ Initialization that only gets called for new instances, not copies.
@@ -125,7 +116,7 @@ class APA102(np.ndarray):
             self._dev = spidev.SpiDev(0, self._CS)
             self._dev.max_speed_hz = self._CLK
         else:
-            self._dev = BBSpiDev.BBSpiDev(self._CS, self._CLK, self._MOSI, None)
+            self._dev = BBSpiDev(self._CS, self._CLK, self._MOSI, None)
 
     def __str__(self):
         out = "[\n"
@@ -200,6 +191,7 @@ class APA102(np.ndarray):
 
         self.itemset(loc, rgb_color)
 
+    @profiled
     def show(self):
         """Sends the content of the pixel buffer to the strip.
         Todo: More than 1024 LEDs requires more than one xfer operation.
@@ -217,13 +209,71 @@ class APA102(np.ndarray):
         # In the process we create a copy, which for spidev is good thing.
         # If you run the clock at 8MHz, it takes 6 to 7 ms for show() with 256 LEDs on an RPi3.
         # SPI takes up to 4096 Integers. So we are fine for up to 1024 LEDs.
-        self._dev.writebytes([int(i) for x in self.ravel() for i in [(0xe0 | ((x >> 24) & 0x1F)), (x >> 16) & 0xFF,
-                                                                     (x >> 8) & 0xFF, x & 0xFF]])
+        # The unpacking is done with numpy on the whole array at once, which is a lot faster than the
+        # list comprehension this used to be, and needed to keep up with set_hdr() at high frame rates.
+        self._dev.writebytes(self.to_bytes().tolist())
         # To ensure that all the data gets to all the LEDS, we need to
         # continue clocking. The easiest way to do so is by sending zeros.
         # Round up num_led/2 bits (or num_led/16 bytes)
         self._dev.writebytes([0]*((self.size + 15) // 16))
 
+    def to_bytes(self):
+        """Return the LED frames (without start and end frame) as a numpy uint8 array.
+        Each LED is sent as [0xE0 | brightness, blue, green, red]."""
+        x = self.ravel().view(np.ndarray).astype(np.uint32)
+        frame = np.empty((x.size, 4), dtype=np.uint8)
+        frame[:, 0] = 0xE0 | ((x >> 24) & 0x1F)
+        frame[:, 1] = (x >> 16) & 0xFF
+        frame[:, 2] = (x >> 8) & 0xFF
+        frame[:, 3] = x & 0xFF
+        return frame.ravel()
+
+    @profiled
+    def set_hdr(self, intensity, dither=True):
+        """Set all the LEDs from linear intensities, using the 5-bit brightness and the 8-bit color
+        together for about 13 bits of dynamic range.
+        params:
+        intensity :  array with shape self.shape + (3,) of (r,g,b) intensities.
+                     Floats are in [0.,1.], uint16 values are in [0,65535].
+                     An intensity of 1. corresponds to full color at the global brightness.
+        dither    :  If True, carry the quantization error over to the next frame (temporal dithering),
+                     so that the time averaged intensity is correct to better than one color step.
+
+        For each pixel, the brightness level is chosen as the smallest level that can still show the
+        brightest channel of that pixel. The color values are then scaled up to use the full 8-bits.
+        This gives the most precision for dim pixels. All computations are done on the whole array.
+        The pixels will be shown with the show() function.
+        """
+        intensity = np.asarray(intensity)
+        if intensity.shape != self.shape + (3,):
+            raise ValueError("set_hdr requires an array of shape {}".format(self.shape + (3,)))
+        if intensity.dtype.kind in 'ui':
+            target = intensity.astype(np.float64) / 65535.
+        else:
+            target = intensity.astype(np.float64)
+
+        if dither:
+            if self._hdr_error is None or self._hdr_error.shape != target.shape:
+                self._hdr_error = np.zeros(target.shape, dtype=np.float64)
+            target += self._hdr_error
+        np.clip(target, 0., 1., out=target)
+
+        # Pick the brightness level per pixel and scale the colors to fill 8-bits at that level.
+        level_max = max(int(self._brightness), 1)
+        level = np.clip(np.ceil(target.max(axis=-1) * level_max), 1, level_max).astype(np.uint32)
+        scale = (255. * level_max) / level[..., np.newaxis]
+        color = np.clip(np.rint(target * scale), 0, 255)
+
+        if dither:
+            self._hdr_error = target - color / scale
+
+        color = color.astype(np.uint32)
+        self.view(np.ndarray)[...] = (level << 24) | (color[..., 2] << 16) | (color[..., 1] << 8) | color[..., 0]
+
+    def hdr_reset(self):
+        """Forget the accumulated dithering error of set_hdr()."""
+        self._hdr_error = None
+
     def cleanup(self):
         """Release the SPI device; Call this method at the end"""
         self._dev.close()  # Close SPI port
@@ -32,14 +32,8 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
-try:
-    import RPi.GPIO as GPIO             # Import the Raspberry Pi version of GPIO
-except ImportError:
-    try:
-        import Adafruit_BBIO as GPIO    # If you are using a Beagle Bone.
-    except ImportError:
-        print("This error can occur if you are on the RPi but using python instead of python3.")
-        raise RuntimeError("It seems that no GPIO system was found. Please check your installation.")
+from DevLib.backends import GPIO           # RPi.GPIO, Adafruit_BBIO.GPIO or the simulator.
+from DevLib.Profiling import profiled
 
 import operator
 
@@ -152,6 +146,7 @@ class BBSpiDev(object):
         """max_speed_hz is not implemented """
         print("max_speed_hz is ignored for software SPI")
 
+    @profiled
     def writebytes(self, data, assert_ss=True, deassert_ss=True):
         """Half-duplex SPI write.  If assert_ss is True, the SS line will be
         asserted low, the specified bytes will be clocked out the MOSI line, and
@@ -176,6 +171,7 @@ class BBSpiDev(object):
         if deassert_ss and self._cs is not None:
             GPIO.output(self._cs, 1)
 
+    @profiled
     def readbytes(self, length, assert_ss=True, deassert_ss=True):
         """Half-duplex SPI read.  If assert_ss is true, the SS line will be
         asserted low, the specified length of bytes will be clocked in the MISO
@@ -218,14 +214,15 @@ class BBSpiDev(object):
        Bytes of data are transferred and between each byte the CS line is
        deasserted and reasserted (0->1 1->0) to indicate next byte.
        """
-        return self.transer(data, xfer_mode=1)
+        return self.transfer(data, xfer_mode=1)
 
     def xfer2(self, data):
         """Simulate the xfer2 (transfer data without cs toggle) function of spidev.
        Bytes of data are transferred as one continuous bitstream.
        """
-        return self.transer(data, xfer_mode=2)
+        return self.transfer(data, xfer_mode=2)
 
+    @profiled
     def transfer(self, data, assert_ss=True, deassert_ss=True, xfer_mode=1):
         """Full-duplex SPI read and write.  If assert_ss is true, the SS line
         will be asserted low, the specified bytes will be clocked out the MOSI
@@ -235,7 +232,7 @@ class BBSpiDev(object):
         """
         if self._mosi is None:
             raise RuntimeError('Write attempted with no MOSI pin specified.')
-        if self._mosi is None:
+        if self._miso is None:
             raise RuntimeError('Read attempted with no MISO pin specified.')
         if self._cs is None or (xfer_mode == 1 and (not deassert_ss or not assert_ss)):
             raise RuntimeError('xfer_mode=1 must lower and raise the CS pin.')
@@ -272,9 +269,9 @@ class BBSpiDev(object):
                         result[i] &= ~self._read_shift(self._mask, j)
 
             if xfer_mode == 1 and self._cs is not None:
-                GPIO.output(self._ss, 1)
-                GPIO.output(self._ss, 0)
+                GPIO.output(self._cs, 1)
+                GPIO.output(self._cs, 0)
 
         if deassert_ss and self._cs is not None:
-            GPIO.output(self._ss, 1)
+            GPIO.output(self._cs, 1)
         return result
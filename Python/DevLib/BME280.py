@@ -29,7 +29,8 @@
 # The output of this code was compared 1 to 1 with the BME280_FLOAT_ENABLE version of the
 # C master driver provided by Bosch.
 
-import smbus
+from DevLib.backends import smbus
+from DevLib.Profiling import profiled
 import time
 from ctypes import c_short
 from ctypes import c_byte
@@ -243,6 +244,7 @@ class BME280:
         self._Cal_H.append(c_short((calbuf2[5] << 4) | (calbuf2[4] >> 4)).value)
         self._Cal_H.append(c_byte(calbuf2[6]).value)
 
+    @profiled
     def read_data_raw(self):
         """Internal method that reads the raw data from the device and returns it as a list,
         containting: [Raw Temperature,Raw Pressure, Raw Humidity]"""
@@ -331,6 +333,13 @@ class BME280:
 
         return self.humidity
 
+    @profiled
+    def _wait_measurement(self):
+        """Wait for a forced measurement to complete, i.e. for the device to return to sleep mode."""
+        while self.get_mode() > 0:
+            time.sleep(0.001)
+
+    @profiled
     def read_data(self):
         """Read the Temperature, Pressure and Humidity (if BME device) from the device,
         and return the calibrated values.
@@ -345,8 +354,7 @@ class BME280:
             self.set_mode(1)     # Trigger a measurement.
             mode = 1
         if mode == 1 or mode == 2:   # Wait for conversion.
-            while self.get_mode() > 0:
-                time.sleep(0.001)
+            self._wait_measurement()
 
         # Ready - Read and process the data.
         raw = self.read_data_raw()
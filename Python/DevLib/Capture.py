@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+#
+# Triggered capture, like an oscilloscope, for the MCP320x ADC.
+#
+# The ADC is read in blocks of conversions with MCP320x.capture(), each block in one batched SPI transfer.
+# Every block is searched for the trigger with numpy, without a Python loop over the samples, and the last
+# `pre` samples are kept in a ring buffer, so that the capture contains the signal before the trigger.
+#
+# Triggers:
+#  * "edge"  - the signal crosses level in the direction of slope ("rising" or "falling"). With hysteresis > 0
+#              the signal must first go beyond level -/+ hysteresis, so that noise does not re-trigger.
+#  * "level" - the first sample at or above level ("rising") or at or below level ("falling").
+# Modes:
+#  * "normal" - wait for a trigger.
+#  * "auto"   - wait for a trigger at most auto_timeout seconds, then capture without a trigger.
+#  * "single" - wait for a trigger, then stop until arm() is called again.
+#
+# Each capture is returned as a numpy record with the fields:
+#   time          - the time (time.time()) of the trigger sample.
+#   triggered     - False if an "auto" capture timed out.
+#   channel, level, trigger_index (= pre, the index of the trigger sample in the arrays), dt (sample interval),
+#   t             - the time of each sample relative to the trigger, array of pre+post.
+#   value         - the ADC values, array of pre+post.
+# run(n) returns n captures in a numpy record array, which can be saved with numpy.save().
+#
+# Example code:
+#
+#   from DevLib import MCP320x
+#   from DevLib.Capture import TriggeredCapture
+#   adc = MCP320x(0)
+#   scope = TriggeredCapture(adc, channel=0, level=2048, pre=100, post=400, mode="normal")
+#   rec = scope.acquire(timeout=1.)
+#   print(rec.time, rec.t[rec.trigger_index], rec.value[rec.trigger_index])
+#
+# Author: Maurik Holtrop
+#
+import time
+
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed size ring buffer of the last `size` values written, for numpy arrays."""
+
+    def __init__(self, size, dtype=float):
+        self._buf = np.zeros(size, dtype=dtype)
+        self._pos = 0
+        self.count = 0
+
+    def clear(self):
+        self._pos = 0
+        self.count = 0
+
+    def write(self, values):
+        """Add the values to the buffer, overwriting the oldest ones."""
+        size = len(self._buf)
+        n = len(values)
+        if size == 0:
+            return
+        if n >= size:
+            self._buf[:] = values[n - size:]
+            self._pos = 0
+        else:
+            end = self._pos + n
+            if end <= size:
+                self._buf[self._pos:end] = values
+            else:
+                self._buf[self._pos:] = values[:size - self._pos]
+                self._buf[:end - size] = values[size - self._pos:]
+            self._pos = end % size
+        self.count = min(self.count + n, size)
+
+    def last(self, n):
+        """Return the last n values written, oldest first."""
+        n = min(n, self.count)
+        if n == 0:
+            return self._buf[:0].copy()
+        start = self._pos - n
+        if start >= 0:
+            return self._buf[start:self._pos].copy()
+        return np.concatenate((self._buf[start:], self._buf[:self._pos]))
+
+
+def capture_dtype(n):
+    """The numpy dtype of a capture of n samples."""
+    return np.dtype([("time", "f8"), ("triggered", "?"), ("channel", "i2"), ("level", "i4"),
+                     ("trigger_index", "i4"), ("dt", "f8"), ("t", "f8", (n,)), ("value", "i2", (n,))])
+
+
+class TriggeredCapture:
+    """Capture engine with pre-trigger buffer for an MCP320x.
+    Input:
+     * adc          = the MCP320x, or any object with a capture(channel, n) method that returns n ADC values.
+     * channel      = the channel to capture and trigger on.
+     * level        = the trigger level in ADC units, e.g. int(volts / adc.vref * adc.get_value_max()).
+     * slope        = "rising" or "falling".
+     * trigger      = "edge" or "level".
+     * pre, post    = number of samples before the trigger and from the trigger sample on.
+     * mode         = "auto", "normal" or "single".
+     * block        = number of conversions read at once.
+     * hysteresis   = for an edge trigger, how far (ADC units) the signal must be on the other side of level first.
+     * auto_timeout = time in seconds after which "auto" mode captures without a trigger."""
+
+    MODES = ("auto", "normal", "single")
+
+    def __init__(self, adc, channel=0, level=2048, slope="rising", trigger="edge", pre=128, post=384,
+                 mode="auto", block=256, hysteresis=0, auto_timeout=0.1):
+        if mode not in self.MODES:
+            raise ValueError("Unknown mode: {}, must be one of {}".format(mode, self.MODES))
+        if slope not in ("rising", "falling"):
+            raise ValueError("Unknown slope: {}, must be 'rising' or 'falling'".format(slope))
+        if trigger not in ("edge", "level"):
+            raise ValueError("Unknown trigger: {}, must be 'edge' or 'level'".format(trigger))
+        self.adc = adc
+        self.channel = channel
+        self.level = level
+        self.slope = slope
+        self.trigger = trigger
+        self.pre = pre
+        self.post = max(post, 1)
+        self.mode = mode
+        self.block = block
+        self.hysteresis = hysteresis
+        self.auto_timeout = auto_timeout
+        self.dtype = capture_dtype(self.pre + self.post)
+        self._values = RingBuffer(pre, np.int32)
+        self._times = RingBuffer(pre, np.float64)
+        self._state = 0
+        self.armed = True
+
+    def arm(self):
+        """Arm the trigger again after a "single" capture."""
+        self.armed = True
+
+    def _read_block(self):
+        """Read a block of conversions. Returns the values and the time of each sample, interpolated
+        between the start and end of the transfer."""
+        start = time.time()
+        values = np.asarray(self.adc.capture(self.channel, self.block), dtype=np.int32)
+        end = time.time()
+        times = start + (np.arange(len(values)) + 0.5) * ((end - start) / max(len(values), 1))
+        return values, times
+
+    def find_triggers(self, values):
+        """Return the indices of the samples in values where the trigger fires. For an edge trigger, the state
+        at the end of the previous block is carried over, so a crossing on a block boundary is found."""
+        x = values if self.slope == "rising" else -values
+        level = self.level if self.slope == "rising" else -self.level
+        if self.trigger == "level":
+            return np.flatnonzero(x >= level)
+        # State of each sample: -1 below level - hysteresis (armed), 1 at or above level, 0 in between.
+        state = np.zeros(len(x) + 1, dtype=np.int8)
+        state[0] = self._state
+        state[1:][x < level - self.hysteresis] = -1
+        state[1:][x >= level] = 1
+        # For each sample, the index of the last sample before it with a non-zero state.
+        last = np.maximum.accumulate(np.where(state != 0, np.arange(len(state)), 0))
+        previous = state[last[:-1]]
+        self._state = state[last[-1]]
+        return np.flatnonzero((state[1:] == 1) & (previous == -1))
+
+    def _record(self, values, times, index, triggered):
+        """Make the capture record with the trigger at index in values."""
+        rec = np.zeros(1, dtype=self.dtype).view(np.recarray)[0]
+        n = self.pre + self.post
+        rec.time = times[index]
+        rec.triggered = triggered
+        rec.channel = self.channel
+        rec.level = self.level
+        rec.trigger_index = self.pre
+        rec.dt = (times[-1] - times[0]) / (len(times) - 1) if len(times) > 1 else 0.
+        rec.t = times[index - self.pre:index - self.pre + n] - times[index]
+        rec.value = values[index - self.pre:index - self.pre + n]
+        return rec
+
+    def _finish(self, values, times, index, triggered):
+        """Complete a capture with the trigger at index of the current block: prepend the ring buffer and read
+        blocks until there are post samples from the trigger on."""
+        before = self.pre - index
+        if before > 0:
+            values = np.concatenate((self._values.last(before), values))
+            times = np.concatenate((self._times.last(before), times))
+            index += before
+        needed = index + self.post - len(values)
+        if needed > 0:
+            more_values, more_times = [values], [times]
+            while needed > 0:
+                v, t = self._read_block()
+                more_values.append(v)
+                more_times.append(t)
+                needed -= len(v)
+            values = np.concatenate(more_values)
+            times = np.concatenate(more_times)
+        return self._record(values, times, index, triggered)
+
+    def acquire(self, timeout=None):
+        """Wait for a trigger and return the capture record. Returns None if there was no trigger within timeout
+        seconds ("normal" or "single" mode), or if a "single" capture was done and arm() was not called.
+        The pre-trigger buffer is filled first, so the trigger can fire after `pre` samples at the earliest."""
+        if not self.armed:
+            return None
+        self._values.clear()
+        self._times.clear()
+        self._state = 0
+        seen = 0
+        start = time.monotonic()
+        while True:
+            values, times = self._read_block()
+            hits = self.find_triggers(values)
+            hits = hits[hits + seen >= self.pre]
+            if len(hits):
+                if self.mode == "single":
+                    self.armed = False
+                return self._finish(values, times, int(hits[0]), True)
+            self._values.write(values)
+            self._times.write(times)
+            seen += len(values)
+            elapsed = time.monotonic() - start
+            if self.mode == "auto" and elapsed > self.auto_timeout and seen >= self.pre:
+                return self._finish(values[:0], times[:0], 0, False)
+            if timeout is not None and elapsed > timeout:
+                return None
+
+    def __iter__(self):
+        """Iterate over the captures. Stops after a "single" capture or a timeout."""
+        while True:
+            rec = self.acquire()
+            if rec is None:
+                return
+            yield rec
+
+    def run(self, n, timeout=None):
+        """Acquire n captures and return them as a numpy record array. Stops early on a timeout."""
+        out = np.zeros(n, dtype=self.dtype).view(np.recarray)
+        for i in range(n):
+            rec = self.acquire(timeout)
+            if rec is None:
+                return out[:i]
+            out[i] = rec
+        return out
+
+
+def main(argv):
+    """Capture a few triggers on channel 0 of an MCP3208 on SPI CE0, or of the simulated one with DEVLIB_BACKEND=sim,
+    and print the trigger times and the signal around the trigger."""
+    from DevLib import MCP320x
+    adc = MCP320x(0)
+    level = int(argv[1]) if len(argv) > 1 else 2048
+    scope = TriggeredCapture(adc, channel=0, level=level, pre=100, post=400, mode="normal", hysteresis=20)
+    start = time.perf_counter()
+    captures = scope.run(10, timeout=2.)
+    elapsed = time.perf_counter() - start
+    for rec in captures:
+        i = rec.trigger_index
+        print("{:.6f} triggered={} dt={:.2f} us  values around trigger: {}".format(
+            rec.time, rec.triggered, rec.dt * 1e6, rec.value[i - 3:i + 3]))
+    print("{} captures in {:.3f} s".format(len(captures), elapsed))
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv)
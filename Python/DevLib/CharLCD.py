@@ -31,6 +31,22 @@
 #
 # Data is written to the HD44780 in two 4-bit nibbles.
 #
+# Each nibble takes three writes to the PCF8574: set the data, raise EN, lower EN. Rather than doing each
+# of these as a separate I2C transaction with a sleep() in between, the writes for a whole character,
+# or a whole line of characters, are collected into one sequence and sent as a single I2C transaction.
+# The PCF8574 updates its outputs after each byte it receives, and at 100 kHz one byte takes about 90 us
+# on the bus, which is more than enough for the EN pulse width (450 ns) and the execution time of
+# a character write (37 us). Only the clear and home commands (1.52 ms) need an explicit wait.
+# Optionally, the busy flag of the HD44780 can be read back instead, see wait_busy().
+#
+# The driver keeps a shadow copy of what is on the screen (the DDRAM of the HD44780) and of the cursor
+# position. When printing, only the characters that actually change are sent, with a cursor move only
+# where the next changed character is not already at the cursor.
+#
+# The HD44780 has only 8 slots for custom characters (CGRAM). The custom_chars() method manages these
+# slots as a least-recently-used cache: a glyph is only uploaded if it is not already in a slot, and
+# all the uploads for one call are sent in a single transaction.
+#
 # Acknowledgements:
 # -----------------
 # This is an adaptation of code found at the
@@ -44,12 +60,15 @@
 # # 2015-02-10, ver 0.1
 #
 
+from DevLib.backends import smbus
+from DevLib.Profiling import profiled
 try:
-    import smbus
+    from smbus2 import i2c_msg    # If available, allows for a single transaction of any length.
 except ImportError:
-    print("NO SMBUS class found. You must not be on the Raspberry Pi!")
+    i2c_msg = None
 
-from time import sleep
+from collections import OrderedDict
+from time import sleep, monotonic
 
 
 class CharLCD:
@@ -102,38 +121,100 @@ class CharLCD:
     Rs = 0b00000001  # Register select bit
 
     # initializes objects and lcd
-    def __init__(self, address=0x027, port=1):
+    def __init__(self, address=0x027, port=1, busy_check=False):
+        """Initialize the display at I2C address on I2C bus port.
+        If busy_check=True, the busy flag of the display is read back before each transaction,
+        rather than relying on the I2C transaction time and fixed waits."""
         self._bus = smbus.SMBus(port)
         self._address = address
+        self._busy_check = busy_check
+        self._use_rdwr = i2c_msg is not None and hasattr(self._bus, "i2c_rdwr")
+        self._backlight = self.BACKLIGHT
+        self._make_tables()
 
-        self._write_byte(0x03)
-        self._write_byte(0x03)
-        self._write_byte(0x03)
-        self._write_byte(0x02)
+        for cmd in (0x03, 0x03, 0x03, 0x02):
+            self._write_byte(cmd)
+            sleep(0.005)
 
         self._write_byte(self.FUNCTIONSET | self.LCD_2LINE | self.LCD_5x8DOTS | self.LCD_4BITMODE)
         self._write_byte(self.DISPLAYCONTROL | self.DISPLAYON)
         self._write_byte(self.CLEARDISPLAY)
+        if not self._busy_check:
+            sleep(0.002)          # Clear takes 1.52 ms to execute. With busy_check, _send() waits for it.
         self._write_byte(self.ENTRYMODESET | self.ENTRYLEFT)
+        self._reset_shadow()
+        self._cgram = OrderedDict()   # glyph -> slot, least recently used first.
         sleep(0.2)
 
-    # clocks EN to latch command
-    def _strobe(self, data):
-        self._bus.write_byte(self._address, data | self.En | self.BACKLIGHT)
-        sleep(.0005)
-        self._bus.write_byte(self._address, ((data & ~self.En) | self.BACKLIGHT))
-        sleep(.0001)
+    def _reset_shadow(self):
+        """Set the shadow of the screen to all spaces with the cursor at home, as after a clear."""
+        self._ddram = [bytearray(b" " * 20) for i in range(4)]
+        self._stale = [False] * 4     # True for a line whose content on the display is not known.
+        self._cursor = 0
+
+    def invalidate(self):
+        """Forget the shadow copy of the screen, so that the next print() or update_screen() writes
+        every character again. Use this if the display may have lost its state."""
+        self._stale = [True] * 4
+        self._cursor = None
 
-    def _write_nibble(self, data):
-        self._bus.write_byte(self._address, data | self.BACKLIGHT)
-        self._strobe(data)
+    def _make_tables(self):
+        """Precompute the sequence of PCF8574 port values needed to write each byte value,
+        for commands (mode=0) and data (mode=Rs). Each nibble is: data, data+EN, data."""
+        self._tables = {}
+        for mode in (0, self.Rs):
+            table = []
+            for value in range(256):
+                seq = []
+                for nibble in (value & 0xF0, (value << 4) & 0xF0):
+                    data = mode | nibble | self._backlight
+                    seq += [data, data | self.En, data]
+                table.append(bytes(seq))
+            self._tables[mode] = table
+
+    @profiled
+    def _send(self, seq):
+        """Send the sequence of port values to the PCF8574 in as few I2C transactions as possible."""
+        if self._busy_check:
+            self.wait_busy()
+        if self._use_rdwr:
+            self._bus.i2c_rdwr(i2c_msg.write(self._address, seq))
+        else:
+            # SMBus block writes are limited to a "command" byte plus 32 data bytes.
+            for i in range(0, len(seq), 33):
+                chunk = seq[i:i + 33]
+                if len(chunk) > 1:
+                    self._bus.write_i2c_block_data(self._address, chunk[0], list(chunk[1:]))
+                else:
+                    self._bus.write_byte(self._address, chunk[0])
 
     # write a command to lcd
     def _write_byte(self, cmd, mode=0):
-        self._write_nibble(mode | (cmd & 0xF0))         # Write high 4-bits
-        self._write_nibble(mode | ((cmd << 4) & 0xF0))  # Write low 4-bits
+        self._send(self._tables[mode][cmd & 0xFF])
+
+    def _write_bytes(self, values, mode=0):
+        """Write a sequence of byte values as one transaction."""
+        table = self._tables[mode]
+        self._send(b"".join(table[v & 0xFF] for v in values))
+
+    def wait_busy(self, timeout=0.01):
+        """Read the busy flag of the HD44780 until it is clear, or until timeout seconds have passed.
+        The data lines of the PCF8574 are set high, so they can be read as inputs."""
+        read = 0xF0 | self.Rw | self._backlight
+        self._bus.write_byte(self._address, read)
+        start = monotonic()
+        while True:
+            self._bus.write_byte(self._address, read | self.En)
+            busy = self._bus.read_byte(self._address) & 0x80     # Busy flag is on D7 in the first nibble.
+            self._bus.write_byte(self._address, read)
+            self._bus.write_byte(self._address, read | self.En)  # Clock out the second nibble.
+            self._bus.write_byte(self._address, read)
+            if not busy or monotonic() - start > timeout:
+                break
+        self._bus.write_byte(self._address, self._backlight)
 
     # put string function with optional char positioning
+    @profiled
     def print(self, string, line=0, pos=0, wrap=0):
         """Write string to the screen on line=line at position=pos
         If wrap=1 then wrap the line onto the next line if it is too long."""
@@ -148,34 +229,96 @@ class CharLCD:
             max_char = 20 - pos
             string = string[0:max_char]
 
-        # Output the string until the end of the line, then wrap to the next line and continue.
+        # Put the string in a copy of the screen, wrapping to the next line if needed,
+        # then only send what changed.
+        screen = [bytearray(x) for x in self._ddram]
         while len(string):
-            self._write_byte(self.SETDDRAMADDR + self.LINE_POSITIONS[line] + pos)
             max_char = 20 - pos
-            for char in string[0:max_char]:
-                self._write_byte(ord(char), mode=self.Rs)
+            chunk = string[0:max_char]
+            screen[line][pos:pos + len(chunk)] = bytes(ord(char) & 0xFF for char in chunk)
             string = string[max_char:]
             pos = 0
             line += 1
             if line > 3:
                 line = 0
+        self._update(screen)
+
+    @profiled
+    def update_screen(self, lines):
+        """Make the screen show lines, a list of up to 4 strings, one for each line.
+        Lines are padded with spaces to 20 characters. A line that is None is left as is.
+        Only the characters that differ from what is on the screen are sent."""
+        screen = [bytearray(x) for x in self._ddram]
+        for line, string in enumerate(lines[0:4]):
+            if string is not None:
+                screen[line][:] = bytes(ord(char) & 0xFF for char in "{:<20s}".format(string[0:20]))
+        self._update(screen)
+
+    def _update(self, screen):
+        """Send the minimal set of cursor moves and character writes to change the display
+        from the shadow copy to screen, in a single transaction."""
+        cmd = self._tables[0]
+        data = self._tables[self.Rs]
+        seq = []
+        for line in range(4):
+            old = self._ddram[line]
+            new = screen[line]
+            if self._stale[line]:
+                # The display may show anything here, so write the whole line.
+                addr = self.LINE_POSITIONS[line]
+                if self._cursor != addr:
+                    seq.append(cmd[self.SETDDRAMADDR | addr])
+                seq += [data[c] for c in new]
+                self._cursor = addr + 20
+                old[:] = new
+                self._stale[line] = False
+                continue
+            i = 0
+            while i < 20:
+                if old[i] == new[i]:
+                    i += 1
+                    continue
+                # Extend the run of changed characters. Skipping over one unchanged character costs
+                # the same as a cursor move, so only a gap of two or more starts a new run.
+                last = i
+                j = i + 1
+                while j < 20 and j - last <= 2:
+                    if old[j] != new[j]:
+                        last = j
+                    j += 1
+                addr = self.LINE_POSITIONS[line] + i
+                if self._cursor != addr:
+                    seq.append(cmd[self.SETDDRAMADDR | addr])
+                seq += [data[c] for c in new[i:last + 1]]
+                self._cursor = addr + last + 1 - i
+                i = last + 1
+            old[:] = new
+        if seq:
+            self._send(b"".join(seq))
 
     # clear entire lcd and set to home
     def clear(self):
         """Clear the entire display and return the write point to home."""
         self._write_byte(self.CLEARDISPLAY)
+        if not self._busy_check:
+            sleep(0.002)          # Clear takes 1.52 ms to execute.
         self._write_byte(self.RETURNHOME)
+        if not self._busy_check:
+            sleep(0.002)
+        self._reset_shadow()
 
     def clear_line(self, line):
-        """Only clear a single line (by sending 20 spaces.)"""
+        """Only clear a single line (by sending spaces where there are characters.)"""
         self.print(" "*20, line=line, pos=0)
 
     # define backlight on/off (lcd.backlight(1); off= lcd.backlight(0)
     def backlight(self, state):  # for state, 1 = on, 0 = off
         if state == 1:
-            self._bus.write_byte(self._address, self.BACKLIGHT)
+            self._backlight = self.BACKLIGHT
         elif state == 0:
-            self._bus.write_byte(self._address, self.NO_BACKLIGHT)
+            self._backlight = self.NO_BACKLIGHT
+        self._bus.write_byte(self._address, self._backlight)
+        self._make_tables()       # The backlight bit is part of every write.
 
     def shift_display(self, right=0):
         """Shift the entire display left (right) by one character."""
@@ -187,9 +330,56 @@ class CharLCD:
     # add custom characters (0 - 7)
     def load_custom_chars(self, fontdata):
         self._write_byte(self.SETCGRAMADDR)
-        for char in fontdata:
-            for line in char:
-                self._write_byte(line, mode=self.Rs)
+        self._write_bytes([line for char in fontdata for line in char], mode=self.Rs)
+        self._cursor = None       # The address counter now points in CGRAM.
+        self._cgram = OrderedDict((tuple(char), slot) for slot, char in enumerate(fontdata[0:8]))
+
+    def custom_chars(self, glyphs):
+        """Return a string with one character for each glyph in glyphs, to be used with print().
+        Each glyph is a list of 8 rows of 5 bits. Glyphs that are not in one of the 8 CGRAM slots
+        are uploaded, replacing the least recently used glyph that is not currently on the screen.
+        All uploads are sent in a single transaction. At most 8 different glyphs can be used at once."""
+        glyphs = [tuple(g) for g in glyphs]
+        wanted = set(glyphs)
+        if len(wanted) > 8:
+            raise ValueError("The display can only show 8 different custom characters at once.")
+
+        missing = [g for g in OrderedDict.fromkeys(glyphs) if g not in self._cgram]
+        if missing:
+            used = set(self._cgram.values())
+            free = [slot for slot in range(8) if slot not in used]
+            on_screen = set(c & 0x07 for line in self._ddram for c in line if c < 0x10)
+            uploads = []
+            for glyph in missing:
+                if free:
+                    slot = free.pop(0)
+                else:
+                    # Evict the least recently used glyph not needed now, preferably not on the screen.
+                    candidates = [(g, s) for g, s in self._cgram.items() if g not in wanted]
+                    g, slot = next(((g, s) for g, s in candidates if s not in on_screen), candidates[0])
+                    del self._cgram[g]
+                self._cgram[glyph] = slot
+                uploads.append((slot, glyph))
+            self._upload_glyphs(uploads)
+
+        for g in glyphs:
+            self._cgram.move_to_end(g)
+        return "".join(chr(self._cgram[g]) for g in glyphs)
+
+    def _upload_glyphs(self, uploads):
+        """Write the (slot, glyph) pairs to CGRAM in one transaction. Consecutive slots only need
+        one address command, since the address counter increments."""
+        cmd = self._tables[0]
+        data = self._tables[self.Rs]
+        seq = []
+        next_slot = None
+        for slot, glyph in sorted(uploads):
+            if slot != next_slot:
+                seq.append(cmd[self.SETCGRAMADDR | (slot << 3)])
+            seq += [data[row & 0x1F] for row in glyph]
+            next_slot = slot + 1
+        self._send(b"".join(seq))
+        self._cursor = None       # The address counter now points in CGRAM.
 
 
 def main(argv):
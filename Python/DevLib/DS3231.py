@@ -53,7 +53,8 @@
 #
 import time
 from datetime import datetime
-import smbus
+from DevLib.backends import smbus
+from DevLib.Profiling import profiled
 
 
 class DS3231(object):
@@ -80,6 +81,7 @@ class DS3231(object):
         """Encode the integer d to bcd."""
         return (d // 10) * 16 + d % 10
 
+    @profiled
     def read_buffer(self):
         """Read the entire buffer of 18 bytes from the DS3231 using a single 32-word read."""
         try:
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+#
+# Decimation filters for oversampled ADC data.
+#
+# Averaging N conversions of an ADC with about 1 LSB or more of noise on the input reduces the noise by
+# sqrt(N), which gives 0.5*log2(N) extra effective bits: 4x oversampling for 1 bit, 16x for 2 bits, etc.
+# The Decimator filters a block of samples and keeps every N-th output, with one of:
+#  * "boxcar" - the mean of each block of N samples (a CIC filter with one stage).
+#  * "cic"    - a CIC filter with order stages: the boxcar convolved with itself order times. This suppresses
+#               the frequencies that alias onto the output much better than a boxcar, at the cost of
+#               (order-1)*(N-1) extra samples of history.
+#  * "fir"    - any FIR filter, given by taps. The default is a Hamming windowed sinc with a cutoff at the
+#               output Nyquist frequency, 4*N+1 taps long.
+# Every filter is an FIR filter with a gain of 1, computed with numpy on a sliding window view of the input,
+# so there is no loop over the samples in Python.
+#
+# Example:
+#
+#   from DevLib.Decimator import Decimator
+#   dec = Decimator(16, "cic", order=3)
+#   raw = adc_values[:dec.n_input(100)]     # The number of conversions needed for 100 outputs.
+#   out = dec(raw)                          # 100 values, with about 2 extra bits.
+#
+# Author: Maurik Holtrop
+#
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class Decimator:
+    """Decimating FIR filter.
+    Input:
+     * factor = decimation factor N: one output for every N input samples.
+     * kind   = "boxcar", "cic" or "fir".
+     * order  = number of stages for "cic".
+     * taps   = the filter coefficients for "fir". They are normalized to a sum of 1."""
+
+    KINDS = ("boxcar", "cic", "fir")
+
+    def __init__(self, factor, kind="boxcar", order=3, taps=None):
+        factor = int(factor)
+        if factor < 1:
+            raise ValueError("The decimation factor must be 1 or larger.")
+        if kind not in self.KINDS:
+            raise ValueError("Unknown decimation filter: {}, must be one of {}".format(kind, self.KINDS))
+        self.factor = factor
+        self.kind = kind
+        self.order = order if kind == "cic" else 1
+        if kind == "fir":
+            if taps is None:
+                taps = self.lowpass(factor)
+            taps = np.asarray(taps, dtype=float)
+        else:
+            taps = np.ones(1)
+            for i in range(self.order):
+                taps = np.convolve(taps, np.ones(factor))
+        self.taps = taps / taps.sum()
+        self._kernel = self.taps[::-1].copy()
+
+    @staticmethod
+    def lowpass(factor, length=None):
+        """Return a Hamming windowed sinc low pass filter with the cutoff at 1/(2*factor) of the input rate."""
+        if length is None:
+            length = 4 * factor + 1
+        n = np.arange(length) - (length - 1) / 2.
+        return np.sinc(n / factor) * np.hamming(length)
+
+    @property
+    def history(self):
+        """The number of input samples that one output depends on."""
+        return len(self.taps)
+
+    def n_input(self, n_output):
+        """The number of input samples needed for n_output outputs."""
+        return (n_output - 1) * self.factor + self.history
+
+    def n_output(self, n_input):
+        """The number of outputs for n_input input samples."""
+        if n_input < self.history:
+            return 0
+        return (n_input - self.history) // self.factor + 1
+
+    @property
+    def noise_gain(self):
+        """The factor by which the filter reduces the variance of white noise, sum(taps^2)."""
+        return float(np.sum(self.taps ** 2))
+
+    @property
+    def extra_bits(self):
+        """The number of extra effective bits for white noise, 0.5*log2(1/noise_gain)."""
+        return -0.5 * math.log2(self.noise_gain)
+
+    def __call__(self, samples):
+        """Filter and decimate samples, a 1D array, or 2D with the samples of one channel in each row.
+        Returns a float array with n_output(len(samples)) values (per row)."""
+        x = np.asarray(samples, dtype=float)
+        n = self.n_output(x.shape[-1])
+        if self.kind == "boxcar":
+            # Non overlapping blocks: a reshape is enough.
+            return x[..., :n * self.factor].reshape(x.shape[:-1] + (n, self.factor)).mean(axis=-1)
+        if n == 0:
+            return np.zeros(x.shape[:-1] + (0,))
+        windows = sliding_window_view(x, self.history, axis=-1)[..., ::self.factor, :][..., :n, :]
+        return windows @ self._kernel
+
+    def __repr__(self):
+        return "Decimator(factor={}, kind={!r}, order={}, taps={})".format(self.factor, self.kind, self.order,
+                                                                          self.history)
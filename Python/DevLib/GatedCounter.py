@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+#
+# This module runs a gated counter: a binary counter (e.g. two SN74HC4040 chips) whose clock input is
+# gated by a GPIO pin through an AND (or NAND) gate, and which is read out with SN74HC165 shifters.
+#
+# Timing the gate with time.sleep() leaves the gate time at the mercy of the scheduler, which can
+# wake the program up several milliseconds late. This module instead:
+#
+#  1) Opens and closes the gate at a deadline on the time.perf_counter_ns() clock. It sleeps until
+#     just before the deadline, and then spin-waits for the last spin_time seconds.
+#  2) Records the time of each gate edge, as the midpoint of the time before and after the GPIO write,
+#     so the actual gate duration is known, even if a deadline is missed.
+#  3) Divides the counts by the measured gate duration to get a rate (frequency) in Hz.
+#
+# Back-to-back gating:
+# With two counters, the gate of counter B is open while the gate of counter A is closed, and visa versa.
+# At every deadline the gates are switched, and the counter that was just closed is read out and cleared
+# while the other counter counts. There is thus no dead time between measurements.
+# Counter B can either have its own gate pin, or its gate can be the inverted gate of counter A (using
+# the NAND as inverter), in which case the switch is exact.
+#
+# Author: Maurik Holtrop
+#
+from DevLib.backends import GPIO
+from DevLib.Profiling import profiled
+
+import time
+import sys
+
+
+class GatedCounter:
+    """Gated counter with deadline based gate timing.
+
+    Example code:
+
+    .. code-block:: python
+
+        from DevLib import SN74HC165, GatedCounter
+        S = SN74HC165(18, 19, 20, 24)
+        C = GatedCounter(S, 16, 17, gate_time=1.0)
+        count, duration = C.gate()
+        print(C.rate(count, duration))
+        for count, duration, rate in C.run(10):
+            print(count, duration, rate)
+    """
+
+    def __init__(self, shifter, gate_pin, clear_pin, gate_time=1.0, shifter2=None, gate_pin2=None,
+                 clear_pin2=None, spin_time=0.002):
+        """Initialize the gated counter.
+        Input:
+         * shifter    = The SN74HC165 (or compatible) object that reads the counter.
+         * gate_pin   = GPIO pin for the counter gate, high = counting.
+         * clear_pin  = GPIO pin for the counter clear, pulsed high to clear.
+         * gate_time  = Gate time in seconds.
+         * shifter2   = The shifter for a second counter, for back-to-back gating, or None.
+         * gate_pin2  = GPIO pin for the gate of the second counter. If None, the second counter is
+                        gated by the inverse of gate_pin.
+         * clear_pin2 = GPIO pin for the clear of the second counter, required with shifter2.
+         * spin_time  = Time in seconds before a deadline at which to stop sleeping and spin-wait."""
+        if shifter2 is not None and clear_pin2 is None:
+            raise ValueError("The second counter needs its own clear pin.")
+        GPIO.setmode(GPIO.BCM)
+        self._shifter = [shifter, shifter2]
+        self._gate = [gate_pin, gate_pin2]
+        self._clear = [clear_pin, clear_pin2]
+        self._spin_ns = int(spin_time * 1e9)
+        self.gate_time = gate_time
+        self.overruns = 0   # Number of times a readout did not finish before the next deadline.
+
+        for pin in set(self._gate + self._clear):
+            if pin is not None:
+                GPIO.setup(pin, GPIO.OUT)
+        for pin in self._clear:
+            if pin is not None:
+                GPIO.output(pin, 0)
+        self._set_gates(None)
+
+    def __del__(self):          # This is automatically called when the class is deleted.
+        """Delete and cleanup."""
+        for pin in set(self._gate + self._clear):
+            if pin is not None:
+                GPIO.cleanup(pin)
+
+    @property
+    def gate_time(self):
+        """The gate time in seconds."""
+        return self._gate_ns * 1e-9
+
+    @gate_time.setter
+    def gate_time(self, value):
+        self._gate_ns = int(round(value * 1e9))
+
+    @property
+    def double(self):
+        """True if there are two counters for back-to-back gating."""
+        return self._shifter[1] is not None
+
+    @profiled
+    def _wait_until(self, deadline):
+        """Sleep until spin_time before the deadline (in ns), then spin until the deadline."""
+        left = deadline - time.perf_counter_ns() - self._spin_ns
+        if left > 0:
+            time.sleep(left * 1e-9)
+        while time.perf_counter_ns() < deadline:
+            pass
+
+    def _set_gates(self, active):
+        """Open the gate of counter active (0 or 1) and close the other one. active=None closes the
+        gate of counter 0 (and thus opens counter 1 if it uses the inverted gate).
+        Returns the time of the switch in ns."""
+        if self._gate[1] is None:
+            pins = self._gate[0]
+            values = 1 if active == 0 else 0
+        else:
+            pins = [self._gate[1 - active], self._gate[active]] if active is not None else self._gate
+            values = [0, 1] if active is not None else [0, 0]
+        t_before = time.perf_counter_ns()
+        GPIO.output(pins, values)
+        t_after = time.perf_counter_ns()
+        return (t_before + t_after) // 2
+
+    def clear(self, counter=0):
+        """Clear the counter by pulsing its clear pin high."""
+        GPIO.output(self._clear[counter], 1)
+        GPIO.output(self._clear[counter], 0)
+
+    def read(self, counter=0):
+        """Load the shifter of counter and read it out."""
+        shifter = self._shifter[counter]
+        shifter.load_shifter()
+        return shifter.read_data()
+
+    @staticmethod
+    def rate(count, duration):
+        """Return the count rate in Hz for count counts in a gate of duration seconds."""
+        return count / duration
+
+    @profiled
+    def gate(self, gate_time=None):
+        """Clear the counter, count for gate_time seconds (default self.gate_time) and read it out.
+        Returns (count, duration) where duration is the measured gate duration in seconds."""
+        gate_ns = self._gate_ns if gate_time is None else int(round(gate_time * 1e9))
+        self.clear(0)
+        t_open = self._set_gates(0)
+        self._wait_until(t_open + gate_ns)
+        t_close = self._set_gates(None)
+        return self.read(0), (t_close - t_open) * 1e-9
+
+    def measure(self, gate_time=None):
+        """Return the count rate in Hz measured with a single gate."""
+        return self.rate(*self.gate(gate_time))
+
+    def run(self, n=None):
+        """Generator that measures n times (forever if n is None), and yields (count, duration, rate)
+        for each gate. With two counters the gates are back-to-back, with the readout of one counter
+        done while the other counts. With a single counter, the next gate opens right after the readout."""
+        if not self.double:
+            i = 0
+            while n is None or i < n:
+                count, duration = self.gate()
+                yield count, duration, self.rate(count, duration)
+                i += 1
+            return
+
+        self.clear(0)
+        active = 0
+        t_open = self._set_gates(active)
+        self.clear(1)                       # Closed now; with the inverted gate it was open until the switch.
+        deadline = t_open + self._gate_ns
+        i = 0
+        try:
+            while n is None or i < n:
+                if time.perf_counter_ns() > deadline:
+                    self.overruns += 1
+                self._wait_until(deadline)
+                t_switch = self._set_gates(1 - active)
+                duration = (t_switch - t_open) * 1e-9
+                count = self.read(active)
+                self.clear(active)          # Must be before the next switch, which opens this counter.
+                yield count, duration, self.rate(count, duration)
+                active = 1 - active
+                t_open = t_switch
+                deadline += self._gate_ns
+                i += 1
+        finally:
+            self._set_gates(None)
+
+
+def main(argv):
+    """Test the gated counter with a 24 bit counter read out by SN74HC165 chips on pins 18, 19, 20,
+    with the gate on pin 16 and the clear on pin 17."""
+    from DevLib import SN74HC165
+    S = SN74HC165(18, 19, 20, 24)
+    C = GatedCounter(S, 16, 17, gate_time=1.0)
+    try:
+        for count, duration, rate in C.run():
+            print(f"{count:10d} {duration:12.9f} {rate:16.6f}")
+    except KeyboardInterrupt:
+        print(" Interrupted")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
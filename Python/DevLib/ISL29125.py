@@ -6,7 +6,7 @@
 #
 # Sources used: Sparkfun Arduino Library for ISL2915: https://github.com/sparkfun/SparkFun_ISL29125_Breakout_Arduino_Library/tree/V_1.0.1
 
-import smbus
+from DevLib.backends import smbus
 
 
 class ISL29125:
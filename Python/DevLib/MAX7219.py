@@ -7,26 +7,20 @@
 #
 # Author: Maurik Holtrop
 #
-try:
-    import RPi.GPIO as GPIO
-except ImportError:
-    pass
-try:
-    import Adafruit_BBIO as GPIO
-except ImportError:
-    pass
-
-try:
-    import spidev
-except ImportError:
-    pass
+from DevLib.backends import spidev
+from DevLib.Profiling import profiled
 
 from DevLib import BBSpiDev
+from DevLib.MAX7219Render import SEGMENTS, render_int, render_float, render_text
 
 import time
 
 
 class MAX7219:
+
+    # Segment patterns for raw (no-decode) mode. Bit 7 = DP, bit 6..0 = segments A,B,C,D,E,F,G
+    SEGMENTS = SEGMENTS
+
     def __init__(self, data_pin, clk_pin, cs_bar_pin, mode=1):
         """This class helps with driving a MAX7219 LED module using either regular
         GPIO pins, or SPI hardware interface.
@@ -59,30 +53,39 @@ class MAX7219:
         self._dev.mode = 0
         self._dev.max_speed_hz = self._CLK
         self._dev.bits_per_word = 8
-        self._translate = {" ": 0b00000000, "A": 0b01110111, "B": 0b00011111, "C": 0b01001110, "D": 0b00111101,
-                           "E": 0b01001111, "F": 0b01000111, "G": 0b01111011, "H": 0b00110111, "I": 0b00000110,
-                           "J": 0b00111000, "K": 0b00110111, "L": 0b00001110, "M": 0b10010011, "N": 0b00010101,
-                           "O": 0b00011101, "P": 0b01100111, "Q": 0b01110011, "R": 0b00000101, "S": 0b01011011,
-                           "T": 0b00001111, "U": 0b00011100, "V": 0b00111110, "W": 0b10111110, "X": 0b10100101,
-                           "Y": 0b00100111, "Z": 0b01101101, "1": 0b00110000, "2": 0b01101101, "3": 0b01111001,
-                           "4": 0b00110011, "5": 0b01011011, "6": 0b01011111, "7": 0b01110000, "8": 0b01111111,
-                           "9": 0b01110011, "0": 0b01111110}
+        # Shadow copy of the 16 registers of the chip, index = register address.
+        # None means the content of the register is not known, so it will always be written.
+        self._shadow = [None] * 16
         self.init(mode)
 
     def init(self, mode):
         """ Initialize the MAX7219 Chip. Mode=1 is for numbers, mode=2 is no-decode.
         This will send an initialization sequence to the chip.
         With an __init__ this method is already called."""
+        self.invalidate()
         self.write_loc_char(0x0F, 0x01)  # Test ON
         time.sleep(0.5)
         self.write_loc_char(0x0F, 0x00)  # Test OFF
 
-        self.write_loc_char(0x0B, 0x07)  # All 8 digits
-        self.write_loc_char(0x0A, 0x0B)  # Quite bright
-        self.write_loc_char(0x0C, 1)     # Set for normal operation.
+        self.write_register(0x0B, 0x07)  # All 8 digits
+        self.write_register(0x0A, 0x0B)  # Quite bright
+        self.write_register(0x0C, 1)     # Set for normal operation.
         self.set_mode(mode)
         self.clear()
 
+    def invalidate(self):
+        """Forget the shadow copy of the registers, so that the next update writes every register again.
+        Use this if the chip may have lost its state, e.g. after a power glitch."""
+        self._shadow = [None] * 16
+
+    def refresh(self):
+        """Re-send the last known content of all the registers to the chip."""
+        shadow = self._shadow
+        self.invalidate()
+        for loc in (0x0F, 0x0B, 0x0A, 0x09, 0x0C, 1, 2, 3, 4, 5, 6, 7, 8):
+            if shadow[loc] is not None:
+                self.write_register(loc, shadow[loc])
+
     def __del__(self):          # This is automatically called when the class is deleted.
         """Delete and cleanup."""
         self.write_loc_char(0x0C, 0x0)  # Turn off
@@ -90,26 +93,25 @@ class MAX7219:
 
     def clear(self):
         """Clear the display to all blanks. (it looks off)"""
-        for i in range(8):
-            if self._Mode == 1:
-                self.write_loc_char(i + 1, 0x0F)  # Blank
-            else:
-                self.write_loc_char(i + 1, 0x00)  # Blank
+        if self._Mode == 1:
+            self.write_digits([0x0F] * 8)  # Blank
+        else:
+            self.write_digits([0x00] * 8)  # Blank
 
     def set_mode(self, mode=1):
         """Set the decode mode. If mode=1 the data written will be decoded as numbers. If mode=0 the
         device is in raw mode. For the write_text() we need raw mode."""
         self._Mode = mode
         if mode == 1:
-            self.write_loc_char(0x09, 0xFF)  # Decode mode
+            self.write_register(0x09, 0xFF)  # Decode mode
         else:
-            self.write_loc_char(0x09, 0x00)  # Raw mode
+            self.write_register(0x09, 0x00)  # Raw mode
 
 
     def set_brightness(self, brightness):
         """Set the display brightness to B, where 0<=B<16"""
         brightness = brightness & 0x0F
-        self.write_loc_char(0x0A, brightness)  # Set brightness
+        self.write_register(0x0A, brightness)  # Set brightness
 
     def write_data(self, data):
         """Write the 16 bit data to the output using SPI or
@@ -128,100 +130,45 @@ class MAX7219:
         #     self.WriteData(out)
         # else:
         self._dev.writebytes([loc, dat])
+        self._shadow[loc & 0x0F] = dat
+
+    def write_register(self, loc, dat):
+        """Write dat to register loc, but only if the register does not already contain dat.
+        The content of the registers is tracked in a shadow copy, so no SPI transaction
+        is needed to find out."""
+        if self._shadow[loc & 0x0F] != dat:
+            self.write_loc_char(loc, dat)
+
+    @profiled
+    def write_digits(self, digits):
+        """Write the 8 digit registers from the list digits, where digits[0] is the right most digit.
+        Only the digits that changed since the last write are sent to the chip."""
+        shadow = self._shadow
+        for loc in range(1, 9):
+            dat = digits[loc - 1]
+            if shadow[loc] != dat:
+                self.write_loc_char(loc, dat)
 
     def write_int(self, n):
         """ Write the integer n on the display, shifted left. If n is larger (smaller) than
         fits, an overflow is indicated by all dash."""
-
-        if self._Mode != 1:
-            set_mode(1)
-
-        self.write_loc_char(0x09, 0xFF)  # Set to interpret mode.
-
-        if n > 99999999 or n < -9999999:  # Display overflow, --------
-            for i in range(8):
-                self.write_loc_char(i + 1, 0x0A)
-            return
-
-        if n < 0:
-            negative = True
-            n = -n
-        else:
-            negative = False
-        for i in range(8):
-            n, d = divmod(n, 10)
-            if n == 0 and d == 0:
-                if i == 0:
-                    self.write_loc_char(i + 1, 0x0)  # 0
-                else:
-                    if negative:
-                        self.write_loc_char(i + 1, 0x0A)
-                        negative = False
-                    else:
-                        self.write_loc_char(i + 1, 0x0F)  # Blank
-            else:
-                self.write_loc_char(i + 1, d)
+        self.set_mode(1)  # Only sent to the chip if the mode changed.
+        self.write_digits(render_int(n))
 
     def write_float(self, f, form='{:9.6f}'):
         """Write a floating point number. Trying to use a reasonable format.
         You can specify the format with the form= argument, using the python
         style, to use with form="{:4.2f}" or form="{:8.4e}" """
-
-        if self._Mode != 1:
-            self.set_mode(1)
-
-        self.write_loc_char(0x09, 0xFF)  # Set to interpret mode.
-
-        s = form.format(f)
-        loc = 1
-        high_bit = 0
-        rev = reversed(s[0:8+s.count('.')+s.count('e')])  # Read the letters reversed, starting at the end.
-        for c in rev:       # Get each of the numbers/symbols, starting with the rightmost.
-            if c == '.':    # If it is the period, then set bit7 but don't count as a digit.
-                high_bit = 1
-            else:
-                if c.isdigit():  # It is a digit.
-                    i = int(c)
-                    i += high_bit << 7
-                    self.write_loc_char(loc, i)
-                    loc += 1
-                elif c == ' ':
-                    self.write_loc_char(loc, 0x0F)  # Write blank
-                    loc += 1
-                elif c == '+':
-                    self.write_loc_char(loc, 0x0B)  # Write E
-                    loc += 1
-                elif c == '-':
-                    self.write_loc_char(loc, 0x0A)  # Write -
-                    loc += 1
-                elif c == 'e' or c == 'E':         # Skip the E, E- too long.
-                    pass
-                else:
-                    print("Bad char in string: ", c)
-                high_bit = 0
-        while loc < 9:                    # Fill the end with blanks
-            self.write_loc_char(loc, 0x0F)  # Write blank
-            loc += 1
+        self.set_mode(1)  # Only sent to the chip if the mode changed.
+        self.write_digits(render_float(f, form))
 
     def write_text(self, text):
         """Attempt to write the text given. This is pretty limited, since not all characters work
         for a 7-segment display."""
         if len(text) > 8:
             print("Text supplied will not fit on display.")
-
-        if self._Mode == 1:
-            self.set_mode(0)
-
-        out_str = "{:>8s}".format(text)
-        loc = 8
-        for lett in out_str.upper():
-
-            out = 0b1000000
-            if lett in self._translate:
-                out = self._translate[lett]
-
-            self.write_loc_char(loc, out)
-            loc = loc - 1
+        self.set_mode(0)  # Only sent to the chip if the mode changed.
+        self.write_digits(render_text(text))
 
     def __str__(self):
         """Write something comforting to the user :-) """
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+#
+# This module will steer a chain of daisy-chained MAX7219 chips.
+#
+# The MAX7219 has a DOUT pin, which outputs the data that was shifted in on DIN 16 clock cycles earlier.
+# Connecting DOUT of one chip to DIN of the next creates a long shift register, with all the chips
+# sharing CLK and CS. When CS goes high, every chip latches the 16 bits that are in its own shift register.
+# To write to a chip further down the chain, you thus send 16 bits for every chip in one transaction,
+# and send a No-Op (register 0x00) to the chips you do not want to change.
+#
+# Rather than writing one register of one chip at a time, which takes 8*N transactions to refresh
+# a chain of N chips, this driver keeps a framebuffer of N x 8 digit registers and sends one transaction
+# per digit row, which writes that row to all the chips at once. Rows that did not change are not sent.
+#
+# The chain can be used with 7-segment displays (in raw, no-decode, mode), or with 8x8 LED matrix modules,
+# such as the common FC-16 4-in-1 modules, where text can be scrolled across all the modules.
+# The numbers, text and glyphs are rendered with the tables in MAX7219Render.
+#
+# Author: Maurik Holtrop
+#
+from DevLib.backends import spidev
+from DevLib.Profiling import profiled
+
+from DevLib import BBSpiDev
+from DevLib.MAX7219Render import render_text, render_int, render_float, render_ints, render_matrix_text
+
+import numpy as np
+import time
+
+class MAX7219Cascade:
+    """Driver for a chain of N daisy-chained MAX7219 chips, sharing the same DIN, CLK and CS lines.
+
+    The digit registers of all the chips are kept in a numpy framebuffer of shape (N,8), available as
+    the buffer property. buffer[0] is the chip connected directly to the RPi, buffer[i][d] is the
+    value for digit register d+1 of chip i. Change the buffer, then call show() to send it to the chips.
+
+    Example code:
+
+    .. code-block:: python
+
+        from DevLib import MAX7219Cascade
+        m = MAX7219Cascade(0, 1000000, 0, n_chips=4, matrix=True)
+        m.scroll_text("Hello World!")
+    """
+
+    def __init__(self, data_pin, clk_pin, cs_bar_pin, n_chips=4, matrix=False, reverse=False):
+        """Initialize the chain of MAX7219 chips.
+        For SPI hardware, set data_pin=0, cs_bar_pin=0 or 1, clk_pin= bus speed (1000000)
+        For GPIO "bit-bang" interface, set data_pin = Data in (dat),
+        cs_bar_pin = to Chip Select (cs), and clk_pin= Clock (clk)
+        n_chips = the number of chips in the chain.
+        matrix  = False for 7-segment displays, True for 8x8 matrix modules.
+        reverse = For matrix modules, set to True if the first chip in the chain is the right most module
+                  instead of the left most one.
+        The chips are always used in raw (no-decode) mode, so that each chip can show numbers or text."""
+
+        self._DATA = data_pin
+        self._CS_bar = cs_bar_pin
+        self._CLK = clk_pin
+        self._N = n_chips
+        self._matrix = matrix
+        self._reverse = reverse
+        self._dev = None
+
+        if self._DATA == 0:
+            self._DATA = None
+        if self._DATA is None:
+            if self._CLK < 1:
+                self._CLK = 1000000
+            # Initialize the SPI hardware device
+            self._dev = spidev.SpiDev(0, self._CS_bar)
+        else:
+            self._dev = BBSpiDev(self._CS_bar, self._CLK, self._DATA, None)
+
+        self._dev.mode = 0
+        self._dev.max_speed_hz = self._CLK
+        self._dev.bits_per_word = 8
+
+        self._buffer = np.zeros((self._N, 8), dtype=np.uint8)
+        self._shadow = np.zeros((self._N, 8), dtype=np.uint8)
+        self._shadow_valid = np.zeros(8, dtype=bool)
+        # Pre-computed transaction for each digit row: pairs of (address, data), last chip in chain first.
+        self._frame = np.zeros((8, self._N, 2), dtype=np.uint8)
+        self._frame[:, :, 0] = np.arange(1, 9, dtype=np.uint8).reshape(8, 1)
+        self.init()
+
+    def init(self):
+        """Initialize all the chips in the chain. This is called by __init__."""
+        self._write_all(0x0F, 0x01)  # Test ON
+        time.sleep(0.5)
+        self._write_all(0x0F, 0x00)  # Test OFF
+
+        self._write_all(0x0B, 0x07)  # All 8 digits
+        self._write_all(0x0A, 0x0B)  # Quite bright
+        self._write_all(0x09, 0x00)  # Raw mode
+        self._write_all(0x0C, 0x01)  # Set for normal operation.
+        self._shadow_valid[:] = False
+        self.clear()
+
+    def __del__(self):          # This is automatically called when the class is deleted.
+        """Delete and cleanup."""
+        self._write_all(0x0C, 0x00)  # Turn off
+        self._dev.close()
+
+    def _write_all(self, loc, dat):
+        """Write dat to register loc of every chip in the chain in one transaction."""
+        self._dev.writebytes([loc, dat] * self._N)
+
+    def write_chip(self, chip, loc, dat):
+        """Write dat to register loc of only chip number chip. The other chips get a No-Op."""
+        out = [0x00, 0x00] * self._N
+        pos = 2 * (self._N - 1 - chip)   # The first bytes sent end up in the last chip.
+        out[pos] = loc
+        out[pos + 1] = dat
+        self._dev.writebytes(out)
+        if 1 <= loc <= 8:
+            self._shadow[chip, loc - 1] = dat
+            self._buffer[chip, loc - 1] = dat
+
+    def set_brightness(self, brightness):
+        """Set the brightness of all the displays to B, where 0<=B<16"""
+        self._write_all(0x0A, brightness & 0x0F)
+
+    @property
+    def n_chips(self):
+        """The number of chips in the chain."""
+        return self._N
+
+    @property
+    def matrix(self):
+        """True if the chain drives 8x8 matrix modules, False for 7-segment displays."""
+        return self._matrix
+
+    @property
+    def buffer(self):
+        """The (N,8) framebuffer with the digit register values of all chips."""
+        return self._buffer
+
+    @profiled
+    def show(self, force=False):
+        """Send the framebuffer to the chips. Each digit row is sent in a single transaction for all the
+        chips, and rows that did not change since the last show() are skipped, unless force=True."""
+        changed = (self._buffer != self._shadow).any(axis=0) | ~self._shadow_valid
+        if force:
+            changed[:] = True
+        self._frame[:, :, 1] = self._buffer[::-1].T   # Last chip in the chain goes first.
+        for row in np.flatnonzero(changed):
+            self._dev.writebytes(self._frame[row].ravel().tolist())
+        self._shadow[:] = self._buffer
+        self._shadow_valid[:] = True
+
+    def clear(self):
+        """Clear all the displays and show the result right away."""
+        self._buffer.fill(0)
+        self.show()
+
+    #
+    # 7-segment display methods.
+    #
+    def write_digits(self, chip, digits, show=True):
+        """Set the 8 digit registers of chip to digits, where digits[0] is the right most digit."""
+        self._buffer[chip] = digits
+        if show:
+            self.show()
+
+    def write_text(self, chip, text, show=True):
+        """Write the text on the 7-segment display of chip, right aligned.
+        A period is merged with the preceding character as the decimal point."""
+        self.write_digits(chip, render_text(text), show)
+
+    def write_int(self, chip, n, show=True):
+        """Write the integer n on the 7-segment display of chip. Overflow is shown as all dashes."""
+        self.write_digits(chip, render_int(n, decode=False), show)
+
+    def write_float(self, chip, f, form='{:9.6f}', show=True):
+        """Write a floating point number on the 7-segment display of chip, with format form."""
+        self.write_digits(chip, render_float(f, form, decode=False), show)
+
+    def write_ints(self, values, show=True):
+        """Write one integer to each of the 7-segment displays in the chain, with values[i] going to chip i.
+        All the values are rendered at once."""
+        self._buffer[:] = render_ints(values, decode=False)
+        if show:
+            self.show()
+
+    #
+    # 8x8 matrix methods.
+    #
+    def show_image(self, image, offset=0, show=True):
+        """Show a window of the boolean pixel image (8 rows, any number of columns) on the matrix,
+        starting at column offset. Columns outside the image are blank."""
+        width = 8 * self._N
+        window = np.zeros((8, width), dtype=bool)
+        lo = max(offset, 0)
+        hi = min(offset + width, image.shape[1])
+        if hi > lo:
+            window[:, lo - offset:hi - offset] = image[:, lo:hi]
+        rows = np.packbits(window, axis=1)  # Shape (8, N), left most column in bit 7.
+        if self._reverse:
+            self._buffer[:] = rows[:, ::-1].T
+        else:
+            self._buffer[:] = rows.T
+        if show:
+            self.show()
+
+    def write_matrix_text(self, text, show=True):
+        """Write text on the matrix, starting at the left most column."""
+        self.show_image(render_matrix_text(text), 0, show)
+
+    def scroll_text(self, text, delay=0.05, repeat=1):
+        """Scroll text from right to left across the matrix modules, moving one column every delay seconds.
+        The text is rendered only once, after which each step only shifts the window."""
+        image = render_matrix_text(text)
+        width = 8 * self._N
+        for i in range(repeat):
+            for offset in range(-width, image.shape[1] + 1):
+                self.show_image(image, offset)
+                time.sleep(delay)
+
+
+def main(argv):
+    """Test the chain of MAX7219 chips.
+    Arguments: data_pin clk_pin cs_bar_pin n_chips matrix
+    If no arguments are given, use SPI on CE0 with 4 matrix modules."""
+    if len(argv) < 6:
+        data, clk, cs_bar, n_chips, matrix = None, 1000000, 0, 4, True
+    else:
+        data = int(argv[1]) if int(argv[1]) else None
+        clk = int(argv[2])
+        cs_bar = int(argv[3])
+        n_chips = int(argv[4])
+        matrix = bool(int(argv[5]))
+
+    chain = MAX7219Cascade(data, clk, cs_bar, n_chips=n_chips, matrix=matrix)
+    try:
+        if chain.matrix:
+            chain.scroll_text("Physics 605 - MAX7219 chain test.", delay=0.03)
+        else:
+            for i in range(1000):
+                chain.write_ints([i * (chip + 1) for chip in range(chain.n_chips)])
+                time.sleep(0.01)
+    except KeyboardInterrupt:
+        print(" Interrupted")
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+#
+# MAX7219Render
+#
+# Author: Maurik Holtrop
+#
+# This module converts numbers and text into the 8 digit register values of a MAX7219, so that the
+# drivers only need to send the registers. The conversion tables are compiled once at import, and the
+# result of a conversion is cached, so a display that shows the same values over and over again does
+# not repeat the work.
+#
+# The register images are returned as 8 values, where image[0] is the right most digit (register 1).
+# Two kinds of images can be made:
+#   decode=True  - Values for the "Code B" decode mode of the MAX7219 (0-9, -, E, H, L, P and blank)
+#   decode=False - Values for raw (no-decode) mode, where each bit turns on one segment.
+# In both cases bit 7 is the decimal point.
+#
+# For the 8x8 LED matrix modules, there is also a 5x7 font that renders text to a pixel image.
+#
+from functools import lru_cache
+import numpy as np
+
+# Segment patterns for raw (no-decode) mode. Bit 7 = DP, bit 6..0 = segments A,B,C,D,E,F,G
+SEGMENTS = {" ": 0b00000000, "A": 0b01110111, "B": 0b00011111, "C": 0b01001110, "D": 0b00111101,
+            "E": 0b01001111, "F": 0b01000111, "G": 0b01111011, "H": 0b00110111, "I": 0b00000110,
+            "J": 0b00111000, "K": 0b00110111, "L": 0b00001110, "M": 0b10010011, "N": 0b00010101,
+            "O": 0b00011101, "P": 0b01100111, "Q": 0b01110011, "R": 0b00000101, "S": 0b01011011,
+            "T": 0b00001111, "U": 0b00011100, "V": 0b00111110, "W": 0b10111110, "X": 0b10100101,
+            "Y": 0b00100111, "Z": 0b01101101, "1": 0b00110000, "2": 0b01101101, "3": 0b01111001,
+            "4": 0b00110011, "5": 0b01011011, "6": 0b01011111, "7": 0b01110000, "8": 0b01111111,
+            "9": 0b01110011, "0": 0b01111110, "-": 0b00000001}
+
+# Characters available in the Code B decode mode.
+CODE_B = {"0": 0x00, "1": 0x01, "2": 0x02, "3": 0x03, "4": 0x04, "5": 0x05, "6": 0x06, "7": 0x07,
+          "8": 0x08, "9": 0x09, "-": 0x0A, "E": 0x0B, "H": 0x0C, "L": 0x0D, "P": 0x0E, " ": 0x0F}
+
+DP = 0x80            # Decimal point bit, the same in both modes.
+RAW_UNKNOWN = 0b1000000  # Shown for characters that have no raw segment pattern.
+
+
+def _compile_table(table, unknown):
+    """Turn a character dictionary into a 256 entry lookup table, indexed by character code.
+    Lower case letters are mapped the same as upper case."""
+    out = [unknown] * 256
+    for c, v in table.items():
+        out[ord(c)] = v
+        out[ord(c.lower())] = v
+    return tuple(out)
+
+
+# Compiled lookup tables, for decode mode and raw mode: (table, blank)
+_TABLES = {True: (_compile_table(CODE_B, CODE_B[" "]), CODE_B[" "]),
+           False: (_compile_table(SEGMENTS, RAW_UNKNOWN), SEGMENTS[" "])}
+
+# The codes for the digits 0-9 as numpy arrays, used by render_ints().
+_DIGITS = {True: np.array([CODE_B[str(i)] for i in range(10)], dtype=np.uint8),
+           False: np.array([SEGMENTS[str(i)] for i in range(10)], dtype=np.uint8)}
+_POW10 = 10 ** np.arange(8, dtype=np.int64)
+
+
+def _render_string(s, decode):
+    """Convert the string s to an 8 digit register image. A '.' is merged into the digit before it as
+    the decimal point. If there are more than 8 digits, the left most 8 are kept, and the result
+    is right aligned."""
+    table, blank = _TABLES[decode]
+    cells = []
+    for c in s:
+        if c == '.' and cells and not cells[-1] & DP:
+            cells[-1] |= DP
+        elif c == '.':
+            cells.append(blank | DP)
+        else:
+            cells.append(table[ord(c) & 0xFF])
+    cells = cells[0:8]
+    return tuple(reversed(cells)) + (blank,) * (8 - len(cells))
+
+
+@lru_cache(maxsize=1024)
+def render_text(text, decode=False):
+    """Return the register image for text, right aligned.
+    Characters that cannot be shown are blank in decode mode, or a bar on top in raw mode."""
+    return _render_string(text, decode)
+
+
+@lru_cache(maxsize=1024)
+def render_int(n, decode=True):
+    """Return the register image for the integer n, right aligned.
+    If n does not fit, an overflow is indicated by all dashes."""
+    if n > 99999999 or n < -9999999:
+        return _render_string("--------", decode)
+    return _render_string(str(n), decode)
+
+
+@lru_cache(maxsize=1024)
+def render_float(f, form='{:9.6f}', decode=True):
+    """Return the register image for the floating point number f, formatted with form.
+    For exponential notation the 'e' is dropped, and 'e+' is shown as 'E' to save digits."""
+    s = form.format(f).strip().replace('e+', 'E').replace('e', '')
+    return _render_string(s, decode)
+
+
+def render_ints(values, decode=True, decimals=0):
+    """Render an array of M integers to an (M,8) uint8 array of register images, all at once with numpy.
+    If decimals > 0, the decimal point is placed that many digits from the right, which means that
+    the integers are fixed point numbers, see render_fixed()."""
+    v = np.atleast_1d(np.asarray(values, dtype=np.int64))
+    table, blank = _TABLES[decode]
+    negative = v < 0
+    a = np.abs(v)
+    # Number of digits needed, at least one more than the decimals so 0.05 shows as 0.05
+    n_digits = np.maximum((a[:, np.newaxis] >= _POW10[1:]).sum(axis=1) + 1, decimals + 1)
+    out = _DIGITS[decode][(a[:, np.newaxis] // _POW10) % 10]
+    out[np.arange(8) >= n_digits[:, np.newaxis]] = blank
+    sign = negative & (n_digits < 8)
+    out[sign, n_digits[sign]] = table[ord('-')]
+    if decimals > 0:
+        out[:, decimals] |= DP
+    overflow = (a > 99999999) | (negative & (n_digits >= 8))
+    out[overflow] = table[ord('-')]
+    return out
+
+
+def render_fixed(values, decimals=2, decode=True):
+    """Render an array of floating point numbers with a fixed number of decimals to an (M,8) array of
+    register images. This is done with numpy on the whole array, which is a lot faster than formatting
+    each number as a string, for instance to update a ticker."""
+    scaled = np.rint(np.asarray(values, dtype=np.float64) * 10 ** decimals)
+    return render_ints(scaled, decode, decimals)
+
+
+def render_floats(values, form='{:9.6f}', decode=True):
+    """Render a sequence of floating point numbers with format form to an (M,8) array of register images."""
+    return np.array([render_float(float(f), form, decode) for f in values], dtype=np.uint8).reshape(-1, 8)
+
+
+# Classic 5x7 font for ASCII 0x20 (space) to 0x7E (~). Each character is 5 columns, bit 0 is the top row.
+FONT_5X7 = (
+    (0x00, 0x00, 0x00, 0x00, 0x00), (0x00, 0x00, 0x5F, 0x00, 0x00), (0x00, 0x07, 0x00, 0x07, 0x00),  # ' ' ! "
+    (0x14, 0x7F, 0x14, 0x7F, 0x14), (0x24, 0x2A, 0x7F, 0x2A, 0x12), (0x23, 0x13, 0x08, 0x64, 0x62),  # # $ %
+    (0x36, 0x49, 0x55, 0x22, 0x50), (0x00, 0x05, 0x03, 0x00, 0x00), (0x00, 0x1C, 0x22, 0x41, 0x00),  # & ' (
+    (0x00, 0x41, 0x22, 0x1C, 0x00), (0x14, 0x08, 0x3E, 0x08, 0x14), (0x08, 0x08, 0x3E, 0x08, 0x08),  # ) * +
+    (0x00, 0x50, 0x30, 0x00, 0x00), (0x08, 0x08, 0x08, 0x08, 0x08), (0x00, 0x60, 0x60, 0x00, 0x00),  # , - .
+    (0x20, 0x10, 0x08, 0x04, 0x02), (0x3E, 0x51, 0x49, 0x45, 0x3E), (0x00, 0x42, 0x7F, 0x40, 0x00),  # / 0 1
+    (0x42, 0x61, 0x51, 0x49, 0x46), (0x21, 0x41, 0x45, 0x4B, 0x31), (0x18, 0x14, 0x12, 0x7F, 0x10),  # 2 3 4
+    (0x27, 0x45, 0x45, 0x45, 0x39), (0x3C, 0x4A, 0x49, 0x49, 0x30), (0x01, 0x71, 0x09, 0x05, 0x03),  # 5 6 7
+    (0x36, 0x49, 0x49, 0x49, 0x36), (0x06, 0x49, 0x49, 0x29, 0x1E), (0x00, 0x36, 0x36, 0x00, 0x00),  # 8 9 :
+    (0x00, 0x56, 0x36, 0x00, 0x00), (0x08, 0x14, 0x22, 0x41, 0x00), (0x14, 0x14, 0x14, 0x14, 0x14),  # ; < =
+    (0x00, 0x41, 0x22, 0x14, 0x08), (0x02, 0x01, 0x51, 0x09, 0x06), (0x32, 0x49, 0x79, 0x41, 0x3E),  # > ? @
+    (0x7E, 0x11, 0x11, 0x11, 0x7E), (0x7F, 0x49, 0x49, 0x49, 0x36), (0x3E, 0x41, 0x41, 0x41, 0x22),  # A B C
+    (0x7F, 0x41, 0x41, 0x22, 0x1C), (0x7F, 0x49, 0x49, 0x49, 0x41), (0x7F, 0x09, 0x09, 0x01, 0x01),  # D E F
+    (0x3E, 0x41, 0x41, 0x51, 0x32), (0x7F, 0x08, 0x08, 0x08, 0x7F), (0x00, 0x41, 0x7F, 0x41, 0x00),  # G H I
+    (0x20, 0x40, 0x41, 0x3F, 0x01), (0x7F, 0x08, 0x14, 0x22, 0x41), (0x7F, 0x40, 0x40, 0x40, 0x40),  # J K L
+    (0x7F, 0x02, 0x04, 0x02, 0x7F), (0x7F, 0x04, 0x08, 0x10, 0x7F), (0x3E, 0x41, 0x41, 0x41, 0x3E),  # M N O
+    (0x7F, 0x09, 0x09, 0x09, 0x06), (0x3E, 0x41, 0x51, 0x21, 0x5E), (0x7F, 0x09, 0x19, 0x29, 0x46),  # P Q R
+    (0x46, 0x49, 0x49, 0x49, 0x31), (0x01, 0x01, 0x7F, 0x01, 0x01), (0x3F, 0x40, 0x40, 0x40, 0x3F),  # S T U
+    (0x1F, 0x20, 0x40, 0x20, 0x1F), (0x7F, 0x20, 0x18, 0x20, 0x7F), (0x63, 0x14, 0x08, 0x14, 0x63),  # V W X
+    (0x03, 0x04, 0x78, 0x04, 0x03), (0x61, 0x51, 0x49, 0x45, 0x43), (0x00, 0x7F, 0x41, 0x41, 0x00),  # Y Z [
+    (0x02, 0x04, 0x08, 0x10, 0x20), (0x00, 0x41, 0x41, 0x7F, 0x00), (0x04, 0x02, 0x01, 0x02, 0x04),  # \ ] ^
+    (0x40, 0x40, 0x40, 0x40, 0x40), (0x00, 0x01, 0x02, 0x04, 0x00), (0x20, 0x54, 0x54, 0x54, 0x78),  # _ ` a
+    (0x7F, 0x48, 0x44, 0x44, 0x38), (0x38, 0x44, 0x44, 0x44, 0x20), (0x38, 0x44, 0x44, 0x48, 0x7F),  # b c d
+    (0x38, 0x54, 0x54, 0x54, 0x18), (0x08, 0x7E, 0x09, 0x01, 0x02), (0x08, 0x14, 0x54, 0x54, 0x3C),  # e f g
+    (0x7F, 0x08, 0x04, 0x04, 0x78), (0x00, 0x44, 0x7D, 0x40, 0x00), (0x20, 0x40, 0x44, 0x3D, 0x00),  # h i j
+    (0x00, 0x7F, 0x10, 0x28, 0x44), (0x00, 0x41, 0x7F, 0x40, 0x00), (0x7C, 0x04, 0x18, 0x04, 0x78),  # k l m
+    (0x7C, 0x08, 0x04, 0x04, 0x78), (0x38, 0x44, 0x44, 0x44, 0x38), (0x7C, 0x14, 0x14, 0x14, 0x08),  # n o p
+    (0x08, 0x14, 0x14, 0x18, 0x7C), (0x7C, 0x08, 0x04, 0x04, 0x08), (0x48, 0x54, 0x54, 0x54, 0x20),  # q r s
+    (0x04, 0x3F, 0x44, 0x40, 0x20), (0x3C, 0x40, 0x40, 0x20, 0x7C), (0x1C, 0x20, 0x40, 0x20, 0x1C),  # t u v
+    (0x3C, 0x40, 0x30, 0x40, 0x3C), (0x44, 0x28, 0x10, 0x28, 0x44), (0x0C, 0x50, 0x50, 0x50, 0x3C),  # w x y
+    (0x44, 0x64, 0x54, 0x4C, 0x44), (0x00, 0x08, 0x36, 0x41, 0x00), (0x00, 0x00, 0x7F, 0x00, 0x00),  # z { |
+    (0x00, 0x41, 0x36, 0x08, 0x00), (0x08, 0x04, 0x08, 0x10, 0x08))                                  # } ~
+
+
+def _make_glyph_table():
+    """Precompute the pixel image of every character in FONT_5X7, plus one blank spacer column.
+    Returns a boolean array of shape (128, 8, 6), indexed by [ascii code, row, column].
+    Characters outside the font are rendered as a blank."""
+    columns = np.zeros((128, 6), dtype=np.uint8)
+    columns[0x20:0x20 + len(FONT_5X7), 0:5] = FONT_5X7
+    rows = np.arange(8, dtype=np.uint8).reshape(1, 8, 1)
+    return ((columns[:, np.newaxis, :] >> rows) & 1).astype(bool)
+
+
+GLYPHS = _make_glyph_table()
+
+
+def render_matrix_text(text):
+    """Render text to a boolean pixel image of shape (8, 6*len(text)), using the precomputed
+    glyph table. Row 0 is the top row."""
+    codes = np.frombuffer(text.encode('ascii', 'replace'), dtype=np.uint8) & 0x7F
+    return GLYPHS[codes].transpose(1, 0, 2).reshape(8, -1)
@@ -31,6 +31,16 @@
 #              SCK        = CLK      set CLK_pin  = 1000000 (transfer speed)
 #              MOSI       = D_in     set MOSI_pin = 0
 #              MISO       = D_out    set MISO_pin = 0
+#
+# Oversampling:
+#   With oversample=N, read_volts() does N conversions in one batched SPI transfer and filters them with
+#   a decimator (see DevLib/Decimator.py) to gain effective bits, if the input has about 1 LSB of noise.
+#   read_oversampled() returns a series of these at the decimated rate, as floats or as integers with the
+#   extra bits, and resolution_report() measures the effective resolution that is reached.
+#
+# Channel maps:
+#   scan_map() reads a list of inputs that mixes single ended channels and differential pairs, e.g.
+#   MCP320x(0, channel_map=[0, 1, (2, 3), (5, 4)]), in one batched SPI transfer per scan, or per n scans.
 
 # The SPI protocol simulated here is MODE=0, CPHA=0, which has a positive polarity clock,
 # (the clock is 0 at rest, active at 1) and a positive phase (0 to 1 transition) for reading
@@ -39,19 +49,8 @@
 # From MCP3208 datasheet:
 # Outging data : MCU latches data to A/D converter on rising edges of SCLK
 # Incoming data: Data is clocked out of A/D converter on falling edges, so should be read on rising edge.
-try:
-    import RPi.GPIO as GPIO
-except ImportError as error:
-    pass
-try:
-    import Adafruit_BBIO as GPIO
-except ImportError as error:
-    pass
-
-try:
-    import spidev
-except ImportError as error:
-    pass
+from DevLib.backends import GPIO, spidev, xfer_frames
+from DevLib.Profiling import profiled
 
 from DevLib.MyValues import MyValues
 
@@ -61,10 +60,14 @@ class MCP320x:
     Standard is the MCP3208, but is will also work wiht the MCP3202, MCP3204, MCP3002, MCP3004 and MCP3008."""
 
     def __init__(self, cs_bar_pin, clk_pin=1000000, mosi_pin=0, miso_pin=0, chip='MCP3208',
-                 channel_max=None, bit_length=None, single_ended=True):
+                 channel_max=None, bit_length=None, single_ended=True, oversample=1, decimate="boxcar",
+                 channel_map=None):
         """Initialize the code and set the GPIO pins.
         The last argument, ch_max, is 2 for the MCP3202, 4 for the
-        MCP3204 or 8 for the MCS3208."""
+        MCP3204 or 8 for the MCS3208.
+        channel_map is the list of inputs for scan_map(), which can mix single ended and differential inputs,
+        see set_channel_map(). The default is all channels, in the mode set by single_ended.
+        With oversample > 1 the volts are the decimated average of oversample conversions, see set_oversample()."""
 
         self._CLK = clk_pin
         self._MOSI = mosi_pin
@@ -94,8 +97,11 @@ class MCP320x:
 
         self._SingleEnded = single_ended
         self._Vref = 3.3
-        self._values = MyValues(self.read_adc, self._ChannelMax)
-        self._volts = MyValues(self.read_volts, self._ChannelMax)
+        # With the 3 byte control words, the n bit result is in bits 11 to 12-n of the last two bytes read.
+        self._shift = 12 - self._BitLength
+        self._mask = self.get_value_max()
+        self._values = MyValues(self.read_adc, self._ChannelMax, self.scan)
+        self._volts = MyValues(self.read_volts, self._ChannelMax, self.scan_volts)
 
         # This is used to speed up the SPIDEV communication. Send out MSB first.
         # control[0] - bit7-3: upper 5 bits 0, because we can only send 8 bit sequences.
@@ -109,6 +115,14 @@ class MCP320x:
             self._control0 = [0b00000110, 0b00000000, 0]  # Pre-compute part of the control word.
         else:
             self._control0 = [0b00000100, 0b00000000, 0]  # Pre-compute part of the control word.
+        # The complete control words for each channel, used by scan().
+        self._controls = [self._control_word(channel, self._SingleEnded) for channel in range(self._ChannelMax)]
+        if channel_map is None:
+            if self._SingleEnded:
+                channel_map = list(range(self._ChannelMax))
+            else:
+                channel_map = [(channel, channel ^ 1) for channel in range(self._ChannelMax)]
+        self.set_channel_map(channel_map)
 
         if self._MOSI > 0:  # Bit Bang mode
             assert self._MISO != 0 and self._CLK < 32
@@ -130,6 +144,10 @@ class MCP320x:
             self._dev.max_speed_hz = self._CLK          # Set the data rate
             self._dev.bits_per_word = 8                 # Number of bit per word. ALWAYS 8
 
+        self._decimator = None
+        if oversample > 1:
+            self.set_oversample(oversample, decimate)
+
     def __del__(self):
         """ Cleanup the GPIO before being destroyed """
         if self._MOSI > 0:
@@ -176,6 +194,12 @@ class MCP320x:
 
         return bit
 
+    @staticmethod
+    def _control_word(channel, single_ended):
+        """Return the 3 byte SPIdev control word for channel, which for differential mode is the code of the pair."""
+        return [0b00000100 | (int(bool(single_ended)) << 1) | ((channel & 0b100) >> 2), (channel & 0b011) << 6, 0]
+
+    @profiled
     def read_adc(self, channel):
         """This reads the actual ADC value, after connecting the analog multiplexer to
         the desired channel.
@@ -191,60 +215,254 @@ class MCP320x:
             # and sets single/differential more.
             control = [self._control0[0] + ((channel & 0b100) >> 2), self._control0[1]+((channel & 0b011) << 6), 0]
             dat = self._dev.xfer(control)
-            value = (dat[1] << 8)+dat[2]  # Unpack the two 8-bit words to a single integer.
+            value = (((dat[1] << 8) | dat[2]) >> self._shift) & self._mask  # Unpack the two 8-bit words.
             return value
 
         else:
-            # Bit Bang code.
-            # To read out this chip you need to send:
-            # 1 - start bit
-            # 2 - Single ended (1) or differential (0) mode
-            # 3 - Channel select: 1 bit for x=2 or 3 bits for x=4,8
-            # 4 - MSB first (1) or LSB first (0)
-            #
-            # Start of sequence sets CS_bar low, and sends sequence
-            #
-            GPIO.output(self._CLK, 0)                # Make sure clock starts low.
-            GPIO.output(self._MOSI, 0)
-            GPIO.output(self._CS_bar, 0)             # Select the chip.
-            self.send_bit(1)                        # Start bit = 1
-            self.send_bit(self._SingleEnded)   # Select single or differential
-            if self._ChannelMax > 2:
-                self.send_bit(int((channel & 0b100) > 0))  # Send high bit of channel = DS2
-                self.send_bit(int((channel & 0b010) > 0))  # Send mid  bit of channel = DS1
-                self.send_bit(int((channel & 0b001) > 0))  # Send low  bit of channel = DS0
-            else:
-                self.send_bit(channel)
+            return self._read_bitbang(channel, self._SingleEnded)
+
+    def _read_bitbang(self, channel, single_ended):
+        """Read the ADC value of channel with the GPIO bit bang interface."""
+        # Bit Bang code.
+        # To read out this chip you need to send:
+        # 1 - start bit
+        # 2 - Single ended (1) or differential (0) mode
+        # 3 - Channel select: 1 bit for x=2 or 3 bits for x=4,8
+        # 4 - MSB first (1) or LSB first (0)
+        #
+        # Start of sequence sets CS_bar low, and sends sequence
+        #
+        GPIO.output(self._CLK, 0)                # Make sure clock starts low.
+        GPIO.output(self._MOSI, 0)
+        GPIO.output(self._CS_bar, 0)             # Select the chip.
+        self.send_bit(1)                        # Start bit = 1
+        self.send_bit(int(bool(single_ended)))  # Select single or differential
+        if self._ChannelMax > 2:
+            self.send_bit(int((channel & 0b100) > 0))  # Send high bit of channel = DS2
+            self.send_bit(int((channel & 0b010) > 0))  # Send mid  bit of channel = DS1
+            self.send_bit(int((channel & 0b001) > 0))  # Send low  bit of channel = DS0
+        else:
+            self.send_bit(channel)
 
-            self.send_bit(0)                       # MSB First (for MCP3x02) or don't care.
+        self.send_bit(0)                       # MSB First (for MCP3x02) or don't care.
 
-            # The clock is currently low, and the dummy bit = 0 is on the output of the ADC
-            #
-            self.read_bit()  # Read the bit.
+        # The clock is currently low, and the dummy bit = 0 is on the output of the ADC
+        #
+        self.read_bit()  # Read the bit.
 
-            data = 0
-            for i in range(self._BitLength):
-                # Note you need to shift left first, or else you shift the last bit (bit 0)
-                # to the 1 position.
-                data <<= 1
-                bit = self.read_bit()
-                data += bit
+        data = 0
+        for i in range(self._BitLength):
+            # Note you need to shift left first, or else you shift the last bit (bit 0)
+            # to the 1 position.
+            data <<= 1
+            bit = self.read_bit()
+            data += bit
 
-            GPIO.output(self._CS_bar, 1)  # Unselect the chip.
+        GPIO.output(self._CS_bar, 1)  # Unselect the chip.
 
-            return data
+        return data
 
     def read_volts(self, channel):
-        """Read the ADC value from channel and convert to volts, assuming that Vref is set correctly. """
+        """Read the ADC value from channel and convert to volts, assuming that Vref is set correctly.
+        If oversampling is on, this is the decimated value of the oversampled conversions."""
+        if self._decimator is not None:
+            return self._Vref * self.read_oversampled(channel) / self.get_value_max()
         return self._Vref * self.read_adc(channel) / self.get_value_max()
 
+    @profiled
+    def scan(self, channels=None):
+        """Read the ADC values of a list of channels, or all channels if channels=None, and return them as a list.
+        For SPIdev, the pre-computed control words of all the channels are sent in one batched transfer."""
+        if channels is None:
+            channels = range(self._ChannelMax)
+        for channel in channels:
+            if channel < 0 or channel >= self._ChannelMax:
+                print("Error - chip does not have channel = {}".format(channel))
+                return []
+
+        if self._MOSI == 0:
+            controls = self._controls
+            return self._unpack(xfer_frames(self._dev, [byte for channel in channels for byte in controls[channel]], 3))
+        else:
+            return [self.read_adc(channel) for channel in channels]
+
+    def _unpack(self, dat):
+        """Unpack the ADC values from the bytes read with a batch of 3 byte control words."""
+        shift = self._shift
+        mask = self._mask
+        return [(((dat[i + 1] << 8) | dat[i + 2]) >> shift) & mask for i in range(0, len(dat), 3)]
+
+    def set_channel_map(self, channel_map):
+        """Set the list of inputs that scan_map() reads. Each entry is either a channel number, for a single ended
+        input, or a tuple (plus, minus) for a differential input, which must be the two channels of a pair:
+        (0, 1), (1, 0), (2, 3), (3, 2), ... Single ended and differential entries can be mixed, and a channel can
+        appear more than once. The control words of all the entries are compiled here, once.
+        Note that a differential input reads 0 when the plus input is below the minus input."""
+        entries = []
+        for entry in channel_map:
+            if isinstance(entry, (tuple, list)):
+                plus, minus = entry
+                if plus < 0 or plus >= self._ChannelMax or minus != plus ^ 1:
+                    raise ValueError("Differential input {} is not a pair of channels of the chip.".format(entry))
+                entries.append((plus, False))
+            else:
+                if entry < 0 or entry >= self._ChannelMax:
+                    raise ValueError("Chip does not have channel = {}".format(entry))
+                entries.append((entry, True))
+        self._channel_map = [tuple(entry) if isinstance(entry, list) else entry for entry in channel_map]
+        self._map_entries = entries
+        self._map_frames = [byte for channel, single_ended in entries
+                            for byte in self._control_word(channel, single_ended)]
+
+    @property
+    def channel_map(self):
+        """The list of inputs read by scan_map(). Set it with set_channel_map()."""
+        return list(self._channel_map)
+
+    @profiled
+    def scan_map(self, n=None):
+        """Read all the inputs of the channel map, in one batched transfer for SPIdev, and return the ADC values as
+        a list in the order of the map. With n, do n scans of the map in one transfer and return a numpy array
+        with shape (n, len(channel_map))."""
+        count = 1 if n is None else n
+        if self._MOSI == 0:
+            dat = xfer_frames(self._dev, self._map_frames * count, 3)
+            if n is None:
+                return self._unpack(dat)
+            import numpy as np
+            dat = np.array(dat, dtype=np.int32).reshape(-1, 3)
+            values = (((dat[:, 1] << 8) | dat[:, 2]) >> self._shift) & self._mask
+        else:
+            values = [self._read_bitbang(channel, single_ended)
+                      for i in range(count) for channel, single_ended in self._map_entries]
+            if n is None:
+                return values
+            import numpy as np
+        return np.asarray(values, dtype=np.int32).reshape(n, len(self._map_entries))
+
+    def scan_map_volts(self, n=None):
+        """Like scan_map(), but return volts."""
+        scale = self._Vref / self.get_value_max()
+        values = self.scan_map(n)
+        if n is None:
+            return [value * scale for value in values]
+        return values * scale
+
+    def scan_volts(self, channels=None):
+        """Read the ADC values of a list of channels, or all channels, and return them as a list of volts."""
+        scale = self._Vref / self.get_value_max()
+        if self._decimator is not None:
+            if channels is None:
+                channels = range(self._ChannelMax)
+            return [self.read_oversampled(channel) * scale for channel in channels]
+        return [value * scale for value in self.scan(channels)]
+
+    @profiled
+    def capture(self, channel, n):
+        """Do n conversions of channel back to back and return the ADC values as a numpy array.
+        For SPIdev the conversions are sent as one batched transfer, with CS released between them."""
+        import numpy as np      # Only loaded when needed, so that a plain read_adc() script starts fast.
+        if channel < 0 or channel >= self._ChannelMax:
+            print("Error - chip does not have channel = {}".format(channel))
+            return np.zeros(0, dtype=np.int32)
+
+        if self._MOSI == 0:
+            dat = np.array(xfer_frames(self._dev, self._controls[channel] * n, 3), dtype=np.int32).reshape(n, 3)
+            return (((dat[:, 1] << 8) | dat[:, 2]) >> self._shift) & self._mask
+        else:
+            return np.array([self.read_adc(channel) for i in range(n)], dtype=np.int32)
+
+    def set_oversample(self, oversample, decimate="boxcar", order=3, taps=None):
+        """Set the oversampling for read_volts() and read_oversampled().
+        Input:
+         * oversample = number of conversions for each value, 1 turns oversampling off.
+         * decimate   = the decimation filter: "boxcar", "cic" or "fir", see DevLib.Decimator.
+         * order      = number of stages of the "cic" filter.
+         * taps       = the coefficients of the "fir" filter, default a low pass at the decimated Nyquist frequency."""
+        if oversample <= 1:
+            self._decimator = None
+            return
+        from DevLib.Decimator import Decimator
+        self._decimator = Decimator(oversample, decimate, order, taps)
+
+    @property
+    def oversample(self):
+        """The oversampling factor, 1 if oversampling is off."""
+        return self._decimator.factor if self._decimator is not None else 1
+
+    @property
+    def oversample_bits(self):
+        """The number of bits of the integers from read_oversampled(channel, integer=True)."""
+        if self._decimator is None:
+            return self._BitLength
+        return self._BitLength + int(self._decimator.extra_bits)
+
+    def read_oversampled(self, channel, samples=None, integer=False):
+        """Read channel with oversampling and decimation.
+        Input:
+         * channel = the channel to read.
+         * samples = number of decimated values to return as a numpy array. If None, return a single value.
+         * integer = If True, return integers with oversample_bits bits, i.e. the value times 2**(extra bits),
+                     instead of floats in units of the ADC LSB.
+        All the conversions needed are done in one batched transfer."""
+        from DevLib.Decimator import Decimator
+        decimator = self._decimator if self._decimator is not None else Decimator(1)
+        n = 1 if samples is None else samples
+        out = decimator(self.capture(channel, decimator.n_input(n)))
+        if integer:
+            out = (out * (1 << (self.oversample_bits - self._BitLength)) + 0.5).astype(int)
+        if samples is None:
+            return out[0].item()
+        return out
+
+    def resolution_report(self, channel, samples=256):
+        """Measure the effective resolution on channel, which should have a constant input, with the current
+        oversampling. Returns a dict with the conversion and output rates, the RMS noise in LSB of the raw
+        conversions and of the decimated output, and the effective number of bits (ENOB) of each, compared
+        to the gain expected for white noise."""
+        import math
+        import time
+        import numpy as np
+        from DevLib.Decimator import Decimator
+        decimator = self._decimator if self._decimator is not None else Decimator(1)
+        n = decimator.n_input(samples)
+        start = time.perf_counter()
+        raw = self.capture(channel, n)
+        duration = time.perf_counter() - start
+        out = decimator(raw)
+
+        def enob(rms):
+            # A perfect ADC has the quantization noise of 1/sqrt(12) LSB.
+            return self._BitLength - math.log2(rms * math.sqrt(12)) if rms > 0 else None
+
+        raw_rms = float(np.std(raw))
+        out_rms = float(np.std(out))
+        report = {
+            "channel": channel,
+            "oversample": decimator.factor,
+            "decimate": decimator.kind,
+            "taps": decimator.history,
+            "conversion_rate_hz": n / duration if duration > 0 else None,
+            "output_rate_hz": n / duration / decimator.factor if duration > 0 else None,
+            "raw_rms_lsb": raw_rms,
+            "output_rms_lsb": out_rms,
+            "enob_raw": enob(raw_rms),
+            "enob_output": enob(out_rms),
+            "extra_bits_expected": decimator.extra_bits,
+            "output_bits": self.oversample_bits,
+        }
+        if report["enob_raw"] is not None and report["enob_output"] is not None:
+            report["extra_bits_measured"] = report["enob_output"] - report["enob_raw"]
+        return report
+
+    @profiled
     def fast_read_adc0(self):
         """This reads the actual ADC value of channel 0, with as little overhead as possible.
         Use with SPIDEV ONLY!!!!
         returns: The ADC value as an n-bit integer value, with n=10 or 12 depending on the chip."""
 
         dat = self._dev.xfer(self._control0)
-        value = (dat[1] << 8) + dat[2]
+        value = (((dat[1] << 8) | dat[2]) >> self._shift) & self._mask
         return value
 
     @property
@@ -29,7 +29,8 @@
 # For this chip, we thus need to send the first byte of data as the register address,
 # and the second byte of data as byte0, etc.
 # Verified with the Analog Discovery that this is correct.
-import smbus
+from DevLib.backends import smbus
+from DevLib.Profiling import profiled
 
 class MCP4725(object):
     """
@@ -98,6 +99,7 @@ class MCP4725(object):
         self._bus.write_i2c_block_data(self._address,command,[hi,lo])
 
 
+    @profiled
     def write(self,val):
         '''
         Write a new value to the DAC, setting the Vout to the new value.
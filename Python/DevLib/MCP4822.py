@@ -20,15 +20,7 @@
 #
 # The output voltage will be Vout = Gain*( Vref*D/4096)  with Vref = 2.048 V
 #
-try:
-    import RPi.GPIO as GPIO
-except:
-    try:
-        import Adafruit_BBIO as GPIO
-    except:
-        raise("Could not find a GPIO library")
-
-import spidev
+from DevLib.backends import spidev
 # from DevLib import BBSpiDev
 
 
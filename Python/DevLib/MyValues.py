@@ -6,16 +6,38 @@
 #
 # This is a helper class to allow values to be set like a list for any of the chips.
 #
+import operator
 
-class MyValues:
-    """Class for getting the value of the chip, which mimics a list."""
 
-    def __init__(self, getter, max_num):
+class MyValues:
+    """Class for getting the value of the chip, which mimics a list.
+    Input:
+     * getter      = function(channel) that reads one channel.
+     * max_num     = number of channels.
+     * bulk_getter = function(channels) that reads a list of channels in one go, and returns a list.
+                     If None, getter is called for each channel.
+    Slices (values[0:4]), iteration, np.asarray(values) and str(values) each use a single bulk read."""
+
+    def __init__(self, getter, max_num, bulk_getter=None):
         self._getter = getter
         self._MAX = max_num
-        self._n = 0
+        self._bulk_getter = bulk_getter
+
+    def _read_bulk(self, channels):
+        if not channels:
+            return []
+        if self._bulk_getter is None:
+            return [self._getter(ch) for ch in channels]
+        return self._bulk_getter(channels)
 
     def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self._read_bulk(list(range(*idx.indices(self._MAX))))
+        idx = operator.index(idx)
+        if idx < 0:
+            idx += self._MAX
+        if idx < 0 or idx >= self._MAX:
+            raise IndexError("Channel index out of range.")
         return self._getter(idx)
 
     def __setitem__(self, idx, val):
@@ -25,20 +47,14 @@ class MyValues:
         return self._MAX
 
     def __iter__(self):
-        self._n = 0
-        return self
+        return iter(self[:])
 
-    def __next__(self):
-        if self._n < len(self):
-            result = self[self._n]
-            self._n += 1
-            return result
-        else:
-            raise StopIteration
+    def __array__(self, dtype=None, copy=None):
+        import numpy as np
+        return np.array(self[:], dtype=dtype)
 
     def __repr__(self):
         return str(self)
 
     def __str__(self):
-        tmp_list = [x for x in self]
-        return str(tmp_list)
+        return str(self[:])
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+#
+# Online (streaming) statistics for long running measurements, such as the calibration of a clock
+# with a frequency counter.
+#
+# All the classes here update in constant time per sample and use a fixed amount of memory, so
+# a calibration can run for days without slowing down or filling up the memory.
+#
+#  * Welford      - Mean, variance and standard deviation with Welford's algorithm. The naive
+#                   sqrt(ssq/n - mean^2) loses all its precision when the mean is large compared
+#                   to the standard deviation, as for a 10 MHz clock that is stable to 0.1 Hz.
+#  * LinearFit    - Straight line fit y = a + b*t, updated one point at a time, to measure drift.
+#  * AllanDeviation - Overlapping Allan deviation for averaging times tau = 2^k * tau0.
+#  * FrequencyStats - All of the above for a series of frequency measurements.
+#
+# Author: Maurik Holtrop
+#
+import math
+from collections import deque
+
+import numpy as np
+
+
+class Welford:
+    """Running mean and variance with Welford's algorithm.
+
+    Example code:
+
+    .. code-block:: python
+
+        from DevLib.OnlineStats import Welford
+        w = Welford()
+        for x in data:
+            w.add(x)
+        print(w.mean, w.std)
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget all the samples."""
+        self.n = 0
+        self.mean = 0.
+        self._m2 = 0.      # Sum of squares of the differences from the mean.
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        """Add the sample x."""
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    @property
+    def variance(self):
+        """The sample variance (divided by n-1), or nan if there are less than 2 samples."""
+        if self.n < 2:
+            return math.nan
+        return self._m2 / (self.n - 1)
+
+    @property
+    def std(self):
+        """The sample standard deviation."""
+        return math.sqrt(self.variance)
+
+    @property
+    def error(self):
+        """The standard error on the mean."""
+        return self.std / math.sqrt(self.n) if self.n else math.nan
+
+
+class LinearFit:
+    """Running least squares fit of a straight line y = intercept + slope*t.
+    The sums are kept relative to the running means, as in Welford's algorithm, so the fit stays
+    accurate for large t, such as time stamps from time.time()."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget all the points."""
+        self.n = 0
+        self.mean_t = 0.
+        self.mean_y = 0.
+        self._stt = 0.
+        self._sty = 0.
+        self._syy = 0.
+
+    def add(self, t, y):
+        """Add the point (t, y)."""
+        self.n += 1
+        dt = t - self.mean_t
+        dy = y - self.mean_y
+        self.mean_t += dt / self.n
+        self.mean_y += dy / self.n
+        self._stt += dt * (t - self.mean_t)
+        self._sty += dt * (y - self.mean_y)
+        self._syy += dy * (y - self.mean_y)
+
+    @property
+    def slope(self):
+        """The slope, dy/dt, of the fitted line."""
+        if self.n < 2 or self._stt == 0:
+            return math.nan
+        return self._sty / self._stt
+
+    @property
+    def intercept(self):
+        """The value of the fitted line at t=0."""
+        return self.mean_y - self.slope * self.mean_t
+
+    @property
+    def slope_error(self):
+        """The standard error on the slope, from the scatter of the points around the line."""
+        if self.n < 3 or self._stt == 0:
+            return math.nan
+        residual = max(self._syy - self._sty * self._sty / self._stt, 0.)
+        return math.sqrt(residual / (self.n - 2) / self._stt)
+
+    def __call__(self, t):
+        """Evaluate the fitted line at t."""
+        return self.mean_y + self.slope * (t - self.mean_t)
+
+
+class AllanDeviation:
+    """Overlapping Allan deviation of a series of frequency (or fractional frequency) samples y,
+    taken every tau0 seconds, for the averaging times tau = m * tau0 with m = 1, 2, 4, ... 2^(levels-1).
+
+    The Allan variance for averaging factor m is computed from the phase x (the running sum of y):
+
+        sigma^2(m*tau0) = < (x[i+2m] - 2 x[i+m] + x[i])^2 > / (2 m^2)
+
+    Fully overlapping estimates need the last 2m phases for every m. Instead, the phases are kept in
+    a decimation tree: level k (m = 2^k) stores only every (m/overlap)-th phase in a ring buffer of
+    2*overlap+1 entries, so each tau is estimated with overlap terms per tau of data, with a memory
+    of levels*(2*overlap+1) numbers and an amortized cost per sample that does not depend on the run time.
+    Set overlap >= 2^(levels-1) to get the fully overlapping Allan deviation."""
+
+    def __init__(self, tau0=1., levels=20, overlap=8):
+        """Input:
+         * tau0    = Time between the samples in seconds.
+         * levels  = Number of tau values, tau = tau0, 2*tau0, ... 2^(levels-1)*tau0.
+         * overlap = Number of terms per tau. Must be a power of 2."""
+        if overlap < 1 or overlap & (overlap - 1):
+            raise ValueError("overlap must be a power of 2.")
+        self.tau0 = tau0
+        self.levels = levels
+        self._shift = overlap.bit_length() - 1
+        self._span = [min(1 << k, overlap) for k in range(levels)]    # Stored phases per m.
+        self.reset()
+
+    def reset(self):
+        """Forget all the samples."""
+        self.n = 0
+        self._ref = None
+        self._x = 0.
+        self._buf = [deque([0.], maxlen=2 * p + 1) for p in self._span]
+        self._sum2 = np.zeros(self.levels)
+        self._count = np.zeros(self.levels, dtype=np.int64)
+
+    def add(self, y):
+        """Add the frequency sample y."""
+        if self._ref is None:
+            self._ref = y           # Subtract the first sample, to keep the phase small.
+        self.n += 1
+        self._x += y - self._ref
+        # Level k stores a phase every 2^(k-shift) samples, i.e. when n has at least k-shift trailing zeros.
+        top = min(self.levels, self._shift + ((self.n & -self.n).bit_length()))
+        for k in range(top):
+            buf = self._buf[k]
+            buf.append(self._x)
+            if len(buf) == buf.maxlen:
+                p = self._span[k]
+                d = buf[2 * p] - 2 * buf[p] + buf[0]
+                self._sum2[k] += d * d
+                self._count[k] += 1
+
+    @property
+    def m(self):
+        """The averaging factors for all the levels."""
+        return 1 << np.arange(self.levels)
+
+    @property
+    def counts(self):
+        """The number of terms in the estimate for each tau."""
+        return self._count.copy()
+
+    def result(self):
+        """Return (tau, adev, n_terms) as numpy arrays, for the values of tau that have an estimate."""
+        ok = self._count > 0
+        m = self.m[ok].astype(float)
+        adev = np.sqrt(self._sum2[ok] / (2 * m * m * self._count[ok]))
+        return m * self.tau0, adev, self._count[ok]
+
+
+class FrequencyStats:
+    """Statistics of a series of frequency measurements: the mean and standard deviation, the drift
+    of the frequency with time, and the Allan deviation.
+
+    Example code:
+
+    .. code-block:: python
+
+        from DevLib.OnlineStats import FrequencyStats
+        stats = FrequencyStats(tau0=1.)
+        for t, f in measurements:
+            stats.add(f, t)
+        print(stats.mean, stats.std, stats.drift)
+        tau, adev, n = stats.allan.result()
+    """
+
+    def __init__(self, tau0=1., levels=20, overlap=8):
+        self.stats = Welford()
+        self.fit = LinearFit()
+        self.allan = AllanDeviation(tau0, levels, overlap)
+
+    def add(self, freq, t=None):
+        """Add the frequency measurement freq taken at time t. If t is None, the samples are
+        assumed to be tau0 apart."""
+        if t is None:
+            t = self.stats.n * self.allan.tau0
+        self.stats.add(freq)
+        self.fit.add(t, freq)
+        self.allan.add(freq)
+
+    @property
+    def n(self):
+        """The number of measurements."""
+        return self.stats.n
+
+    @property
+    def mean(self):
+        """The mean frequency."""
+        return self.stats.mean
+
+    @property
+    def std(self):
+        """The standard deviation of the frequency."""
+        return self.stats.std
+
+    @property
+    def drift(self):
+        """The drift of the frequency in Hz/s."""
+        return self.fit.slope
+
+    @property
+    def drift_error(self):
+        """The error on the drift in Hz/s."""
+        return self.fit.slope_error
+
+
+def main(argv):
+    """Test with simulated white frequency noise, for which the Allan deviation should fall as 1/sqrt(tau)."""
+    rng = np.random.default_rng(605)
+    n = int(argv[1]) if len(argv) > 1 else 100000
+    stats = FrequencyStats(tau0=1.)
+    y = 10e6 + 0.5 * rng.standard_normal(n) + 1e-6 * np.arange(n)
+    for i in range(n):
+        stats.add(y[i], float(i))
+    print(f"mean = {stats.mean:.6f} Hz  std = {stats.std:.6f} Hz  (numpy: {y.mean():.6f}, {y.std(ddof=1):.6f})")
+    print(f"drift = {stats.drift:.4e} +/- {stats.drift_error:.1e} Hz/s  (true 1e-6)")
+    for tau, adev, cnt in zip(*stats.allan.result()):
+        print(f"tau = {tau:8.0f} s  adev = {adev:10.6f} Hz  (white: {0.5 / math.sqrt(tau):10.6f})  n = {cnt}")
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv)
@@ -0,0 +1,338 @@
+#
+# Opt-in profiling of the hot methods of the DevLib drivers.
+#
+# The methods that do the work (MCP320x.read_adc, BBSpiDev.transfer, APA102.show, BME280.read_data, ...)
+# are marked with the @profiled decorator. While profiling is off, which is the default, the decorator leaves
+# the plain method in the class, so there is no cost at all. Profiling is switched on with enable(), the
+# profiling() context manager, or by setting DEVLIB_PROFILE=1 in the environment. The methods are then
+# replaced with timers that collect, for each method:
+#  * the number of calls,
+#  * the total time, and the "self" time: the total minus the time spent in other timed calls inside it,
+#  * the minimum and maximum time, and a histogram with 4 bins per factor 2 in time, for percentiles.
+# With buses=True (the default) the calls to the GPIO, spidev and smbus libraries (see DevLib.backends) are
+# timed too, so the self time of a driver method is the time spent in Python, and the bus time shows up
+# as GPIO.output, spidev.xfer, smbus.read_i2c_block_data, etc. This includes the SPI and I2C devices that were
+# opened before profiling was switched on. Waits for a conversion have their own method, e.g. ADS1115._wait_conversion.
+#
+# Example:
+#
+#   from DevLib import MCP320x, Profiling
+#   adc = MCP320x(0)
+#   with Profiling.profiling() as scope:
+#       for i in range(1000):
+#           adc.read_adc(0)
+#   print(scope.report())
+#
+#   Profiling.enable()
+#   Profiling.serve(8605)          # Statistics as JSON on http://localhost:8605/
+#   ... run the acquisition ...
+#   Profiling.export("profile.json")
+#
+# Author: Maurik Holtrop
+#
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_registry = []           # (class, method name, function) for every @profiled method.
+_stats = {}              # name -> MethodStats
+_local = threading.local()
+_enabled = False
+_buses = False
+_patched = []            # (class, method name, whether the class had its own method, the method) for bus timing.
+
+
+class MethodStats(object):
+    """Call count, time and histogram of the time of one method. Times are in ns."""
+
+    BINS = 4             # Histogram bins per factor 2.
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.self_time = 0
+        self.min = None
+        self.max = 0
+        self.histogram = [0] * (64 * self.BINS)
+
+    def add(self, dt, self_dt):
+        self.count += 1
+        self.total += dt
+        self.self_time += self_dt
+        if self.min is None or dt < self.min:
+            self.min = dt
+        if dt > self.max:
+            self.max = dt
+        self.histogram[self._bin(dt)] += 1
+
+    @classmethod
+    def _bin(cls, dt):
+        b = dt.bit_length()
+        if b <= 2:
+            return dt                   # Bins 0 to 3 are 0, 1, 2 and 3 ns.
+        return b * cls.BINS + ((dt >> (b - 3)) & (cls.BINS - 1)) - 2 * cls.BINS
+
+    @classmethod
+    def _bin_edge(cls, i):
+        """The upper edge of bin i, in ns."""
+        if i <= 3:
+            return i + 1
+        b, frac = divmod(i + 2 * cls.BINS, cls.BINS)
+        return (cls.BINS + frac + 1) << (b - 3)
+
+    def percentile(self, q):
+        """Estimate of the q-th percentile of the time in ns, from the histogram (the upper edge of the bin)."""
+        if self.count == 0:
+            return 0
+        target = q / 100. * self.count
+        total = 0
+        for i, n in enumerate(self.histogram):
+            total += n
+            if n and total >= target:
+                return min(self._bin_edge(i), self.max)
+        return self.max
+
+    def copy(self):
+        other = MethodStats(self.name)
+        other.merge(self)
+        return other
+
+    def merge(self, other):
+        """Add the statistics of other to these."""
+        self.count += other.count
+        self.total += other.total
+        self.self_time += other.self_time
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+    def as_dict(self):
+        """The statistics in a dict, with the times in microseconds."""
+        return {
+            "count": self.count,
+            "total_s": self.total * 1e-9,
+            "self_s": self.self_time * 1e-9,
+            "mean_us": self.total / self.count * 1e-3 if self.count else 0.,
+            "min_us": (self.min or 0) * 1e-3,
+            "max_us": self.max * 1e-3,
+            "p50_us": self.percentile(50) * 1e-3,
+            "p90_us": self.percentile(90) * 1e-3,
+            "p99_us": self.percentile(99) * 1e-3,
+            "histogram_us": {"{:.6g}".format(self._bin_edge(i) * 1e-3): n for i, n in enumerate(self.histogram) if n},
+        }
+
+
+def _timed(name, func):
+    """Return a wrapper of func that adds the time of each call to the statistics of name."""
+    stat = _stats.get(name)
+    if stat is None:
+        stat = _stats[name] = MethodStats(name)
+    perf = time.perf_counter_ns
+
+    @functools.wraps(func)
+    def timer(*args, **kwargs):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(0)             # Time spent in timed calls made by func.
+        start = perf()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            dt = perf() - start
+            inner = stack.pop()
+            if stack:
+                stack[-1] += dt
+            stat.add(dt, dt - inner)
+    timer.__wrapped_by_profiling__ = True
+    return timer
+
+
+class profiled(object):
+    """Decorator for a method that is timed while profiling is on.
+    Without profiling, the class gets the plain method, so it costs nothing."""
+
+    def __init__(self, func):
+        self._func = func
+        functools.update_wrapper(self, func)
+
+    def __set_name__(self, owner, name):
+        _registry.append((owner, name, self._func))
+        if _enabled:
+            setattr(owner, name, _timed(owner.__name__ + "." + name, self._func))
+        else:
+            setattr(owner, name, self._func)
+
+    def __call__(self, *args, **kwargs):
+        return self._func(*args, **kwargs)
+
+
+_SPI_METHODS = ("xfer", "xfer2", "xfer3", "xfer_frames", "readbytes", "writebytes", "writebytes2")
+_I2C_METHODS = ("read_byte", "write_byte", "read_byte_data", "write_byte_data", "read_word_data",
+                "write_word_data", "read_i2c_block_data", "write_i2c_block_data", "i2c_rdwr")
+
+
+def _time_methods(cls, prefix, methods):
+    """Replace the methods of the device class cls by timers. This times every device of the class,
+    also the ones that are already open."""
+    for name in methods:
+        if not hasattr(cls, name):
+            continue
+        own = name in cls.__dict__
+        original = cls.__dict__[name] if own else None
+        try:
+            setattr(cls, name, _timed(prefix + "." + name, getattr(cls, name)))
+        except TypeError:       # A class of a C extension that cannot be changed.
+            continue
+        _patched.append((cls, name, own, original))
+
+
+def _time_buses():
+    """Time the GPIO calls, and the transfers of all SPI and I2C devices of the selected backends."""
+    from DevLib import backends
+    try:
+        gpio = backends.get("gpio")
+        for name in ("output", "input"):
+            setattr(backends.GPIO, name, _timed("GPIO." + name, getattr(gpio, name)))
+    except ImportError:
+        pass
+    for kind, prefix, factory, methods in (("spi", "spidev", "SpiDev", _SPI_METHODS),
+                                           ("i2c", "smbus", "SMBus", _I2C_METHODS)):
+        try:
+            cls = getattr(backends.get(kind), factory)
+        except ImportError:
+            continue
+        cls = getattr(cls, "func", cls)      # The simulator makes its devices with a functools.partial.
+        if isinstance(cls, type):
+            _time_methods(cls, prefix, methods)
+
+
+def _untime_buses():
+    """Restore the GPIO calls and the device classes."""
+    from DevLib import backends
+    backends.GPIO._clear()
+    while _patched:
+        cls, name, own, original = _patched.pop()
+        if own:
+            setattr(cls, name, original)
+        else:
+            delattr(cls, name)
+
+
+def enable(buses=True):
+    """Switch profiling on. With buses=True the GPIO, SPI and I2C calls are timed too."""
+    global _enabled, _buses
+    if not _enabled:
+        for owner, name, func in _registry:
+            setattr(owner, name, _timed(owner.__name__ + "." + name, func))
+        _enabled = True
+    if buses and not _buses:
+        _time_buses()
+        _buses = True
+
+
+def disable():
+    """Switch profiling off. The statistics are kept."""
+    global _enabled, _buses
+    for owner, name, func in _registry:
+        setattr(owner, name, func)
+    if _buses:
+        _untime_buses()
+    _enabled = False
+    _buses = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Clear the statistics."""
+    for stat in _stats.values():
+        stat.reset()
+
+
+def stats():
+    """Return a dict name: statistics (see MethodStats.as_dict) for every method that was called."""
+    return {name: stat.as_dict() for name, stat in sorted(_stats.items()) if stat.count}
+
+
+def report(statistics=None):
+    """Return a table of the statistics, sorted by total time."""
+    if statistics is None:
+        statistics = stats()
+    lines = ["{:34s} {:>9s} {:>10s} {:>10s} {:>9s} {:>9s} {:>9s} {:>9s}".format(
+        "method", "calls", "total [s]", "self [s]", "mean[us]", "p50[us]", "p99[us]", "max[us]")]
+    for name, s in sorted(statistics.items(), key=lambda item: -item[1]["total_s"]):
+        lines.append("{:34s} {:9d} {:10.4f} {:10.4f} {:9.2f} {:9.2f} {:9.2f} {:9.2f}".format(
+            name, s["count"], s["total_s"], s["self_s"], s["mean_us"], s["p50_us"], s["p99_us"], s["max_us"]))
+    return "\n".join(lines)
+
+
+def export(filename):
+    """Write the statistics to filename as JSON."""
+    with open(filename, "w") as f:
+        json.dump({"time": time.time(), "stats": stats()}, f, indent=1)
+
+
+def serve(port=8605, host="127.0.0.1"):
+    """Serve the statistics as JSON on http://host:port/ from a background thread.
+    Returns the server; call server.shutdown() to stop it."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps({"time": time.time(), "enabled": _enabled, "stats": stats()}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Scope(object):
+    """The statistics of a profiling() block, available after the block."""
+
+    def __init__(self):
+        self.stats = {}
+
+    def report(self):
+        return report(self.stats)
+
+
+@contextmanager
+def profiling(buses=True):
+    """Profile the code in a with block. The statistics of the block are in the Scope that is returned,
+    and are also added to the global statistics afterwards."""
+    was_enabled = _enabled
+    saved = {name: stat.copy() for name, stat in _stats.items()}
+    reset()
+    enable(buses)
+    scope = Scope()
+    try:
+        yield scope
+    finally:
+        if not was_enabled:
+            disable()
+        scope.stats = stats()
+        for name, stat in saved.items():
+            _stats[name].merge(stat)
+
+
+if os.environ.get("DEVLIB_PROFILE", "0") not in ("", "0"):
+    enable()
@@ -14,9 +14,25 @@
 # a tri-state buffer to your circuit.
 # For simplicity, and since we are not using multiple SPI devices in this example, we
 # do not have a "Chip-Select-bar" (SSbar) signal.
+#
+# The SN74HC165Chains class reads several independent shift register chains that share the CLK and LOAD
+# signals, each with its own data pin. For every clock, all the data pins are read at once with a single
+# read of the GPIO level register (GPLEV0) through /dev/gpiomem, so N chains take the same time as one.
+# Where /dev/gpiomem is not available, the pins are read one at a time with GPIO.input().
+#
+# Hardware SPI:
+# The chain can also be read with the SPI hardware, see SN74HC165.spi(). The LOAD pin is pulsed with GPIO
+# before the transfer, then the whole chain is clocked in with a single readbytes() call:
+#              SCLK = CLK of the chips,   MISO = Q of the last chip in the chain.
+# This is many times faster than the bit-bang version. Since the SN74HC165 cannot release (tri-state) its
+# output, nothing else can use the MISO line, unless you add a tri-state buffer (e.g. 74HC125) driven by CE.
 #####################################################################
 
-import RPi.GPIO as GPIO  # Setup the GPIO for RPi
+from DevLib.backends import GPIO, spidev
+from DevLib.Profiling import profiled
+import numpy as np
+import mmap
+import os
 import time
 import sys
 
@@ -37,6 +53,7 @@ class SN74HC165:
         self._Serial_CLK = serial_clk  # = CLK  - GPIO pin for the CLK (clock) pin of the shifter
         self._Serial_Load = serial_load  # = Load - GPIO pin the SH/LD-bar pin of the shifter.
         self._Serial_N = serial_n   # Number of bits to shift in. 8 bits for every SN74HC165.
+        self._dev = None
         #
         # Setup the GPIO Pins
         #
@@ -46,10 +63,42 @@ class SN74HC165:
         GPIO.output(serial_load, GPIO.HIGH)  # Load is High = ready to shift. Low = load data.
         GPIO.output(serial_clk, GPIO.LOW)
 
+    @classmethod
+    def spi(cls, serial_load, serial_n=8, spi_cs=0, spi_speed=1000000, spi_dev=None):
+        """Alternate constructor that reads the chain with an SPI device instead of bit-banging.
+        Input:
+         * serial_load= GPIO pin for the load signal, connect to LOAD of the chip.
+         * serial_n   = number of bits to read, default=8
+         * spi_cs     = SPI chip enable (0 or 1) used to open spidev.SpiDev(0, spi_cs).
+         * spi_speed  = SPI clock speed in Hz.
+         * spi_dev    = Use this already opened SPI device instead, e.g. BBSpiDev(None, clk, None, miso).
+        Example: shifter = SN74HC165.spi(20, 32)
+        """
+        self = cls.__new__(cls)
+        GPIO.setmode(GPIO.BCM)
+        self._Serial_In = None
+        self._Serial_CLK = None
+        self._Serial_Load = serial_load
+        self._Serial_N = serial_n
+        self._nbytes = (serial_n + 7) // 8
+        self._pad = 8 * self._nbytes - serial_n   # Extra bits clocked in at the end, to be dropped.
+        GPIO.setup(serial_load, GPIO.OUT)
+        GPIO.output(serial_load, GPIO.HIGH)
+
+        if spi_dev is None:
+            spi_dev = spidev.SpiDev(0, spi_cs)
+            spi_dev.max_speed_hz = spi_speed
+        spi_dev.mode = 0          # Clock low at rest, sample on the rising edge, when the chip shifts.
+        self._dev = spi_dev
+        return self
+
     def __del__(self):  # This is automatically called when the class is deleted.
         """Delete and cleanup."""
-        GPIO.cleanup(self._Serial_In)
-        GPIO.cleanup(self._Serial_CLK)
+        if self._dev is not None:
+            self._dev.close()
+        else:
+            GPIO.cleanup(self._Serial_In)
+            GPIO.cleanup(self._Serial_CLK)
         GPIO.cleanup(self._Serial_Load)
 
     def load_shifter(self):
@@ -57,11 +106,17 @@ class SN74HC165:
         GPIO.output(self._Serial_Load, GPIO.LOW)
         GPIO.output(self._Serial_Load, GPIO.HIGH)
 
+    @profiled
     def read_data(self):
         """ Shift the data into the shifter and return the obtained value.
         The bits are expected to come as Most Significant Bit (MSB) First
         to Least Significant Bit (LSB) last.
         Output:   out  - The data shifted in returned as integer."""
+        if self._dev is not None:
+            # The whole chain in one transfer. The first bit is already on Q after the load, and the
+            # SPI hardware samples it on the first rising edge of the clock.
+            data = self._dev.readbytes(self._nbytes)
+            return int.from_bytes(bytes(data), "big") >> self._pad
 
         # The SN74HC165 chip will immediately set the SER output pin equal
         # to the H input pin upon a load. So we need to read the pin first.
@@ -78,6 +133,104 @@ class SN74HC165:
         return out  # Return the data.
 
 
+class GPIOBank:
+    """Read the level of all the GPIO pins 0-31 with a single register read, using /dev/gpiomem.
+    This works on the BCM2835/6/7 and BCM2711 based Raspberry Pi boards (not the Pi 5)."""
+
+    GPLEV0 = 0x34    # Offset of the pin level register for GPIO 0-31.
+
+    def __init__(self):
+        fd = os.open("/dev/gpiomem", os.O_RDWR | os.O_SYNC)
+        try:
+            self._mem = mmap.mmap(fd, 4096, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+    def read(self):
+        """Return the levels of GPIO 0-31 as a 32-bit integer, bit n = GPIO n."""
+        return int.from_bytes(self._mem[self.GPLEV0:self.GPLEV0 + 4], "little")
+
+    def close(self):
+        self._mem.close()
+
+
+class SN74HC165Chains:
+    """Read out several SN74HC165 chains in parallel. The chains share the CLK and LOAD pins,
+    and each chain has its own data pin."""
+
+    def __init__(self, serial_ins, serial_clk, serial_load, serial_n=8, use_gpiomem=True):
+        """Initialize the module.
+        Input:
+         * serial_ins = list of GPIO pins (0-31) for the data of each chain, connect to the Q output of the last chip.
+         * serial_clk = GPIO pin for the clock, connect to CLK of all the chips.
+         * serial_load= GPIO pin for the load signal, connect to LOAD of all the chips.
+         * serial_n   = number of bits to read for each chain, default=8
+         * use_gpiomem= If True, read all the data pins at once through /dev/gpiomem, if available.
+         """
+        if any(pin < 0 or pin > 31 for pin in serial_ins):
+            raise ValueError("The data pins must be GPIO 0 to 31.")
+        GPIO.setmode(GPIO.BCM)
+        self._Serial_Ins = list(serial_ins)
+        self._Serial_CLK = serial_clk
+        self._Serial_Load = serial_load
+        self._Serial_N = serial_n
+        self._levels = np.zeros(serial_n, dtype=np.uint32)
+        self._shifts = np.array(self._Serial_Ins, dtype=np.uint32).reshape(-1, 1)
+        self._pad = (-serial_n) % 8   # np.packbits pads the last byte with zeros.
+
+        for pin in self._Serial_Ins:
+            GPIO.setup(pin, GPIO.IN)
+        GPIO.setup(serial_clk, GPIO.OUT)
+        GPIO.setup(serial_load, GPIO.OUT)
+        GPIO.output(serial_load, GPIO.HIGH)
+        GPIO.output(serial_clk, GPIO.LOW)
+
+        self._bank = None
+        if use_gpiomem:
+            try:
+                self._bank = GPIOBank()
+            except OSError:
+                print("Could not open /dev/gpiomem, reading the pins one at a time.")
+
+    def __del__(self):
+        """Delete and cleanup."""
+        for pin in self._Serial_Ins:
+            GPIO.cleanup(pin)
+        GPIO.cleanup(self._Serial_CLK)
+        GPIO.cleanup(self._Serial_Load)
+        if self._bank is not None:
+            self._bank.close()
+
+    def load_shifter(self):
+        """ Load the parallel data into the shifters by toggling Serial_Load low """
+        GPIO.output(self._Serial_Load, GPIO.LOW)
+        GPIO.output(self._Serial_Load, GPIO.HIGH)
+
+    def _read_levels(self):
+        """Return the levels of the data pins as a bit mask, bit n = GPIO n."""
+        if self._bank is not None:
+            return self._bank.read()
+        levels = 0
+        for pin in self._Serial_Ins:
+            levels |= GPIO.input(pin) << pin
+        return levels
+
+    @profiled
+    def read_data(self):
+        """ Shift the data into all the chains at once and return a list with one integer per chain.
+        The bits are expected MSB first, as for SN74HC165.read_data()."""
+        levels = self._levels
+        for i in range(self._Serial_N):
+            levels[i] = self._read_levels()           # One read for all the chains.
+            GPIO.output(self._Serial_CLK, GPIO.HIGH)
+            GPIO.output(self._Serial_CLK, GPIO.LOW)
+
+        # Unpack: row c of bits holds the bits of chain c, MSB first.
+        bits = ((levels >> self._shifts) & 1).astype(np.uint8)
+        packed = np.packbits(bits, axis=1)
+        return [int.from_bytes(row.tobytes(), "big") >> self._pad for row in packed]
+
+
 #
 # The code below turns this module into a program as well
 # allowing you to run it in test mode from the command line.
@@ -17,16 +17,18 @@
 # a tri-state buffer to your circuit.
 # For simplicity, and since we are not using multiple SPI devices in this example, we
 # do not have a "Chip-Select-bar" (SSbar) signal.
+#
+# Chains and bulk output:
+# Any number of SN74HC595 chips can be chained by connecting QH' of one chip to SER of the next.
+# The write() method shifts out a whole frame of bytes for the chain and latches it once, either
+# bit-banged, or with the SPI hardware (see SN74HC595.spi()), where SCLK = SRCLK and MOSI = SER.
+# The driver keeps a shadow image of the outputs, so you can change single outputs with set_bit()
+# or set_bits() and call flush(), which only sends a frame if the outputs actually changed.
+# Output bit k of the image is output Q(k%8) of chip k//8, where chip 0 is connected to the RPi.
 #####################################################################
 
-try:
-    import RPi.GPIO as GPIO
-except:
-    pass
-try:
-    import Adafruit_BBIO as GPIO
-except:
-    pass
+from DevLib.backends import GPIO, spidev
+from DevLib.Profiling import profiled
 import time
 import sys
 
@@ -48,6 +50,8 @@ class SN74HC595:
         self.Serial_Load = serial_load  # = Load
         self.Serial_Clear = serial_clear  # = Clear
         self.Serial_N = serial_n   # Number of bits to shift in. 8 bits for every SN74HC165.
+        self._dev = None
+        self._init_image()
         #
         # Setup the GPIO Pins
         #
@@ -59,10 +63,53 @@ class SN74HC595:
             GPIO.output(self.Serial_Clear, GPIO.HIGH)  # Load is High = ready to shift. Low = load data.
         GPIO.output(self.Serial_CLK, GPIO.LOW)
 
+    @classmethod
+    def spi(cls, serial_load, serial_n=8, serial_clear=None, spi_cs=0, spi_speed=1000000, spi_dev=None):
+        """Alternate constructor that shifts the data out with an SPI device instead of bit-banging.
+        Input:
+         * serial_load = RCLK = GPIO pin for the set-output, connect to RCLK (12) of the chips.
+         * serial_n    = number of bits in the chain, 8 for every chip.
+         * serial_clear= SRCLR-bar = GPIO pin for the clear, or None.
+         * spi_cs      = SPI chip enable (0 or 1) used to open spidev.SpiDev(0, spi_cs).
+         * spi_speed   = SPI clock speed in Hz.
+         * spi_dev     = Use this already opened SPI device instead, e.g. BBSpiDev(None, clk, mosi, None).
+        Example: leds = SN74HC595.spi(20, 32)
+        """
+        self = cls.__new__(cls)
+        GPIO.setmode(GPIO.BCM)
+        self.Serial_Out = None
+        self.Serial_CLK = None
+        self.Serial_Load = serial_load
+        self.Serial_Clear = serial_clear
+        self.Serial_N = serial_n
+        self._init_image()
+        GPIO.setup(self.Serial_Load, GPIO.OUT)
+        GPIO.output(self.Serial_Load, GPIO.LOW)
+        if self.Serial_Clear is not None:
+            GPIO.setup(self.Serial_Clear, GPIO.OUT)
+            GPIO.output(self.Serial_Clear, GPIO.HIGH)
+
+        if spi_dev is None:
+            spi_dev = spidev.SpiDev(0, spi_cs)
+            spi_dev.max_speed_hz = spi_speed
+        spi_dev.mode = 0          # Clock low at rest, the chips shift on the rising edge.
+        self._dev = spi_dev
+        return self
+
+    def _init_image(self):
+        """Setup the shadow image of the outputs."""
+        self._nbytes = (self.Serial_N + 7) // 8
+        self._image = 0       # The outputs as they should be.
+        self._shifted = None  # The data in the shift registers, None if not known.
+        self._latched = None  # The data on the outputs, None if not known.
+
     def __del__(self):          # This is automatically called when the class is deleted.
         """Delete and cleanup."""
-        GPIO.cleanup(self.Serial_Out)
-        GPIO.cleanup(self.Serial_CLK)
+        if self._dev is not None:
+            self._dev.close()
+        else:
+            GPIO.cleanup(self.Serial_Out)
+            GPIO.cleanup(self.Serial_CLK)
         GPIO.cleanup(self.Serial_Load)
         if self.Serial_Clear is not None:
             GPIO.cleanup(self.Serial_Clear)
@@ -71,12 +118,81 @@ class SN74HC595:
         """Clear the register."""
         GPIO.output(self.Serial_Clear, GPIO.LOW)
         GPIO.output(self.Serial_Clear, GPIO.HIGH)
+        self._shifted = 0
+        self._image = 0
         self.set_output()
 
     def set_output(self):
         """Load the parallel data into the shifter by toggling Serial_Load low."""
         GPIO.output(self.Serial_Load, GPIO.HIGH)
         GPIO.output(self.Serial_Load, GPIO.LOW)
+        self._latched = self._shifted
+
+    @profiled
+    def write(self, data):
+        """Shift out a whole frame for the chain and latch it on the outputs.
+        data is a bytes, bytearray, list or numpy array of bytes, with the bytes for the last chip
+        in the chain first, i.e. the image of the outputs in big-endian byte order.
+        If data is shorter than the chain, it is padded with zeros in front (the far end of the chain)."""
+        data = bytes(data)
+        if len(data) > self._nbytes:
+            raise ValueError("The chain only has {} bytes.".format(self._nbytes))
+        data = bytes(self._nbytes - len(data)) + data
+        if self._dev is not None:
+            self._dev.writebytes(list(data))
+        else:
+            self._shift_bytes(data)
+        self._shifted = int.from_bytes(data, "big")
+        self._image = self._shifted
+        self.set_output()
+
+    def _shift_bytes(self, data):
+        """Bit-bang the bytes out, MSB first. The data pin is only changed when the bit changes."""
+        out = self.Serial_Out
+        clk = self.Serial_CLK
+        last = None
+        for byte in data:
+            for i in range(7, -1, -1):
+                bit = (byte >> i) & 1
+                if bit != last:
+                    GPIO.output(out, bit)
+                    last = bit
+                GPIO.output(clk, GPIO.HIGH)
+                GPIO.output(clk, GPIO.LOW)
+
+    @property
+    def image(self):
+        """The shadow image of the outputs as an integer, bit k = output k. Call flush() to send it."""
+        return self._image
+
+    @image.setter
+    def image(self, value):
+        self._image = value & ((1 << (8 * self._nbytes)) - 1)
+
+    def set_bit(self, bit, value=1):
+        """Set output bit to value in the shadow image. Call flush() to send it."""
+        if value:
+            self._image |= (1 << bit)
+        else:
+            self._image &= ~(1 << bit)
+
+    def get_bit(self, bit):
+        """Return the value of output bit in the shadow image."""
+        return (self._image >> bit) & 1
+
+    def set_bits(self, value, mask):
+        """Set the outputs selected by the bit mask to the corresponding bits in value, in the
+        shadow image. Call flush() to send it."""
+        self._image = (self._image & ~mask) | (value & mask)
+
+    @profiled
+    def flush(self):
+        """Send the shadow image to the chain, but only if it differs from what is on the outputs.
+        Returns True if a frame was sent."""
+        if self._image == self._latched:
+            return False
+        self.write(self._image.to_bytes(self._nbytes, "big"))
+        return True
 
     def send_data(self, bits_out):
         """ Shift the data from bits_out into the shifter.
@@ -88,6 +204,8 @@ class SN74HC595:
             GPIO.output(self.Serial_Out, bit)      # First bit is already present on Q after load.
             GPIO.output(self.Serial_CLK, GPIO.HIGH)  # Clock High loads next bit into Q of chip.
             GPIO.output(self.Serial_CLK, GPIO.LOW)   # Clock back to low, rest state.
+        self._shifted = bits_out & ((1 << self.Serial_N) - 1)
+        self._image = self._shifted
 
 
 def main(argv):
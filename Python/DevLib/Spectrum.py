@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+#
+# Streaming spectrum analyzer.
+#
+# This module computes the power spectral density (PSD) of a continuous stream of samples, such as
+# the readings of an MCP320x or ADS1115 ADC, or the data from a file, block by block, so that the
+# spectrum can be updated while the data is coming in.
+#
+# The stream is cut into segments of nfft samples that overlap by a fraction (default 50%). Each segment
+# is multiplied by a window function, transformed with a real FFT, and the squared magnitudes are averaged.
+# This is Welch's method. The window coefficients are computed once, and all the work arrays are
+# allocated once, so processing a block does not allocate new arrays. When a lot of samples come in
+# at once, up to `batch` segments are transformed in a single call to rfft.
+#
+# The frequency of the strongest peaks in the spectrum is found with parabolic interpolation of the
+# log power around the maximum, which gives a frequency resolution much better than the bin width.
+#
+# Example code:
+#
+#   from DevLib import MCP320x
+#   from DevLib.Spectrum import StreamingSpectrum, ADCSource
+#   adc = MCP320x(0)
+#   source = ADCSource(adc.read_volts, channel=0)
+#   spec = StreamingSpectrum(nfft=256, rate=source.rate)
+#   spec.run(source, 100)
+#   print(spec.peak())
+#
+# Author: Maurik Holtrop
+#
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# numpy 2.0 added the out= argument to the FFT functions, which lets us reuse the output buffer.
+_FFT_HAS_OUT = np.lib.NumpyVersion(np.__version__) >= '2.0.0'
+
+
+def make_window(name, n):
+    """Return the periodic window function name ('hann', 'hamming', 'blackman' or 'rect') of length n.
+    name can also be an array with the window coefficients."""
+    if not isinstance(name, str):
+        window = np.asarray(name, dtype=float)
+        if window.shape != (n,):
+            raise ValueError("The window must have {} coefficients.".format(n))
+        return window
+    windows = {
+        "hann": np.hanning,
+        "hanning": np.hanning,
+        "hamming": np.hamming,
+        "blackman": np.blackman,
+        "rect": np.ones,
+        "boxcar": np.ones,
+    }
+    if name not in windows:
+        raise ValueError("Unknown window: {}".format(name))
+    return windows[name](n + 1)[:n]     # Periodic version, for spectral analysis.
+
+
+class ADCSource:
+    """Read blocks of samples by calling read(channel) for every sample, e.g. MCP320x.read_volts
+    or ADS1115.read_volts. If the rate is not given, it is measured while reading."""
+
+    def __init__(self, read, channel=0, rate=None):
+        self._read = read
+        self._channel = channel
+        self._rate = rate
+        self._measured = rate is None
+
+    @property
+    def rate(self):
+        """The sample rate in Hz. Before the first block is read, a short burst of reads is timed."""
+        if self._rate is None:
+            block = np.empty(100)
+            self.read_block(block)
+        return self._rate
+
+    def read_block(self, out):
+        """Fill the array out with samples. Returns the number of samples, len(out)."""
+        read = self._read
+        channel = self._channel
+        start = time.perf_counter()
+        for i in range(len(out)):
+            out[i] = read(channel)
+        if self._measured:
+            self._rate = len(out) / (time.perf_counter() - start)
+        return len(out)
+
+
+class ArraySource:
+    """Read blocks of samples from an array (or memory mapped .npy file)."""
+
+    def __init__(self, data, rate=1.):
+        self._data = data
+        self._pos = 0
+        self.rate = rate
+
+    def read_block(self, out):
+        """Copy the next len(out) samples into out. Returns the number of samples, which is less
+        than len(out) at the end of the data."""
+        n = min(len(out), len(self._data) - self._pos)
+        out[:n] = self._data[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+class FileSource(ArraySource):
+    """Read blocks of samples from a file. A .npy file is memory mapped, other files are read as
+    comma separated text with lines starting with # skipped, and column is used for the samples."""
+
+    def __init__(self, filename, rate=1., column=0, skiprows=0):
+        if filename.endswith(".npy"):
+            data = np.load(filename, mmap_mode="r")
+            if data.ndim > 1:
+                data = data[:, column]
+        else:
+            data = np.loadtxt(filename, delimiter=",", comments="#", skiprows=skiprows, usecols=column)
+        super().__init__(data, rate)
+
+
+class StreamingSpectrum:
+    """Welch averaged power spectral density of a stream of samples."""
+
+    def __init__(self, nfft=1024, rate=1., window="hann", overlap=0.5, average=None, batch=32):
+        """Initialize the spectrum analyzer.
+        Input:
+         * nfft    = number of samples per FFT segment.
+         * rate    = sample rate in Hz.
+         * window  = name of the window function, or an array with nfft coefficients.
+         * overlap = fraction of a segment that overlaps with the next one, 0 <= overlap < 1.
+         * average = None to average all segments equally, or a number 0 < average <= 1 for an
+                     exponential average where each new segment has weight average.
+         * batch   = maximum number of segments transformed in one call to rfft."""
+        if not 0 <= overlap < 1:
+            raise ValueError("The overlap must be between 0 and 1.")
+        self.nfft = nfft
+        self.rate = rate
+        self.hop = max(1, int(round(nfft * (1 - overlap))))
+        self.average = average
+        self._batch = batch
+        self._window = make_window(window, nfft)
+        # PSD normalization: one sided, in units^2/Hz.
+        self._scale = np.full(nfft // 2 + 1, 2. / (rate * np.sum(self._window ** 2)))
+        self._scale[0] /= 2
+        if nfft % 2 == 0:
+            self._scale[-1] /= 2
+        self._freq = np.fft.rfftfreq(nfft, 1. / rate)
+        # Work arrays, allocated once.
+        self._pending = np.zeros(nfft + batch * self.hop)
+        self._frames = np.empty((batch, nfft))
+        self._spec = np.empty((batch, nfft // 2 + 1), dtype=complex)
+        self._power = np.empty((batch, nfft // 2 + 1))
+        self._sum = np.zeros(nfft // 2 + 1)
+        self._psd = np.zeros(nfft // 2 + 1)
+        self._block = np.empty(batch * self.hop)
+        self.reset()
+
+    def reset(self):
+        """Forget all the data."""
+        self._fill = 0
+        self._sum[:] = 0
+        self.n_segments = 0
+        self.n_samples = 0
+
+    @property
+    def frequencies(self):
+        """The frequencies of the PSD bins in Hz."""
+        return self._freq
+
+    @property
+    def window(self):
+        """The window coefficients."""
+        return self._window
+
+    def push(self, samples):
+        """Add samples to the stream, and process all the complete segments.
+        Returns the number of new segments."""
+        samples = np.asarray(samples, dtype=float)
+        n_new = 0
+        pos = 0
+        size = len(self._pending)
+        while pos < len(samples):
+            n = min(size - self._fill, len(samples) - pos)
+            self._pending[self._fill:self._fill + n] = samples[pos:pos + n]
+            self._fill += n
+            pos += n
+            n_new += self._process()
+        self.n_samples += len(samples)
+        return n_new
+
+    def _process(self):
+        """Transform all the complete segments in the pending buffer."""
+        if self._fill < self.nfft:
+            return 0
+        k = min((self._fill - self.nfft) // self.hop + 1, self._batch)
+        frames = sliding_window_view(self._pending[:self._fill], self.nfft)[::self.hop][:k]
+        np.multiply(frames, self._window, out=self._frames[:k])
+        if _FFT_HAS_OUT:
+            np.fft.rfft(self._frames[:k], axis=1, out=self._spec[:k])
+        else:
+            self._spec[:k] = np.fft.rfft(self._frames[:k], axis=1)
+        power = self._power[:k]
+        np.multiply(self._spec[:k].real, self._spec[:k].real, out=power)
+        np.multiply(self._spec[:k].imag, self._spec[:k].imag, out=self._frames[:k, :power.shape[1]])
+        power += self._frames[:k, :power.shape[1]]
+        if self.average is None:
+            self._sum += power.sum(axis=0)
+            self.n_segments += k
+        else:
+            for p in power:
+                if self.n_segments == 0:
+                    self._sum[:] = p
+                else:
+                    self._sum *= 1 - self.average
+                    self._sum += self.average * p
+                self.n_segments += 1
+        # Keep the samples that are needed for the next segment.
+        used = k * self.hop
+        rest = self._fill - used
+        self._pending[:rest] = self._pending[used:self._fill]
+        self._fill = rest
+        return k
+
+    def run(self, source, n_blocks=None, block_size=None):
+        """Read n_blocks blocks (all if None) of block_size samples (default one hop) from source
+        and push them. Stops at the end of the source."""
+        if block_size is None:
+            block = self._block[:self.hop]
+        elif block_size <= len(self._block):
+            block = self._block[:block_size]
+        else:
+            block = np.empty(block_size)
+        i = 0
+        while n_blocks is None or i < n_blocks:
+            n = source.read_block(block)
+            if n == 0:
+                break
+            self.push(block[:n])
+            i += 1
+
+    @property
+    def psd(self):
+        """The averaged power spectral density, in units^2/Hz."""
+        if self.n_segments == 0:
+            self._psd[:] = 0
+        elif self.average is None:
+            np.multiply(self._sum, self._scale / self.n_segments, out=self._psd)
+        else:
+            np.multiply(self._sum, self._scale, out=self._psd)
+        return self._psd
+
+    def peaks(self, n=1, fmin=0., width=2):
+        """Return a list of the n strongest peaks above fmin as (frequency, power) pairs.
+        The frequencies are interpolated between the bins, and power is the power of the peak in units^2,
+        summed over width bins on either side of the maximum (2 covers the main lobe of a Hann window).
+        For a sine wave with amplitude A, the power is A^2/2."""
+        psd = self.psd
+        lo = max(1, int(np.searchsorted(self._freq, fmin)))
+        inner = psd[lo:-1]
+        is_peak = (inner > psd[lo - 1:-2]) & (inner >= psd[lo + 1:])
+        idx = np.flatnonzero(is_peak) + lo
+        if len(idx) == 0:
+            return []
+        idx = idx[np.argsort(psd[idx])[::-1][:n]]
+        df = self._freq[1]
+        # Parabolic interpolation of the log power, which is exact for a Gaussian shaped peak.
+        tiny = np.finfo(float).tiny
+        a, b, c = (np.log(np.maximum(psd[idx + d], tiny)) for d in (-1, 0, 1))
+        den = a - 2 * b + c
+        delta = 0.5 * (a - c) / np.where(den != 0, den, np.inf)
+        cumulative = np.concatenate(([0.], np.cumsum(psd)))
+        lo_bin = np.maximum(idx - width, 0)
+        hi_bin = np.minimum(idx + width + 1, len(psd))
+        power = (cumulative[hi_bin] - cumulative[lo_bin]) * df
+        return list(zip(self._freq[idx] + delta * df, power))
+
+    def peak(self, fmin=0.):
+        """Return (frequency, power) of the strongest peak above fmin, or None."""
+        found = self.peaks(1, fmin)
+        return found[0] if found else None
+
+
+def main(argv):
+    """Test the spectrum analyzer with a synthetic signal, and measure the throughput."""
+    rate = 10000.
+    n = int(argv[1]) if len(argv) > 1 else 2000000
+    t = np.arange(n) / rate
+    rng = np.random.default_rng(605)
+    data = 2. * np.sin(2 * np.pi * 1234.5 * t) + 0.5 * np.sin(2 * np.pi * 300.2 * t) + 0.1 * rng.standard_normal(n)
+    spec = StreamingSpectrum(nfft=1024, rate=rate)
+    start = time.perf_counter()
+    spec.run(ArraySource(data, rate), block_size=4096)
+    elapsed = time.perf_counter() - start
+    print("{} samples, {} segments in {:.3f} s = {:.3g} samples/s".format(spec.n_samples, spec.n_segments,
+                                                                          elapsed, spec.n_samples / elapsed))
+    for f, p in spec.peaks(2):
+        print("Peak at {:10.3f} Hz, power {:8.4f} V^2, amplitude {:7.4f} V".format(f, p, np.sqrt(2 * p)))
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv)
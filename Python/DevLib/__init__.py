@@ -1,21 +1,64 @@
 #
 # Here we initialize the modules.
 #
+# The drivers are loaded lazily: "from DevLib import DS3231" only imports DevLib/DS3231.py (and smbus),
+# not all the other drivers with their hardware libraries, numpy, etc. This makes short scripts, for
+# instance a sampling script started by cron, start much faster, and they work on a system where
+# the libraries for some of the other devices are not installed.
+# As before, DevLib.Name is the class of the driver, also after "import DevLib.Name" or
+# "from DevLib.Name import ...", which would otherwise set it to the module.
+#
+import importlib
+import sys
+import types
+
+__all__ = ["AD9850", "BME280", "BBSpiDev", "DS3231", "GatedCounter", "ISL29125", "MAX7219", "MAX7219Cascade",
+           "MCP320x", "MCP4251", "MCP4725", "SN74HC165", "SN74HC165Chains", "CharLCD"]
+
+# Name of each class : the module it is defined in.
+_LAZY = {
+    "AD9850": "AD9850",
+    "ADS1115": "ADS1115",
+    "APA102": "APA102",
+    "BBSpiDev": "BBSpiDev",
+    "BME280": "BME280",
+    "CharLCD": "CharLCD",
+    "DS3231": "DS3231",
+    "GatedCounter": "GatedCounter",
+    "ISL29125": "ISL29125",
+    "MAX7219": "MAX7219",
+    "MAX7219Cascade": "MAX7219Cascade",
+    "MCP320x": "MCP320x",
+    "MCP4251": "MCP4251",
+    "MCP4725": "MCP4725",
+    "MCP4822": "MCP4822",
+    "SN74HC165": "SN74HC165",
+    "SN74HC165Chains": "SN74HC165",
+}
+
+
+def __getattr__(name):
+    """Import the driver for name on first access."""
+    if name not in _LAZY:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    module = importlib.import_module("." + _LAZY[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value            # Skips __getattr__ next time.
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+class _Package(types.ModuleType):
+    """The DevLib package. Importing a submodule sets DevLib.<submodule> to the module; for the drivers,
+    set it to the class in the module instead."""
+
+    def __setattr__(self, name, value):
+        if name in _LAZY and isinstance(value, types.ModuleType) and hasattr(value, name):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
 
-__all__ = ["AD9850", "BME280", "BBSpiDev", "DS3231", "ISL29125", "MAX7219", "MCP320x",
-           "MCP4251", "MCP4725", "SN74HC165", "CharLCD"]
-
-from .AD9850 import AD9850
-from .ADS1115 import ADS1115
-from .APA102 import APA102
-from .BBSpiDev import BBSpiDev
-from .BME280 import BME280
-from .CharLCD import CharLCD
-from .DS3231 import DS3231
-from .ISL29125 import ISL29125
-from .MAX7219 import MAX7219
-from .MCP320x import MCP320x
-from .MCP4251 import MCP4251
-from .MCP4725 import MCP4725
-from .MCP4822 import MCP4822
-from .SN74HC165 import SN74HC165
+sys.modules[__name__].__class__ = _Package
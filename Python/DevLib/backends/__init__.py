@@ -0,0 +1,253 @@
+#
+# Hardware backends for the DevLib drivers.
+#
+# The drivers do not import RPi.GPIO, spidev or smbus themselves, but use the three stand-in modules
+# from here:
+#
+#   from DevLib.backends import GPIO, spidev, smbus
+#
+# These forward every attribute to the backend that is selected for GPIO, SPI and I2C. Two backends
+# are registered:
+#  * "hardware" - the real libraries: RPi.GPIO (or Adafruit_BBIO.GPIO on a BeagleBone), spidev and smbus
+#                 (or smbus2). This is the default.
+#  * "sim"      - a deterministic simulator (see DevLib/backends/sim.py) with models of the MCP3208,
+#                 ADS1115, BME280, DS3231, MCP4725 and MAX7219 chips, including the time each bus
+#                 transfer takes, so that the drivers and the programs that use them can be run and
+#                 timed on a laptop.
+#
+# The backend is chosen with the DEVLIB_BACKEND environment variable, or in the code, before the devices
+# are opened:
+#
+#   from DevLib import backends
+#   backends.use("sim")
+#   sim = backends.simulator()         # The simulated bench, to attach devices or read the bus statistics.
+#   from DevLib import MCP320x
+#   adc = MCP320x(0)
+#   print(adc.read_volts(0), sim.stats())
+#
+# Other backends can be added with register(kind, name, loader), where loader() returns a module
+# like object for that kind: the GPIO functions for "gpio", an object with SpiDev for "spi" and an
+# object with SMBus for "i2c". The library of a backend is only loaded when it is first used.
+#
+# Author: Maurik Holtrop
+#
+import os
+import types
+
+KINDS = ("gpio", "spi", "i2c")
+
+_registry = {kind: {} for kind in KINDS}
+_selected = {kind: os.environ.get("DEVLIB_BACKEND", "hardware") for kind in KINDS}
+_loaded = {}
+_simulator = None
+
+
+class _Interface(object):
+    """Stand-in for the GPIO, spidev or smbus module of the selected backend."""
+
+    def __init__(self, kind, name):
+        self._kind = kind
+        self._name = name
+
+    def __getattr__(self, name):
+        value = getattr(get(self._kind), name)
+        setattr(self, name, value)      # Cache, so the next lookup is as fast as on the module itself.
+        return value
+
+    def _clear(self):
+        """Forget the cached attributes, after a change of backend."""
+        for name in list(self.__dict__):
+            if name not in ("_kind", "_name"):
+                del self.__dict__[name]
+
+    def __repr__(self):
+        return "<DevLib.backends.{} using the {!r} backend>".format(self._name, _selected[self._kind])
+
+
+GPIO = _Interface("gpio", "GPIO")
+spidev = _Interface("spi", "spidev")
+smbus = _Interface("i2c", "smbus")
+_interfaces = {"gpio": GPIO, "spi": spidev, "i2c": smbus}
+
+
+def register(kind, name, loader):
+    """Register a backend called name for kind ('gpio', 'spi' or 'i2c').
+    loader() is called on first use and must return the module like object for the backend."""
+    if kind not in _registry:
+        raise ValueError("Unknown kind of backend: {}, must be one of {}".format(kind, KINDS))
+    _registry[kind][name] = loader
+    _loaded.pop((kind, name), None)
+    if _selected[kind] == name:
+        _interfaces[kind]._clear()
+
+
+def available(kind=None):
+    """Return the names of the registered backends for kind, or a dict for all kinds."""
+    if kind is None:
+        return {k: sorted(_registry[k]) for k in KINDS}
+    return sorted(_registry[kind])
+
+
+def use(name, kinds=KINDS):
+    """Select the backend called name for kinds, a kind or a list of kinds. The default is all kinds.
+    Devices that are already open keep the backend they were opened with."""
+    if isinstance(kinds, str):
+        kinds = (kinds,)
+    for kind in kinds:
+        if name not in _registry[kind]:
+            raise ValueError("No {} backend called {!r}. Available: {}".format(kind, name, available(kind)))
+    for kind in kinds:
+        _selected[kind] = name
+        _interfaces[kind]._clear()
+
+
+def selected(kind):
+    """Return the name of the selected backend for kind."""
+    return _selected[kind]
+
+
+def get(kind):
+    """Return the module like object of the selected backend for kind, loading it if needed."""
+    key = (kind, _selected[kind])
+    if key not in _loaded:
+        if key[1] not in _registry[kind]:
+            raise ValueError("No {} backend called {!r}. Available: {}".format(kind, key[1], available(kind)))
+        _loaded[key] = _registry[kind][key[1]]()
+    return _loaded[key]
+
+
+def simulator():
+    """Return the simulator used by the "sim" backend. A default bench is created on first use."""
+    global _simulator
+    if _simulator is None:
+        from DevLib.backends.sim import Simulator
+        _simulator = Simulator.default()
+    return _simulator
+
+
+def set_simulator(sim):
+    """Use sim, a DevLib.backends.sim.Simulator, for the "sim" backend from now on."""
+    global _simulator
+    _simulator = sim
+    for kind in KINDS:
+        _loaded.pop((kind, "sim"), None)
+        if _selected[kind] == "sim":
+            _interfaces[kind]._clear()
+
+
+def xfer_frames(dev, data, frame_len):
+    """Transfer data to the SPI device dev as frames of frame_len bytes, with CS released between the frames,
+    in as few system calls as possible. Returns the bytes read, as a list.
+    Chips such as the MCP3208 only start a new conversion after CS goes high, so a list of conversions cannot
+    be sent with a single xfer(). The simulated SpiDev has an xfer_frames() method for this; for a spidev
+    device the frames are sent with one SPI_IOC_MESSAGE ioctl for up to 511 frames (cs_change set on each
+    frame), and for other devices, such as BBSpiDev, with one xfer() per frame."""
+    if hasattr(dev, "xfer_frames"):
+        return dev.xfer_frames(data, frame_len)
+    if hasattr(dev, "fileno"):
+        try:
+            return _ioctl_frames(dev, data, frame_len)
+        except (OSError, ValueError):
+            pass
+    out = []
+    for i in range(0, len(data), frame_len):
+        out.extend(dev.xfer(list(data[i:i + frame_len])))
+    return out
+
+
+def _ioctl_frames(dev, data, frame_len):
+    """Send the frames with SPI_IOC_MESSAGE(n) ioctls on the file descriptor of a spidev.SpiDev."""
+    import ctypes
+    import fcntl
+    import struct
+
+    # struct spi_ioc_transfer: tx_buf, rx_buf, len, speed_hz, delay_usecs, bits_per_word, cs_change,
+    # tx_nbits, rx_nbits, word_delay_usecs, pad = 32 bytes. The size of the message must fit in 14 bits and
+    # the total length in the spidev buffer (4096 bytes by default).
+    transfer = struct.Struct("QQIIHBBBBBB")
+    per_message = min(511, max(1, 4096 // frame_len))
+    data = bytes(data)
+    out = bytearray(len(data))
+    fd = dev.fileno()
+    speed = dev.max_speed_hz
+    for start in range(0, len(data), per_message * frame_len):
+        chunk = data[start:start + per_message * frame_len]
+        n = (len(chunk) + frame_len - 1) // frame_len
+        tx = ctypes.create_string_buffer(chunk, len(chunk))
+        rx = ctypes.create_string_buffer(len(chunk))
+        message = bytearray(n * transfer.size)
+        for i in range(n):
+            length = min(frame_len, len(chunk) - i * frame_len)
+            transfer.pack_into(message, i * transfer.size, ctypes.addressof(tx) + i * frame_len,
+                               ctypes.addressof(rx) + i * frame_len, length, speed, 0, 8, int(i < n - 1),
+                               0, 0, 0, 0)
+        request = (1 << 30) | (len(message) << 16) | (ord("k") << 8)     # _IOW('k', 0, char[len(message)])
+        fcntl.ioctl(fd, request, message)
+        out[start:start + len(chunk)] = rx.raw
+    return list(out)
+
+
+def _subclass_device(module, name):
+    """Return a copy of module in which the device class module.name is replaced by a plain Python subclass.
+    The methods of the subclass can be replaced, which DevLib.Profiling uses to time the transfers of all the
+    devices, also the ones that were opened before profiling was switched on. The device class of a C extension
+    such as spidev cannot be changed itself."""
+    cls = getattr(module, name)
+    try:
+        subclass = type(name, (cls,), {"__module__": module.__name__, "__doc__": cls.__doc__})
+    except TypeError:       # The class cannot be subclassed.
+        return module
+    copy = types.ModuleType(module.__name__, module.__doc__)
+    copy.__dict__.update(module.__dict__)
+    setattr(copy, name, subclass)
+    return copy
+
+
+def _hardware_gpio():
+    """Load RPi.GPIO, or Adafruit_BBIO.GPIO on a BeagleBone."""
+    try:
+        import RPi.GPIO as gpio
+        return gpio
+    except (ImportError, RuntimeError):   # RPi.GPIO raises RuntimeError when it is not on a Raspberry Pi.
+        pass
+    try:
+        import Adafruit_BBIO.GPIO as gpio
+        return gpio
+    except ImportError:
+        pass
+    raise ImportError("No GPIO library found. Install RPi.GPIO or Adafruit_BBIO, or select the simulator "
+                      "with DevLib.backends.use('sim') or DEVLIB_BACKEND=sim.")
+
+
+def _hardware_spi():
+    """Load spidev."""
+    try:
+        import spidev as spi
+    except ImportError:
+        raise ImportError("The spidev module is not installed. Install it, or select the simulator "
+                          "with DevLib.backends.use('sim') or DEVLIB_BACKEND=sim.")
+    return _subclass_device(spi, "SpiDev")
+
+
+def _hardware_i2c():
+    """Load smbus, or smbus2 which has the same interface."""
+    try:
+        import smbus as i2c
+        return _subclass_device(i2c, "SMBus")
+    except ImportError:
+        pass
+    try:
+        import smbus2 as i2c
+        return _subclass_device(i2c, "SMBus")
+    except ImportError:
+        pass
+    raise ImportError("Neither smbus nor smbus2 is installed. Install one, or select the simulator "
+                      "with DevLib.backends.use('sim') or DEVLIB_BACKEND=sim.")
+
+
+register("gpio", "hardware", _hardware_gpio)
+register("spi", "hardware", _hardware_spi)
+register("i2c", "hardware", _hardware_i2c)
+register("gpio", "sim", lambda: simulator().gpio)
+register("spi", "sim", lambda: simulator().spidev)
+register("i2c", "sim", lambda: simulator().smbus)
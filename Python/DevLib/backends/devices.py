@@ -0,0 +1,803 @@
+#
+# Models of the chips for the simulator in DevLib/backends/sim.py.
+#
+# Each model keeps the register file of the chip, and follows the protocol on the wire as described in
+# the datasheet, so that the DevLib drivers (and other code) work with them as with the real chip.
+# The analog inputs of the ADC models are functions of the simulation time, by default a sine wave on
+# each channel with a small amount of noise. The noise comes from a seeded random generator, so a
+# simulation gives the same numbers every time.
+#
+#   MCP3208Model  - 8 channel 12-bit ADC on SPI (also MCP3204, MCP3004 and MCP3008).
+#   MAX7219Model  - LED driver on SPI, or a chain of them.
+#   ADS1115Model  - 16-bit ADC with PGA on I2C, with the conversion time of the selected data rate.
+#   BME280Model   - temperature, pressure and humidity sensor on I2C, with the measurement time.
+#   DS3231Model   - real time clock on I2C, running on the simulation clock.
+#   MCP4725Model  - 12-bit DAC on I2C, with the EEPROM write time.
+#   APA102Model   - strip of APA102 LEDs on SPI.
+#   HD44780Model  - character display with a PCF8574 I2C backpack (CharLCD).
+#   SN74HC165Model- chain of parallel in, serial out shift registers, on SPI or GPIO.
+#
+# Author: Maurik Holtrop
+#
+import math
+import random
+from datetime import datetime, timedelta
+
+from DevLib.backends.sim import SpiDevice, I2CDevice, RegisterDevice
+
+
+class Sine(object):
+    """A signal offset + amplitude*sin(2 pi frequency t + phase) with Gaussian noise of rms noise."""
+
+    def __init__(self, amplitude=1., frequency=1., offset=0., phase=0., noise=0., seed=0):
+        self.amplitude = amplitude
+        self.frequency = frequency
+        self.offset = offset
+        self.phase = phase
+        self.noise = noise
+        self._random = random.Random(seed)
+
+    def __call__(self, t):
+        value = self.offset + self.amplitude * math.sin(2 * math.pi * self.frequency * t + self.phase)
+        if self.noise:
+            value += self._random.gauss(0., self.noise)
+        return value
+
+
+def _signal(value):
+    """Make a function of time out of a signal or a constant."""
+    if callable(value):
+        return value
+    return lambda t: value
+
+
+class MCP3208Model(SpiDevice):
+    """MCP3208 ADC. A frame starts with the start bit, followed by SGL/DIFF and D2, D1, D0.
+    The input is sampled on the next clock, then a null bit and the result MSB first are shifted out,
+    then the result again LSB first, then zeros."""
+
+    name = "MCP3208"
+
+    def __init__(self, inputs=None, vref=3.3, channels=8, bits=12):
+        """Input:
+         * inputs   = dict channel:signal, where a signal is a function of time or a constant in Volts.
+                      The default is a sine wave of 1 V amplitude around vref/2 on each channel, with
+                      a frequency of 10 Hz times (channel + 1), and 2 mV of noise.
+         * vref     = reference voltage.
+         * channels = number of channels, 4 or 8.
+         * bits     = 12 for the MCP320x, 10 for the MCP300x."""
+        self.vref = vref
+        self.channels = channels
+        self.bits = bits
+        self.inputs = {ch: Sine(1., 10. * (ch + 1), vref / 2, noise=0.002, seed=ch) for ch in range(channels)}
+        if inputs is not None:
+            self.inputs.update(inputs)
+        self.conversions = 0
+        self.deselect()
+
+    def select(self):
+        self._n = 0
+        self._start = None
+        self._command = 0
+        self._code = 0
+
+    deselect = select
+
+    def convert(self, command):
+        """Return the ADC code for command = SGL D2 D1 D0."""
+        channel = command & (self.channels - 1)
+        t = self.clock.time() if self.clock is not None else 0.
+        if command & 0b1000:
+            volts = _signal(self.inputs.get(channel, 0.))(t)
+        else:                                   # Differential: CH0-CH1, CH1-CH0, CH2-CH3, ...
+            volts = _signal(self.inputs.get(channel, 0.))(t) - _signal(self.inputs.get(channel ^ 1, 0.))(t)
+        self.conversions += 1
+        full = 1 << self.bits
+        return min(max(int(volts / self.vref * full), 0), full - 1)
+
+    def _out_bit(self, k):
+        """The output bit k clocks after the start bit."""
+        b = self.bits
+        if 7 <= k < 7 + b:
+            return (self._code >> (6 + b - k)) & 1
+        if 7 + b <= k < 6 + 2 * b:
+            return (self._code >> (k - 6 - b)) & 1
+        return 0
+
+    def shift(self, bit):
+        n = self._n
+        self._n += 1
+        if self._start is None:
+            if bit:
+                self._start = n
+            return 0
+        k = n - self._start
+        if k <= 4:
+            self._command = (self._command << 1) | bit
+            if k == 4:
+                self._code = self.convert(self._command)
+            return 0
+        return self._out_bit(k)
+
+    def transfer(self, data):
+        if self._n:
+            return SpiDevice.transfer(self, data)
+        nbits = 8 * len(data)
+        frame = int.from_bytes(bytes(data), "big")
+        if frame == 0:
+            self._n = nbits
+            return [0] * len(data)
+        start = nbits - frame.bit_length()
+        if start + 5 > nbits:                   # Incomplete command: do it bit by bit.
+            return SpiDevice.transfer(self, data)
+        self._start = start
+        self._n = nbits
+        self._command = (frame >> (nbits - start - 5)) & 0b1111
+        self._code = self.convert(self._command)
+        b = self.bits
+        reverse = int(format(self._code, "0{}b".format(b))[::-1], 2) & ((1 << (b - 1)) - 1)
+        # MSB first result at start+7, then LSB first (without bit 0) at start+7+bits.
+        out = (self._code << (b - 1)) | reverse
+        shift = nbits - (start + 6 + 2 * b)
+        out = out << shift if shift >= 0 else out >> -shift
+        return list(out.to_bytes(len(data), "big"))
+
+
+class MAX7219Model(SpiDevice):
+    """MAX7219 LED driver, or a chain of chips. Each chip has a 16-bit shift register, the data out of one
+    chip goes into the next. On the rising edge of LOAD (CS) every chip latches its shift register:
+    bits 11-8 are the register address, bits 7-0 the data. Chip 0 is the one connected to the controller."""
+
+    name = "MAX7219"
+    NOOP, DIGIT0, DECODE_MODE, INTENSITY, SCAN_LIMIT, SHUTDOWN, DISPLAY_TEST = 0, 1, 9, 10, 11, 12, 15
+
+    def __init__(self, chips=1):
+        self.chips = chips
+        self.registers = [bytearray(16) for i in range(chips)]
+        self.writes = 0
+        self._mask = (1 << (16 * chips)) - 1
+        self._shift = 0
+
+    def shift(self, bit):
+        out = (self._shift >> (16 * self.chips - 1)) & 1
+        self._shift = ((self._shift << 1) | bit) & self._mask
+        return out
+
+    def transfer(self, data):
+        n = 8 * len(data)
+        total = ((self._shift << n) | int.from_bytes(bytes(data), "big"))
+        self._shift = total & self._mask
+        return list((total >> (16 * self.chips)).to_bytes(len(data), "big")) if n else []
+
+    def deselect(self):
+        for chip in range(self.chips):
+            word = (self._shift >> (16 * chip)) & 0xFFFF
+            address = (word >> 8) & 0x0F
+            if address != self.NOOP:
+                self.registers[chip][address] = word & 0xFF
+                self.writes += 1
+
+    def digits(self, chip=0):
+        """The 8 digit registers of chip, digit 0 first."""
+        return list(self.registers[chip][self.DIGIT0:self.DIGIT0 + 8])
+
+    def is_on(self, chip=0):
+        """True if chip is not in shutdown."""
+        return bool(self.registers[chip][self.SHUTDOWN] & 1)
+
+
+class ADS1115Model(I2CDevice):
+    """ADS1115 ADC. Registers (16-bit, MSB first): 0 = conversion, 1 = config, 2 = Lo_thresh, 3 = Hi_thresh.
+    In single-shot mode, writing the config register with bit 15 set starts a conversion, which takes
+    1/data rate seconds. Bit 15 reads 0 while it is busy. In continuous mode a conversion is done every
+    1/data rate seconds. The result is two's complement: 32767 for +FSR."""
+
+    name = "ADS1115"
+    FSR = (6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256)
+    RATES = (8, 16, 32, 64, 128, 250, 475, 860)
+    MUX = ((0, 1), (0, 3), (1, 3), (2, 3), (0, None), (1, None), (2, None), (3, None))
+
+    def __init__(self, inputs=None):
+        """inputs = dict AIN:signal. The default is a sine wave of 0.5 V amplitude around 1 V on each input,
+        with a frequency of 0.5 Hz times (input + 1), and 50 uV of noise."""
+        self.inputs = {ch: Sine(0.5, 0.5 * (ch + 1), 1., noise=5e-5, seed=10 + ch) for ch in range(4)}
+        if inputs is not None:
+            self.inputs.update(inputs)
+        self.registers = [0x0000, 0x8583, 0x8000, 0x7FFF]
+        self.pointer = 0
+        self.conversions = 0
+        self._busy_until = None      # End time of a single-shot conversion in progress.
+        self._continuous_start = None
+
+    def _now(self):
+        return self.clock.time() if self.clock is not None else 0.
+
+    def _period(self):
+        return 1. / self.RATES[(self.registers[1] >> 5) & 0b111]
+
+    def _sample(self, t):
+        """Convert the input selected in the config register at time t."""
+        config = self.registers[1]
+        pos, neg = self.MUX[(config >> 12) & 0b111]
+        volts = _signal(self.inputs.get(pos, 0.))(t)
+        if neg is not None:
+            volts -= _signal(self.inputs.get(neg, 0.))(t)
+        code = int(round(volts / self.FSR[(config >> 9) & 0b111] * 32768))
+        self.conversions += 1
+        return min(max(code, -32768), 32767) & 0xFFFF
+
+    def _update(self, poll=False):
+        """Bring the conversion register and the OS bit up to date."""
+        if self._busy_until is not None:
+            if poll:
+                self.clock.ready(self._busy_until)
+            if self._now() >= self._busy_until:
+                self.registers[0] = self._sample(self._busy_until)
+                self.registers[1] |= 0x8000
+                self._busy_until = None
+        elif self._continuous_start is not None:
+            n = int((self._now() - self._continuous_start) / self._period())
+            if n > 0:
+                self.registers[0] = self._sample(self._continuous_start + n * self._period())
+
+    def write(self, data):
+        if len(data) == 0:
+            return
+        self.pointer = data[0] & 0b11
+        if len(data) < 3:
+            return
+        value = (data[1] << 8) | data[2]
+        if self.pointer == 0:
+            return                                     # The conversion register is read only.
+        if self.pointer != 1:
+            self.registers[self.pointer] = value
+            return
+        self._update()
+        if value & 0x0100:                             # Single-shot mode.
+            self._continuous_start = None
+            if value & 0x8000 and self._busy_until is None:
+                self._busy_until = self._now() + self._period()
+                value &= 0x7FFF
+            else:
+                value = (value & 0x7FFF) | (self.registers[1] & 0x8000)
+        else:                                          # Continuous mode, restarted by a config write.
+            self._busy_until = None
+            self._continuous_start = self._now()
+            value &= 0x7FFF
+        self.registers[1] = value
+
+    def read(self, n):
+        self._update(poll=self.pointer == 1)
+        value = self.registers[self.pointer]
+        out = [(value >> 8) & 0xFF, value & 0xFF]
+        return (out * (n // 2 + 1))[:n]
+
+
+class BME280Model(RegisterDevice):
+    """BME280 sensor. The calibration is the example from the datasheet (and typical humidity values).
+    A measurement is started by setting forced mode in ctrl_meas (0xF4), or runs periodically in normal mode.
+    It takes the typical measurement time for the oversampling settings, during which bit 3 of status (0xF3)
+    is set; in forced mode the chip goes back to sleep mode after the measurement. The raw data registers
+    hold the ADC values for the temperature, pressure and humidity of the environment at that time.
+    The IIR filter is not simulated."""
+
+    name = "BME280"
+    CALIB_T = (27504, 26435, -1000)
+    CALIB_P = (36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+    CALIB_H = (75, 362, 0, 313, 50, 30)
+    STANDBY = (0.0005, 0.0625, 0.125, 0.25, 0.5, 1., 0.01, 0.02)
+    OVERSAMPLE = (0, 1, 2, 4, 8, 16, 16, 16)
+
+    def __init__(self, temperature=None, pressure=None, humidity=None, chip_id=0x60):
+        """Input: the environment, each a function of time or a constant. The defaults vary slowly around
+        22 C, 1013.25 hPa and 45 %RH. chip_id is 0x60 for a BME280, 0x58 for a BMP280 (no humidity)."""
+        super().__init__(256)
+        self.temperature = temperature if temperature is not None else Sine(0.5, 1. / 600, 22., seed=20)
+        self.pressure = pressure if pressure is not None else Sine(50., 1. / 900, 101325., seed=21)
+        self.humidity = humidity if humidity is not None else Sine(2., 1. / 1200, 45., seed=22)
+        self.chip_id = chip_id
+        self.measurements = 0
+        cal = bytearray()
+        for i, value in enumerate(self.CALIB_T + self.CALIB_P):
+            cal += (value & 0xFFFF).to_bytes(2, "little")
+        self._calibration = cal
+        self.reset()
+
+    def reset(self):
+        """Power on state."""
+        self.registers[:] = bytes(256)
+        self.registers[0xD0] = self.chip_id
+        self.registers[0x88:0x88 + len(self._calibration)] = self._calibration
+        h1, h2, h3, h4, h5, h6 = self.CALIB_H
+        self.registers[0xA1] = h1
+        self.registers[0xE1:0xE3] = (h2 & 0xFFFF).to_bytes(2, "little")
+        self.registers[0xE3] = h3
+        self.registers[0xE4] = (h4 >> 4) & 0xFF
+        self.registers[0xE5] = ((h5 & 0x0F) << 4) | (h4 & 0x0F)
+        self.registers[0xE6] = (h5 >> 4) & 0xFF
+        self.registers[0xE7] = h6 & 0xFF
+        self.registers[0xF7:0xFF] = bytes([0x80, 0, 0, 0x80, 0, 0, 0x80, 0])
+        self._busy_until = None
+        self._next_normal = None
+
+    def measurement_time(self):
+        """Typical measurement time in seconds for the current oversampling settings."""
+        osrs_t = self.OVERSAMPLE[self.registers[0xF4] >> 5]
+        osrs_p = self.OVERSAMPLE[(self.registers[0xF4] >> 2) & 0b111]
+        osrs_h = self.OVERSAMPLE[self.registers[0xF2] & 0b111] if self.chip_id == 0x60 else 0
+        t = 1. + 2. * osrs_t
+        if osrs_p:
+            t += 2. * osrs_p + 0.5
+        if osrs_h:
+            t += 2. * osrs_h + 0.5
+        return t * 1e-3
+
+    def _now(self):
+        return self.clock.time() if self.clock is not None else 0.
+
+    def _measure(self, t):
+        """Fill the data registers with the raw values for the environment at time t."""
+        ctrl = self.registers[0xF4]
+        temp, pres, humi = (_signal(s)(t) for s in (self.temperature, self.pressure, self.humidity))
+        raw_t = self.raw_temperature(temp) if ctrl >> 5 else 0x80000
+        t_fine = self._t_fine(raw_t)
+        raw_p = self.raw_pressure(pres, t_fine) if (ctrl >> 2) & 0b111 else 0x80000
+        raw_h = self.raw_humidity(humi, t_fine) if self.registers[0xF2] & 0b111 else 0x8000
+        self.registers[0xF7:0xFA] = ((raw_p << 4) & 0xFFFFFF).to_bytes(3, "big")
+        self.registers[0xFA:0xFD] = ((raw_t << 4) & 0xFFFFFF).to_bytes(3, "big")
+        self.registers[0xFD:0xFF] = raw_h.to_bytes(2, "big")
+        self.measurements += 1
+
+    def _update(self, poll=False):
+        if self._busy_until is not None:
+            if poll:
+                self.clock.ready(self._busy_until)
+            if self._now() >= self._busy_until:
+                self._measure(self._busy_until)
+                self._busy_until = None
+                if self.registers[0xF4] & 0b11 != 0b11:
+                    self.registers[0xF4] &= 0b11111100      # Forced mode: back to sleep.
+        if self._next_normal is not None and self.registers[0xF4] & 0b11 == 0b11:
+            period = self.measurement_time() + self.STANDBY[self.registers[0xF5] >> 5]
+            now = self._now()
+            if now >= self._next_normal:
+                n = int((now - self._next_normal) / period)
+                self._measure(self._next_normal + n * period)
+                self._next_normal += (n + 1) * period
+
+    def read_register(self, reg):
+        if reg == 0xF3:
+            self._update(poll=True)
+            return 0x08 if self._busy_until is not None else 0x00
+        if reg == 0xF4:
+            self._update(poll=True)
+        elif reg >= 0xF7:
+            self._update()
+        return self.registers[reg]
+
+    def write_register(self, reg, value):
+        if reg == 0xE0:
+            if value == 0xB6:
+                self.reset()
+            return
+        if reg not in (0xF2, 0xF4, 0xF5):
+            return                                          # Read only.
+        self._update()
+        self.registers[reg] = value
+        if reg == 0xF4:
+            mode = value & 0b11
+            if mode in (1, 2):
+                self._busy_until = self._now() + self.measurement_time()
+                self._next_normal = None
+            elif mode == 3:
+                self._next_normal = self._now() + self.measurement_time()
+            else:
+                self._next_normal = None
+
+    # Compensation formulas from the datasheet (double precision versions), and their inverse.
+    def _t_fine(self, raw_t):
+        t1, t2, t3 = self.CALIB_T
+        var1 = (raw_t / 16384.0 - t1 / 1024.0) * t2
+        var2 = (raw_t / 131072.0 - t1 / 8192.0) ** 2 * t3
+        return var1 + var2
+
+    def _pressure(self, raw_p, t_fine):
+        p1, p2, p3, p4, p5, p6, p7, p8, p9 = self.CALIB_P
+        var1 = t_fine / 2.0 - 64000.0
+        var2 = var1 * var1 * p6 / 32768.0 + var1 * p5 * 2.0
+        var2 = var2 / 4.0 + p4 * 65536.0
+        var1 = (p3 * var1 * var1 / 524288.0 + p2 * var1) / 524288.0
+        var1 = (1.0 + var1 / 32768.0) * p1
+        p = (1048576.0 - raw_p - var2 / 4096.0) * 6250.0 / var1
+        return p + (p9 * p * p / 2147483648.0 + p * p8 / 32768.0 + p7) / 16.0
+
+    def _humidity(self, raw_h, t_fine):
+        h1, h2, h3, h4, h5, h6 = self.CALIB_H
+        var1 = t_fine - 76800.0
+        var1 = (raw_h - (h4 * 64.0 + h5 / 16384.0 * var1)) * (h2 / 65536.0 * (1.0 + h6 / 67108864.0 * var1 *
+                                                                                (1.0 + h3 / 67108864.0 * var1)))
+        return var1 * (1.0 - h1 * var1 / 524288.0)
+
+    @staticmethod
+    def _invert(func, target, lo, hi):
+        """Integer x in [lo, hi] for which func(x) is closest to target, for a monotonic func."""
+        rising = func(hi) > func(lo)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if (func(mid) < target) == rising:
+                lo = mid
+            else:
+                hi = mid
+        return lo if abs(func(lo) - target) <= abs(func(hi) - target) else hi
+
+    def raw_temperature(self, temp):
+        """The 20-bit ADC value for a temperature in C."""
+        return self._invert(lambda x: self._t_fine(x) / 5120.0, temp, 0, 0xFFFFF)
+
+    def raw_pressure(self, pres, t_fine):
+        """The 20-bit ADC value for a pressure in Pa."""
+        return self._invert(lambda x: self._pressure(x, t_fine), pres, 0, 0xFFFFF)
+
+    def raw_humidity(self, humi, t_fine):
+        """The 16-bit ADC value for a relative humidity in %."""
+        return self._invert(lambda x: self._humidity(x, t_fine), humi, 0, 0xFFFF)
+
+
+class DS3231Model(RegisterDevice):
+    """DS3231 real time clock. Registers 0x00-0x06 hold the time in BCD, and run on the simulation clock,
+    starting at start. 0x0E is control, 0x0F status, 0x11-0x12 the temperature, which is updated every
+    64 seconds. Reads and writes wrap around after register 0x12."""
+
+    name = "DS3231"
+
+    def __init__(self, start=datetime(2024, 1, 1), temperature=None):
+        """Input:
+         * start       = the date and time at the start of the simulation.
+         * temperature = function of time or constant, in C. The default varies around 25 C."""
+        super().__init__(0x13)
+        self.temperature = temperature if temperature is not None else Sine(0.5, 1. / 3600, 25., seed=30)
+        self.registers[0x0E] = 0x1C
+        self.registers[0x0F] = 0x88
+        self._epoch = start
+        self._t0 = 0.
+        self._weekday = start.isoweekday()
+        self._hour12 = False
+        self._stopped = None         # Register values while they do not form a valid time.
+
+    def _now(self):
+        return self.clock.time() if self.clock is not None else 0.
+
+    def now(self):
+        """The date and time of the clock."""
+        return self._epoch + timedelta(seconds=self._now() - self._t0)
+
+    @staticmethod
+    def _bcd(value):
+        return (value // 10) * 16 + value % 10
+
+    @staticmethod
+    def _from_bcd(value):
+        return (value >> 4) * 10 + (value & 0x0F)
+
+    def _time_registers(self):
+        if self._stopped is not None:
+            return list(self._stopped)
+        now = self.now()
+        if self._hour12:
+            hour = now.hour % 12 or 12
+            hours = 0x40 | (0x20 if now.hour >= 12 else 0) | self._bcd(hour)
+        else:
+            hours = self._bcd(now.hour)
+        days = (now.date() - self._epoch.date()).days
+        weekday = (self._weekday - 1 + days) % 7 + 1
+        century = 0x80 if now.year >= 2100 else 0
+        return [self._bcd(now.second), self._bcd(now.minute), hours, weekday, self._bcd(now.day),
+                century | self._bcd(now.month), self._bcd(now.year % 100)]
+
+    def read_register(self, reg):
+        if reg < 7:
+            return self._time_registers()[reg]
+        if reg in (0x11, 0x12):
+            t = self._now() // 64 * 64
+            quarters = int(round(_signal(self.temperature)(t) * 4))
+            return ((quarters >> 2) & 0xFF) if reg == 0x11 else ((quarters & 0b11) << 6)
+        return self.registers[reg]
+
+    def write_register(self, reg, value):
+        if reg >= 7:
+            if reg not in (0x11, 0x12):
+                self.registers[reg] = value
+            return
+        regs = self._time_registers()
+        regs[reg] = value
+        hours = regs[2]
+        if hours & 0x40:
+            hour = self._from_bcd(hours & 0x1F) % 12 + (12 if hours & 0x20 else 0)
+        else:
+            hour = self._from_bcd(hours & 0x3F)
+        try:
+            epoch = datetime(2000 + (regs[5] >> 7) * 100 + self._from_bcd(regs[6]), self._from_bcd(regs[5] & 0x1F),
+                             self._from_bcd(regs[4]), hour, self._from_bcd(regs[1]), self._from_bcd(regs[0]))
+        except ValueError:          # Not a valid time (yet), e.g. halfway through setting the registers.
+            self._stopped = regs
+            return
+        self._stopped = None
+        self._hour12 = bool(hours & 0x40)
+        self._weekday = (regs[3] & 0x07) or 7
+        self._epoch = epoch
+        self._t0 = self._now()      # Writing the time resets the divider chain.
+        self.registers[0x0F] &= 0x7F
+
+
+class MCP4725Model(I2CDevice):
+    """MCP4725 DAC. Fast mode write: 2 bytes, PD1 PD0 and D11-D0. Write DAC register (command 010) or
+    DAC register and EEPROM (command 011): 3 bytes. The EEPROM write takes 25 ms, during which RDY reads 0.
+    A read returns 5 bytes: status, DAC register (2 bytes) and EEPROM (2 bytes)."""
+
+    name = "MCP4725"
+    EEPROM_WRITE_TIME = 0.025
+
+    def __init__(self, vdd=3.3, eeprom=0x800):
+        self.vdd = vdd
+        self.eeprom = eeprom
+        self.eeprom_power_down = 0
+        self.value = eeprom
+        self.power_down = 0
+        self.writes = 0
+        self._busy_until = 0.
+
+    def _now(self):
+        return self.clock.time() if self.clock is not None else 0.
+
+    @property
+    def volts(self):
+        """The output voltage."""
+        return 0. if self.power_down else self.vdd * self.value / 4096
+
+    def __call__(self, t):
+        """The output voltage as a signal, to connect the DAC to an ADC input model."""
+        return self.volts
+
+    def write(self, data):
+        if len(data) >= 2 and data[0] >> 6 == 0:            # Fast mode, can be repeated.
+            for i in range(0, len(data) - 1, 2):
+                self.power_down = (data[i] >> 4) & 0b11
+                self.value = ((data[i] & 0x0F) << 8) | data[i + 1]
+                self.writes += 1
+        elif len(data) >= 3 and data[0] >> 6 == 0b01:
+            self.power_down = (data[0] >> 1) & 0b11
+            self.value = (data[1] << 4) | (data[2] >> 4)
+            self.writes += 1
+            if (data[0] >> 5) & 0b111 == 0b011 and self._now() >= self._busy_until:
+                self.eeprom = self.value
+                self.eeprom_power_down = self.power_down
+                self._busy_until = self._now() + self.EEPROM_WRITE_TIME
+
+    def read(self, n):
+        ready = 0x80 if self._now() >= self._busy_until else 0
+        out = [ready | 0x40 | (self.power_down << 1), self.value >> 4, (self.value & 0x0F) << 4,
+               (self.eeprom_power_down << 5) | (self.eeprom >> 8), self.eeprom & 0xFF]
+        return (out * (n // 5 + 1))[:n]
+
+
+class APA102Model(SpiDevice):
+    """A strip of APA102 LEDs. A start frame of 32 zero bits resets the strip, then each LED takes a frame of
+    4 bytes: 0xE0 | brightness, blue, green, red. There is no chip select, so the data of several transfers
+    forms one stream."""
+
+    name = "APA102"
+
+    def __init__(self, n_leds=0):
+        self.leds = [(0, 0, 0, 0)] * n_leds     # (brightness, blue, green, red)
+        self.frames = 0
+        self._zeros = 0
+        self._index = None
+        self._frame = []
+
+    def transfer(self, data):
+        for byte in data:
+            if self._frame:
+                self._frame.append(byte)
+                if len(self._frame) == 4:
+                    if self._index >= len(self.leds):
+                        self.leds.append(None)
+                    self.leds[self._index] = (self._frame[0] & 0x1F,) + tuple(self._frame[1:])
+                    self._index += 1
+                    self._frame = []
+                continue
+            if byte == 0:
+                self._zeros += 1
+                if self._zeros == 4:
+                    self._index = 0
+                    self.frames += 1
+                continue
+            self._zeros = 0
+            if byte >= 0xE0 and self._index is not None:
+                self._frame = [byte]
+        return [0] * len(data)
+
+
+class HD44780Model(I2CDevice):
+    """HD44780 character display with a PCF8574 I2C backpack, as used by CharLCD.
+    The PCF8574 port bits are P0 = RS, P1 = R/W, P2 = E, P3 = backlight, P4-P7 = D4-D7. The display
+    starts in 8-bit mode, and takes the data on the falling edge of E. Instructions take 37 us, clear
+    and home 1.52 ms, during which the busy flag is set."""
+
+    name = "HD44780"
+
+    def __init__(self, columns=20, rows=4):
+        self.columns = columns
+        self.rows = rows
+        self.ddram = bytearray(b" " * 0x80)
+        self.cgram = bytearray(64)
+        self.port = 0xFF
+        self.eight_bit = True
+        self.display_on = False
+        self.increment = True
+        self.address = 0
+        self.instructions = 0
+        self.characters = 0
+        self._cgram_mode = False
+        self._nibble = None
+        self._read_nibble = 0
+        self._busy_until = 0.
+
+    def _now(self):
+        return self.clock.time() if self.clock is not None else 0.
+
+    def lines(self):
+        """The text on the display, as a list of strings."""
+        starts = [0x00, 0x40, self.columns, 0x40 + self.columns]
+        return [self.ddram[s:s + self.columns].decode("latin-1") for s in starts[:self.rows]]
+
+    def _advance(self):
+        if self._cgram_mode:
+            self.address = (self.address + (1 if self.increment else -1)) & 0x3F
+        else:
+            a = self.address + (1 if self.increment else -1)
+            self.address = {0x28: 0x40, 0x68: 0x00, 0x3F: 0x27, -1: 0x67}.get(a, a)
+
+    def _execute(self, value, rs):
+        duration = 37e-6
+        if rs:
+            if self._cgram_mode:
+                self.cgram[self.address] = value
+            else:
+                self.ddram[self.address] = value
+                self.characters += 1
+            self._advance()
+            duration = 41e-6
+        else:
+            self.instructions += 1
+            if value & 0x80:
+                self.address = value & 0x7F
+                self._cgram_mode = False
+            elif value & 0x40:
+                self.address = value & 0x3F
+                self._cgram_mode = True
+            elif value & 0x20:
+                self.eight_bit = bool(value & 0x10)
+            elif value & 0x10:
+                if not value & 0x08:                # Cursor move, the display shift is not simulated.
+                    self.increment, saved = bool(value & 0x04), self.increment
+                    self._advance()
+                    self.increment = saved
+            elif value & 0x08:
+                self.display_on = bool(value & 0x04)
+            elif value & 0x04:
+                self.increment = bool(value & 0x02)
+            elif value & 0x02:
+                self.address = 0
+                self._cgram_mode = False
+                duration = 1.52e-3
+            elif value & 0x01:
+                self.ddram[:] = b" " * len(self.ddram)
+                self.address = 0
+                self._cgram_mode = False
+                self.increment = True
+                duration = 1.52e-3
+        self._busy_until = self._now() + duration
+
+    def _set_port(self, value):
+        old = self.port
+        self.port = value
+        if not (old & 0x04 and not value & 0x04):
+            return                                  # Only the falling edge of E does something.
+        if old & 0x02:
+            self._read_nibble ^= 1
+            return
+        nibble = old >> 4
+        if self.eight_bit:
+            self._execute(nibble << 4, old & 0x01)
+            self._nibble = None
+        elif self._nibble is None:
+            self._nibble = nibble
+        else:
+            self._execute((self._nibble << 4) | nibble, old & 0x01)
+            self._nibble = None
+
+    def write(self, data):
+        for value in data:
+            self._set_port(value)
+
+    def read(self, n):
+        value = self.port
+        if self.port & 0x06 == 0x06:                # R/W and E high: the display drives D4-D7.
+            if self._read_nibble == 0:
+                busy = self.clock is not None and not self.clock.ready(self._busy_until)
+                nibble = (busy << 3) | ((self.address >> 4) & 0x07)
+            else:
+                nibble = self.address & 0x0F
+            value = (self.port & 0x0F) | (nibble << 4)
+        return [value] * n
+
+
+class SN74HC165Model(SpiDevice):
+    """A chain of SN74HC165 parallel in, serial out shift registers. LOAD low copies the parallel inputs
+    into the register, and Q shows the highest bit. On each rising clock edge the register shifts, with the
+    serial input (MOSI, or 0 on GPIO) going into the lowest bit. It can be read with SPI (attach_spi),
+    or bit-banged on GPIO pins, with connect(). In both cases the LOAD pin is on GPIO."""
+
+    name = "SN74HC165"
+
+    def __init__(self, bits=8, inputs=None, seed=0):
+        """Input:
+         * bits   = length of the chain, 8 bits per chip.
+         * inputs = value on the parallel inputs: an int, a function of time, or None for a new random
+                    value at every load, from a generator seeded with seed."""
+        self.bits = bits
+        self.inputs = inputs
+        self.register = 0
+        self.loaded = None
+        self.loads = 0
+        self._mask = (1 << bits) - 1
+        self._random = random.Random(seed)
+        self._gpio = None
+
+    def connect(self, gpio, load, clk=None, data=None):
+        """Connect the LOAD pin, and for bit-bang readout also the CLK and Q (data) pins, to GPIO."""
+        self._gpio = gpio
+        self._data = data
+        self._clk_level = 0
+        gpio.watch(load, self._on_load)
+        if clk is not None:
+            gpio.watch(clk, self._on_clk)
+
+    @property
+    def q(self):
+        return (self.register >> (self.bits - 1)) & 1
+
+    def load(self):
+        """Copy the parallel inputs into the register."""
+        if self.inputs is None:
+            value = self._random.getrandbits(self.bits)
+        elif callable(self.inputs):
+            value = self.inputs(self.clock.time() if self.clock is not None else 0.)
+        else:
+            value = self.inputs
+        self.register = self.loaded = value & self._mask
+        self.loads += 1
+
+    def _on_load(self, level):
+        if not level:
+            self.load()
+            if self._data is not None:
+                self._gpio.drive(self._data, self.q)
+
+    def _on_clk(self, level):
+        if level and not self._clk_level:
+            self.shift(0)
+            if self._data is not None:
+                self._gpio.drive(self._data, self.q)
+        self._clk_level = level
+
+    def shift(self, bit):
+        out = self.q
+        self.register = ((self.register << 1) | bit) & self._mask
+        return out
+
+    def transfer(self, data):
+        n = 8 * len(data)
+        total = (self.register << n) | int.from_bytes(bytes(data), "big")
+        self.register = total & self._mask
+        return list((total >> self.bits).to_bytes(len(data), "big")) if n else []
@@ -0,0 +1,581 @@
+#
+# Deterministic simulator for the GPIO, SPI and I2C buses, used by the "sim" backend.
+#
+# A Simulator holds a simulated clock, the GPIO pins, and the devices attached to the SPI and I2C buses.
+# Its gpio, spidev and smbus attributes have the same interface as the RPi.GPIO, spidev and smbus
+# modules, so the drivers run unchanged. The chip models are in DevLib/backends/devices.py.
+#
+# Time:
+#   Every bus operation advances the clock by the time it would take on the hardware:
+#    * SPI: overhead of the ioctl call + 8 bits per byte at max_speed_hz.
+#    * I2C: overhead of the ioctl call + 9 bits per byte (address and data bytes, each with ACK) and
+#           a start and stop condition at the bus speed (100 kHz on a standard Raspberry Pi).
+#    * GPIO: a fixed time for each call.
+#   By default the clock is virtual: it only moves by these amounts, so the simulation gives the same
+#   results every time, independent of the speed of the computer, and sim.clock.time() is the time the
+#   same sequence of operations would take on the Raspberry Pi bus. When a driver polls a device that
+#   is still busy (an ADS1115 conversion, a BME280 measurement), the virtual clock is moved forward to
+#   when the device is ready, just as the driver would have waited on the hardware.
+#   With SimClock(realtime=True) the clock follows the wall clock, and the bus operations take (at least)
+#   their real time, which is useful to load test a program at the real speed.
+#
+# Statistics:
+#   sim.stats() returns the number of transactions, bytes and bus time for each bus and device.
+#
+# Example:
+#
+#   from DevLib.backends.sim import Simulator
+#   from DevLib.backends.devices import MCP3208Model, Sine
+#   sim = Simulator()
+#   adc = sim.attach_spi(0, 0, MCP3208Model(inputs={0: Sine(amplitude=1., frequency=50., offset=1.65)}))
+#
+# Author: Maurik Holtrop
+#
+import functools
+import time
+import types
+
+
+class SimClock(object):
+    """The time of the simulation, in seconds."""
+
+    def __init__(self, realtime=False, start=0.):
+        """Input:
+         * realtime = False for a virtual clock that only advances with the simulated operations,
+                      True to follow the wall clock and have operations take their real time.
+         * start    = the time at the start of the simulation."""
+        self.realtime = realtime
+        self._start = start
+        self._now = start
+        self._wall0 = time.perf_counter()
+
+    def time(self):
+        """Return the current time of the simulation."""
+        if self.realtime:
+            return self._start + time.perf_counter() - self._wall0
+        return self._now
+
+    def advance(self, dt):
+        """Let dt seconds pass."""
+        if self.realtime:
+            end = time.perf_counter() + dt
+            if dt > 0.002:
+                time.sleep(dt - 0.001)
+            while time.perf_counter() < end:
+                pass
+        else:
+            self._now += dt
+
+    sleep = advance
+
+    def ready(self, t):
+        """A device that is busy until time t is polled: return True if it is ready.
+        The virtual clock moves forward to t, as if the caller waited for the device."""
+        if self.realtime:
+            return self.time() >= t
+        if t > self._now:
+            self._now = t
+        return True
+
+
+class BusStats(object):
+    """Counters for one bus or device."""
+
+    __slots__ = ("transactions", "bytes", "busy")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.busy = 0.
+
+    def add(self, nbytes, busy):
+        self.transactions += 1
+        self.bytes += nbytes
+        self.busy += busy
+
+    def as_dict(self):
+        return {"transactions": self.transactions, "bytes": self.bytes, "busy": self.busy}
+
+
+class SpiDevice(object):
+    """Base class of the simulated SPI devices.
+    A device is selected (CS low), then bits are shifted in and out, then deselected.
+    Subclasses implement shift(), and can implement transfer() for a faster byte wise transfer."""
+
+    name = "spi device"
+    clock = None          # Set when the device is attached to a Simulator.
+
+    def select(self):
+        """Chip select goes active."""
+        pass
+
+    def deselect(self):
+        """Chip select goes inactive."""
+        pass
+
+    def shift(self, bit):
+        """Clock one bit in from MOSI, and return the bit on MISO."""
+        return 0
+
+    def transfer(self, data):
+        """Shift the bytes in data in, MSB first, and return the bytes shifted out."""
+        out = []
+        for byte in data:
+            value = 0
+            for i in range(7, -1, -1):
+                value = (value << 1) | self.shift((byte >> i) & 1)
+            out.append(value)
+        return out
+
+
+class I2CDevice(object):
+    """Base class of the simulated I2C devices.
+    write(data) receives the bytes of a write message, read(n) returns the bytes of a read message.
+    An SMBus read of a register is a write of the register number followed by a read."""
+
+    name = "i2c device"
+    clock = None
+
+    def write(self, data):
+        pass
+
+    def read(self, n):
+        return [0xFF] * n
+
+
+class RegisterDevice(I2CDevice):
+    """An I2C device with a file of 8-bit registers and an auto incrementing register pointer.
+    Subclasses can override read_register() and write_register() for registers with side effects."""
+
+    def __init__(self, size=256):
+        self.registers = bytearray(size)
+        self.pointer = 0
+
+    def read_register(self, reg):
+        return self.registers[reg]
+
+    def write_register(self, reg, value):
+        self.registers[reg] = value
+
+    def write(self, data):
+        if len(data) == 0:
+            return
+        self.pointer = data[0] % len(self.registers)
+        for value in data[1:]:
+            self.write_register(self.pointer, value & 0xFF)
+            self.pointer = (self.pointer + 1) % len(self.registers)
+
+    def read(self, n):
+        out = []
+        for i in range(n):
+            out.append(self.read_register(self.pointer))
+            self.pointer = (self.pointer + 1) % len(self.registers)
+        return out
+
+
+class _NoDevice(SpiDevice):
+    """Nothing connected: MISO stays low."""
+    name = "none"
+
+
+class SimGPIO(object):
+    """Simulated GPIO pins with the interface of RPi.GPIO.
+    Devices can watch the outputs with watch(pin, callback) and drive the inputs with drive(pin, level)."""
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    RPI_INFO = {"TYPE": "Simulated", "P1_REVISION": 3}
+    VERSION = "sim"
+
+    def __init__(self, clock, call_time=1e-6):
+        self.clock = clock
+        self.call_time = call_time
+        self.stats = BusStats()
+        self._mode = None
+        self._direction = {}
+        self._level = {}
+        self._watchers = {}
+
+    # The RPi.GPIO interface.
+    def setmode(self, mode):
+        self._mode = mode
+
+    def getmode(self):
+        return self._mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=PUD_OFF, initial=None):
+        for pin in self._pins(channel):
+            self._direction[pin] = direction
+            if pin not in self._level:
+                self._level[pin] = 1 if pull_up_down == self.PUD_UP else 0
+            if direction == self.OUT and initial is not None:
+                self._set(pin, initial)
+
+    def output(self, channel, value):
+        pins = self._pins(channel)
+        values = value if isinstance(value, (list, tuple)) else [value] * len(pins)
+        if len(values) != len(pins):
+            raise RuntimeError("Number of channels != number of values")
+        self.stats.add(0, self.call_time)
+        self.clock.advance(self.call_time)
+        for pin, val in zip(pins, values):
+            self._set(pin, val)
+
+    def input(self, channel):
+        self.stats.add(0, self.call_time)
+        self.clock.advance(self.call_time)
+        return self._level.get(channel, 0)
+
+    def cleanup(self, channel=None):
+        pins = list(self._direction) if channel is None else self._pins(channel)
+        for pin in pins:
+            self._direction.pop(pin, None)
+
+    def gpio_function(self, channel):
+        return self._direction.get(channel, self.IN)
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        pass
+
+    def remove_event_detect(self, channel):
+        pass
+
+    def event_detected(self, channel):
+        return False
+
+    # The simulator side.
+    def watch(self, pin, callback):
+        """Call callback(level) every time the output pin is written."""
+        self._watchers.setdefault(pin, []).append(callback)
+
+    def drive(self, pin, level):
+        """Set the level a device puts on the pin, which is what input(pin) returns."""
+        self._level[pin] = 1 if level else 0
+
+    def level(self, pin):
+        """Return the level of the pin."""
+        return self._level.get(pin, 0)
+
+    def _set(self, pin, value):
+        level = 1 if value else 0
+        self._level[pin] = level
+        for callback in self._watchers.get(pin, ()):
+            callback(level)
+
+    @staticmethod
+    def _pins(channel):
+        return list(channel) if isinstance(channel, (list, tuple)) else [channel]
+
+
+class GPIOSpi(object):
+    """Connect an SpiDevice to GPIO pins, for drivers that bit-bang the SPI protocol.
+    Input is sampled, and the next output bit is put on MISO, on the rising clock edge for SPI mode 0 and 3,
+    or on the falling edge for mode 1 and 2. cs is active low, and can be None for a device that is
+    always selected."""
+
+    def __init__(self, gpio, device, cs, clk, mosi=None, miso=None, mode=0):
+        self._gpio = gpio
+        self._device = device
+        self._mosi = mosi
+        self._miso = miso
+        self._sample_level = 1 if mode in (0, 3) else 0
+        self._clk_level = 1 if mode in (2, 3) else 0
+        self._selected = cs is None
+        if cs is not None:
+            gpio.watch(cs, self._on_cs)
+        gpio.watch(clk, self._on_clk)
+
+    def _on_cs(self, level):
+        if not level and not self._selected:
+            self._selected = True
+            self._device.select()
+        elif level and self._selected:
+            self._selected = False
+            self._device.deselect()
+
+    def _on_clk(self, level):
+        if level == self._clk_level:
+            return
+        self._clk_level = level
+        if self._selected and level == self._sample_level:
+            bit = self._device.shift(self._gpio.level(self._mosi) if self._mosi is not None else 0)
+            if self._miso is not None:
+                self._gpio.drive(self._miso, bit)
+
+
+class SimSpiDev(object):
+    """Simulated spidev.SpiDev. Each transfer selects the device, shifts the bytes and deselects it."""
+
+    def __init__(self, sim, bus=None, device=None):
+        self._sim = sim
+        self._device = None
+        self.mode = 0
+        self.max_speed_hz = 500000
+        self.bits_per_word = 8
+        self.lsbfirst = False
+        self.cshigh = False
+        self.threewire = False
+        self.loop = False
+        self.no_cs = False
+        if bus is not None:
+            self.open(bus, device)
+
+    def open(self, bus, device):
+        self._device, self._stats = self._sim.spi_device(bus, device)
+        self._bus_stats = self._sim.bus_stats("spi{}".format(bus))
+
+    def close(self):
+        self._device = None
+
+    def _transfer(self, data, speed_hz=0, delay_usecs=0):
+        if self._device is None:
+            raise OSError(9, "Bad file descriptor")
+        data = list(data)
+        speed = speed_hz or self.max_speed_hz
+        busy = self._sim.spi_overhead + 8. * len(data) / speed + delay_usecs * 1e-6
+        self._stats.add(len(data), busy)
+        self._bus_stats.add(len(data), busy)
+        self._device.select()
+        out = self._device.transfer(data)
+        self._device.deselect()
+        self._sim.clock.advance(busy)
+        return out
+
+    def xfer(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        return self._transfer(data, speed_hz, delay_usecs)
+
+    def xfer_frames(self, data, frame_len, speed_hz=0):
+        """Transfer data as frames of frame_len bytes, with CS released between the frames, in one transaction,
+        like a single SPI_IOC_MESSAGE ioctl with cs_change set. See DevLib.backends.xfer_frames()."""
+        if self._device is None:
+            raise OSError(9, "Bad file descriptor")
+        data = list(data)
+        speed = speed_hz or self.max_speed_hz
+        busy = self._sim.spi_overhead + 8. * len(data) / speed
+        self._stats.add(len(data), busy)
+        self._bus_stats.add(len(data), busy)
+        clock = self._sim.clock
+        clock.advance(self._sim.spi_overhead)
+        out = []
+        for i in range(0, len(data), frame_len):
+            frame = data[i:i + frame_len]
+            self._device.select()
+            out.extend(self._device.transfer(frame))
+            self._device.deselect()
+            clock.advance(8. * len(frame) / speed)
+        return out
+
+    def xfer2(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        return self._transfer(data, speed_hz, delay_usecs)
+
+    def xfer3(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        return tuple(self._transfer(data, speed_hz, delay_usecs))
+
+    def writebytes(self, data):
+        self._transfer(data)
+
+    def writebytes2(self, data):
+        self._transfer(data)
+
+    def readbytes(self, n):
+        return self._transfer([0] * n)
+
+
+class SimSMBus(object):
+    """Simulated smbus.SMBus (and smbus2.SMBus)."""
+
+    def __init__(self, sim, bus=None, force=False):
+        self._sim = sim
+        self._bus = None
+        if bus is not None:
+            self.open(bus)
+
+    def open(self, bus):
+        self._bus = bus
+        self._bus_stats = self._sim.bus_stats("i2c{}".format(bus))
+
+    def close(self):
+        self._bus = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _device(self, address):
+        if self._bus is None:
+            raise OSError(9, "Bad file descriptor")
+        found = self._sim.i2c_device(self._bus, address)
+        if found is None:
+            raise OSError(121, "Remote I/O error")       # No ACK from the address.
+        return found
+
+    def _transaction(self, address, write=None, read=0):
+        """A write message, a read message, or a write followed by a repeated start and a read message."""
+        device, stats = self._device(address)
+        bits = 2                                             # Start and stop.
+        if write is not None:
+            bits += 9 * (1 + len(write))
+        if read:
+            bits += 9 * (1 + read) + (1 if write is not None else 0)
+        busy = self._sim.i2c_overhead + bits / self._sim.i2c_speed
+        nbytes = (len(write) if write is not None else 0) + read
+        stats.add(nbytes, busy)
+        self._bus_stats.add(nbytes, busy)
+        if write is not None:
+            device.write(write)
+        out = device.read(read) if read else None
+        self._sim.clock.advance(busy)
+        return out
+
+    def write_quick(self, i2c_addr, force=None):
+        self._transaction(i2c_addr, write=[])
+
+    def read_byte(self, i2c_addr, force=None):
+        return self._transaction(i2c_addr, read=1)[0]
+
+    def write_byte(self, i2c_addr, value, force=None):
+        self._transaction(i2c_addr, write=[value & 0xFF])
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        return self._transaction(i2c_addr, write=[register], read=1)[0]
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self._transaction(i2c_addr, write=[register, value & 0xFF])
+
+    def read_word_data(self, i2c_addr, register, force=None):
+        lo, hi = self._transaction(i2c_addr, write=[register], read=2)
+        return lo | (hi << 8)
+
+    def write_word_data(self, i2c_addr, register, value, force=None):
+        self._transaction(i2c_addr, write=[register, value & 0xFF, (value >> 8) & 0xFF])
+
+    def read_i2c_block_data(self, i2c_addr, register, length=32, force=None):
+        return self._transaction(i2c_addr, write=[register], read=length)
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        self._transaction(i2c_addr, write=[register] + list(data))
+
+    def i2c_rdwr(self, *i2c_msgs):
+        """Messages as made by smbus2.i2c_msg.write() and i2c_msg.read()."""
+        for msg in i2c_msgs:
+            if msg.flags & 0x0001:                           # I2C_M_RD
+                data = self._transaction(msg.addr, read=msg.len)
+                for i, value in enumerate(data):
+                    msg.buf[i] = bytes([value])
+            else:
+                self._transaction(msg.addr, write=list(msg))
+
+
+class Simulator(object):
+    """A simulated bench: clock, GPIO pins, and devices on the SPI and I2C buses."""
+
+    def __init__(self, clock=None, spi_overhead=15e-6, i2c_overhead=50e-6, i2c_speed=100000., gpio_time=1e-6):
+        """Input:
+         * clock        = a SimClock, default a virtual clock starting at 0.
+         * spi_overhead = time of one spidev transfer call apart from the bits, in seconds.
+         * i2c_overhead = time of one smbus call apart from the bits, in seconds.
+         * i2c_speed    = I2C clock frequency in Hz.
+         * gpio_time    = time of one GPIO.output() or GPIO.input() call, in seconds."""
+        self.clock = clock if clock is not None else SimClock()
+        self.spi_overhead = spi_overhead
+        self.i2c_overhead = i2c_overhead
+        self.i2c_speed = i2c_speed
+        self.gpio = SimGPIO(self.clock, gpio_time)
+        self.spidev = types.SimpleNamespace(SpiDev=functools.partial(SimSpiDev, self))
+        self.smbus = types.SimpleNamespace(SMBus=functools.partial(SimSMBus, self))
+        self._spi = {}
+        self._i2c = {}
+        self._stats = {"gpio": self.gpio.stats}
+
+    @classmethod
+    def default(cls, **kwargs):
+        """A Simulator with the devices at the places where the examples in DevLib expect them:
+        MCP3208 on SPI 0 CE0, MAX7219 on SPI 0 CE1, and on I2C bus 1 an ADS1115 at 0x48,
+        an MCP4725 at 0x62, a DS3231 at 0x68 and a BME280 at 0x76."""
+        from DevLib.backends import devices
+        sim = cls(**kwargs)
+        sim.attach_spi(0, 0, devices.MCP3208Model())
+        sim.attach_spi(0, 1, devices.MAX7219Model())
+        sim.attach_i2c(1, 0x48, devices.ADS1115Model())
+        sim.attach_i2c(1, 0x62, devices.MCP4725Model())
+        sim.attach_i2c(1, 0x68, devices.DS3231Model())
+        sim.attach_i2c(1, 0x76, devices.BME280Model())
+        return sim
+
+    def attach_spi(self, bus, cs, device):
+        """Connect device to SPI bus with chip select cs. Returns the device."""
+        device.clock = self.clock
+        self._spi[(bus, cs)] = (device, self.bus_stats("spi{}.{}".format(bus, cs)))
+        return device
+
+    def attach_gpio_spi(self, device, cs, clk, mosi=None, miso=None, mode=0):
+        """Connect device to GPIO pins, for a driver that bit-bangs the SPI protocol. Returns the device."""
+        device.clock = self.clock
+        GPIOSpi(self.gpio, device, cs, clk, mosi, miso, mode)
+        return device
+
+    def attach_gpio(self, device, **pins):
+        """Connect device to GPIO pins with device.connect(gpio, **pins). Returns the device."""
+        device.clock = self.clock
+        device.connect(self.gpio, **pins)
+        return device
+
+    def attach_i2c(self, bus, address, device):
+        """Connect device to I2C bus at address. Returns the device."""
+        device.clock = self.clock
+        self._i2c[(bus, address)] = (device, self.bus_stats("i2c{}:0x{:02x}".format(bus, address)))
+        return device
+
+    def detach_spi(self, bus, cs):
+        self._spi.pop((bus, cs), None)
+
+    def detach_i2c(self, bus, address):
+        self._i2c.pop((bus, address), None)
+
+    def spi_device(self, bus, cs):
+        """Return (device, stats) for bus and cs. Nothing connected gives a device that returns zeros."""
+        if (bus, cs) not in self._spi:
+            self.attach_spi(bus, cs, _NoDevice())
+        return self._spi[(bus, cs)]
+
+    def i2c_device(self, bus, address):
+        """Return (device, stats) for bus and address, or None."""
+        return self._i2c.get((bus, address))
+
+    def devices(self):
+        """Return a dict with the attached devices, by name of the bus and address."""
+        out = {"spi{}.{}".format(*key): dev for key, (dev, stats) in self._spi.items()}
+        out.update({"i2c{}:0x{:02x}".format(*key): dev for key, (dev, stats) in self._i2c.items()})
+        return out
+
+    def bus_stats(self, name):
+        """Return the BusStats for name, creating it if needed."""
+        if name not in self._stats:
+            self._stats[name] = BusStats()
+        return self._stats[name]
+
+    def stats(self):
+        """Return a dict with the transactions, bytes and bus time for every bus and device that was used."""
+        return {name: s.as_dict() for name, s in self._stats.items() if s.transactions}
+
+    def reset_stats(self):
+        for s in self._stats.values():
+            s.reset()
@@ -0,0 +1,156 @@
+#
+# This module is shared by the plotting scripts in this directory to read csv files, such as
+# the ones saved by the Analog Discovery (WaveForms) or by partsim.
+#
+# These files start with some lines of comments (starting with #), followed by a line with the
+# column names (headers), sometimes a line with units, and then the numeric data, one row per line.
+#
+# Reading such a file with the csv module and converting every number with float() is slow for
+# large files. Instead, the numbers are parsed by numpy, a few MB at a time, straight into a 2D array.
+# The data are also saved in a .npy file next to the csv file, so opening the same file again
+# is almost instant. The .npy file is given the same modification time as the csv file, so if the
+# csv file changes, the .npy file is no longer used and is re-created.
+#
+# Usage:
+#   from CSV_Loader import load_csv
+#   dat = load_csv("low_pass_filter.csv")
+#   print(dat.headers, dat.units)
+#   plt.plot(dat[0], dat["vm(vout)"])
+#
+import io
+import os
+import numpy as np
+
+Chunk_Size = 1 << 24  # Number of bytes to parse at once.
+
+
+class CSVData:
+    """The contents of a csv file.
+    The attributes are:
+     * filename = the name of the file.
+     * comments = list of the comment lines at the top of the file, without the #.
+     * headers  = list of the column names.
+     * units    = list of the units of the columns, or None if the file has no units line.
+     * data     = 2D numpy array with shape (rows, columns).
+    dat[i] or dat["name"] returns the column i or the column with header "name"."""
+
+    def __init__(self, filename, comments, headers, units, data):
+        self.filename = filename
+        self.comments = comments
+        self.headers = headers
+        self.units = units
+        self.data = data
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, col):
+        if isinstance(col, str):
+            col = self.headers.index(col)
+        return self.data[:, col]
+
+    @property
+    def columns(self):
+        """List of all the columns as 1D arrays."""
+        return [self.data[:, i] for i in range(self.data.shape[1])]
+
+
+def _is_numeric(fields):
+    """Return True if all the fields of a line are numbers."""
+    try:
+        for x in fields:
+            float(x)
+    except ValueError:
+        return False
+    return len(fields) > 0
+
+
+def _split(line):
+    """Split a line of the file into its fields."""
+    return [x.strip().strip('"') for x in line.decode("latin-1").strip().split(",")]
+
+
+def read_header(f):
+    """Read the comments, headers and units from the open (binary) file f, and leave the file
+    positioned at the start of the numeric data.
+    Returns (comments, headers, units, first_data_line)"""
+    comments = []
+    labels = []
+    while True:
+        line = f.readline()
+        if not line:
+            return comments, labels[0] if labels else [], labels[1] if len(labels) > 1 else None, b""
+        text = line.strip()
+        if len(text) == 0:
+            continue
+        if text.startswith(b"#"):
+            comments.append(text[1:].decode("latin-1").strip())
+            continue
+        fields = _split(text)
+        if _is_numeric(fields):
+            return comments, labels[0] if labels else [], labels[1] if len(labels) > 1 else None, line
+        labels.append(fields)
+
+
+def _parse_block(text, ncol):
+    """Parse a block of lines of comma separated numbers into an array with ncol columns."""
+    try:
+        values = np.fromstring(text.strip().replace("\r", "").replace("\n", ","), sep=",")
+        if values.size % ncol == 0:
+            return values.reshape(-1, ncol)
+    except ValueError:
+        pass
+    # Empty fields, comments or other oddities: let genfromtxt sort it out, with nan for missing values.
+    return np.genfromtxt(io.StringIO(text), delimiter=",", comments="#", ndmin=2)
+
+
+def read_data(f, first_line, chunk_size=None):
+    """Read the numeric data from the open (binary) file f, starting with first_line."""
+    if chunk_size is None:
+        chunk_size = Chunk_Size
+    ncol = len(_split(first_line))
+    blocks = []
+    chunk = first_line
+    while True:
+        more = f.read(chunk_size)
+        if more:
+            chunk += more + f.readline()  # Complete the last line.
+        if chunk.strip():
+            blocks.append(_parse_block(chunk.decode("latin-1"), ncol))
+        if not more:
+            break
+        chunk = b""
+    if not blocks:
+        return np.zeros((0, ncol))
+    return np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+
+
+def _cache_name(filename):
+    """Name of the .npy file with the cached data for filename."""
+    return filename + ".npy"
+
+
+def load_csv(filename, cache=True):
+    """Load the csv file filename and return a CSVData object.
+    If cache is True, the data is saved to, or loaded from, a .npy file next to the csv file."""
+    stat = os.stat(filename)
+    cache_file = _cache_name(filename)
+    with open(filename, "rb") as f:
+        comments, headers, units, first_line = read_header(f)
+        data = None
+        if cache:
+            try:
+                if os.stat(cache_file).st_mtime_ns == stat.st_mtime_ns:
+                    data = np.load(cache_file)
+            except (OSError, ValueError):
+                data = None
+        if data is None:
+            data = read_data(f, first_line)
+            if cache:
+                try:
+                    with open(cache_file, "wb") as cf:
+                        np.save(cf, data)
+                    os.utime(cache_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                except OSError:
+                    pass            # Read only directory, just don't cache.
+    return CSVData(filename, comments, headers, units, data)
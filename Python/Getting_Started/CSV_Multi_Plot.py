@@ -4,73 +4,84 @@
 # csv files that are given on the command line, and plot the data found
 # in the files in a single plot.
 #
+# When there are many (large) files:
+#  * The files are read in parallel, by a pool of processes (-j option).
+#  * Traces with more points than --max-points are reduced with min/max decimation before plotting,
+#    which keeps the peaks of the signal visible, but draws far fewer points.
+#  * With --batch, no window is opened. The combined plot and one plot per file are written as
+#    PDF files to --outdir, which is useful to make plots for many files on the RPi over ssh.
+#
 import sys
 import argparse
 #
+import os
 import os.path as path
-import csv
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np   # This gives numpy the shorthand np
 import matplotlib.pyplot as plt
+from CSV_Loader import load_csv
 #
 #
 
-def main(argv=None):
-    ''' This is the main program that runs, but it is also callable from the python
-    command line if you import this file into python. '''
-
-    # Parse the connand line arguments.
-    if argv is None:
-        argv = sys.argv[1:]  # First item in sys.argv is progname
-
-    parser = argparse.ArgumentParser(description='A program to plot CSV files from the Analog Discovery.')
-    parser.add_argument('-b','--bode',action='store_true',help='Make bode plots, log x')
-    parser.add_argument('-s','--signal',action='store_true',help='Make signal plots, lin x')
-
-    parser.add_argument('files',type=str, nargs='+', help='input files')
-
-    args = parser.parse_args(argv)
-
-    if args.bode == False and args.signal == False:
-        print "Please supply either --bode or --signal option"
-        return
-
-    p_data = []
-    for f in args.files:
-        dirname,filename = path.split(f)
-        basename, ext    = path.splitext(filename)
-        if ext.lower() != '.csv':
-            print "File {} does not appear to be a CSV file. Skipped.".format(filename)
-            continue
-
-        infile = open(f)
-        #
-        # Pass the file to the csv parser
-        #
-        data = csv.reader(infile)
-        line = data.next()
-        while len(line) == 0 or line[0][0]=='#':   # Skip comments and empty lines.
-            line = data.next()
-        headers = data.next()
-
-        dat = np.array([ [float(z) for z in x] for x in data ]) # put the data in dat as floats.
-        p_data.append( (basename,dat))
-
-    #
-    # Now plot the data. plt.plot returns a tuple (plot, )
-    #
-    plt.figure(figsize=(10,7))
+def read_file(f):
+    ''' Load the file, skipping comments and headers, with the numbers in a 2D array.
+    This runs in the worker processes, so it only returns the array.'''
+    return load_csv(f).data
+
+def read_files(files,jobs=None):
+    ''' Read all the files, in parallel if there is more than one file and jobs is not 1.
+    Returns a list of the data arrays, in the same order as files. '''
+    if jobs == 1 or len(files) < 2:
+        return [read_file(f) for f in files]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(read_file,files))
+
+def fix_phase(ph,unwrap=False):
+    ''' Fix the phase so the crossing plots better. Without unwrap, positive phases are moved down
+    by 360 degrees. With unwrap, all the jumps of more than 180 degrees are removed. '''
+    if unwrap:
+        return np.unwrap(ph,period=360.)
+    return np.where(ph>0,ph-360.,ph)
+
+def minmax_decimate(x,y,max_points):
+    ''' Reduce the trace x,y to at most about max_points points, by splitting it into max_points/2
+    bins and keeping the minimum and the maximum point of each bin, in the order they occur. '''
+    n = len(y)
+    if max_points is None or max_points <= 0 or n <= max_points:
+        return x,y
+    n_bins = max(1,max_points//2)
+    size = n//n_bins
+    m = n_bins*size
+    yb = y[:m].reshape(n_bins,size)
+    i_min = yb.argmin(axis=1)
+    i_max = yb.argmax(axis=1)
+    first = np.minimum(i_min,i_max)
+    last = np.maximum(i_min,i_max)
+    offset = np.arange(n_bins)*size
+    idx = np.empty(2*n_bins,dtype=np.intp)
+    idx[0::2] = offset+first
+    idx[1::2] = offset+last
+    if m < n:   # The left over points at the end.
+        idx = np.concatenate((idx,np.arange(m,n)))
+    return x[idx],y[idx]
+
+def label_for(name):
+    ''' Make the legend label from the file name. WaveForms names are like Bode_Amp_100k.csv '''
+    parts = name.split('_')
+    return parts[2] if len(parts) > 2 else name
+
+def make_plot(p_data,args):
+    ''' Make a figure with the data in p_data, a list of (name,dat) pairs, and return the figure. '''
+    fig = plt.figure(figsize=(10,7))
     plots = []
     for name,dat in p_data:
-        x_ar = [float(x[0]) for x in dat ]        # Selects 1st data column
-        lab = name.split('_')[2]
+        x_ar = dat[:,0]                           # Selects 1st data column
+        lab = label_for(name)
         if args.bode:
-            y_ar = [float(x[2]) for x in dat ]    # Select 3rd data column
-            ph_ar = [float(x[3]) for x in dat ]
-            for i in range(len(ph_ar)):
-                if ph_ar[i]>0:
-                    ph_ar[i]=ph_ar[i]-360.        # Fix the phase so the crossimg plots better.
+            y_ar = dat[:,2]                       # Select 3rd data column
+            ph_ar = fix_phase(dat[:,3],args.unwrap)
             plt.subplot(2,1,1)
-            (p1,) = plt.plot(x_ar,y_ar,label=lab)
+            (p1,) = plt.plot(*minmax_decimate(x_ar,y_ar,args.max_points),label=lab)
             plt.title('Bode Plot of Transistor Amplifier')
             plt.xlabel('F[Hz]',position=(0.9,1))
             plt.ylabel('Magnitude [dB]')
@@ -78,7 +89,7 @@ def main(argv=None):
             plt.grid(True)
 
             plt.subplot(2,1,2)
-            (p2,) = plt.plot(x_ar,ph_ar,label=lab)
+            (p2,) = plt.plot(*minmax_decimate(x_ar,ph_ar,args.max_points),label=lab)
             plt.title('Phase Plot of Transistor Amplifier')
             plt.xlabel('F[Hz]',position=(0.9,1))
             plt.ylabel('Phase [degrees]')
@@ -88,8 +99,8 @@ def main(argv=None):
             plots.append(p1)
 
         if args.signal:
-            y_ar = [float(x[1]) for x in dat ]
-            (p1,) = plt.plot(x_ar,y_ar,label=lab)
+            y_ar = dat[:,1]
+            (p1,) = plt.plot(*minmax_decimate(x_ar,y_ar,args.max_points),label=lab)
             plt.title('Output Signal of Transistor Amplifier')
             plt.xlabel('Time[S]',position=(0.9,1))
             plt.ylabel('Signal [V]')
@@ -105,9 +116,67 @@ def main(argv=None):
         plt.legend(handles=plots)        # make sure the legend is drawn
     else:
         plt.legend(handles=plots)
+    return fig
 
-    plt.savefig("csv_plot.pdf",orientation='landscape')
-    plt.show()                         # show the plot.
+def main(argv=None):
+    ''' This is the main program that runs, but it is also callable from the python
+    command line if you import this file into python. '''
+
+    # Parse the connand line arguments.
+    if argv is None:
+        argv = sys.argv[1:]  # First item in sys.argv is progname
+
+    parser = argparse.ArgumentParser(description='A program to plot CSV files from the Analog Discovery.')
+    parser.add_argument('-b','--bode',action='store_true',help='Make bode plots, log x')
+    parser.add_argument('-s','--signal',action='store_true',help='Make signal plots, lin x')
+    parser.add_argument('-u','--unwrap',action='store_true',help='Unwrap the phase of bode plots')
+    parser.add_argument('-j','--jobs',type=int,default=None,help='Number of processes to read the files, default=all cores')
+    parser.add_argument('-m','--max-points',type=int,default=4000,
+                        help='Decimate traces to about this many points, 0 to plot all points')
+    parser.add_argument('--batch',action='store_true',help='Do not show the plots, only write PDF files, one per input file')
+    parser.add_argument('-o','--output',type=str,default='csv_plot.pdf',help='Output file for the combined plot')
+    parser.add_argument('--outdir',type=str,default='.',help='Directory for the PDF files')
+
+    parser.add_argument('files',type=str, nargs='+', help='input files')
+
+    args = parser.parse_args(argv)
+
+    if args.bode == False and args.signal == False:
+        print("Please supply either --bode or --signal option")
+        return
+
+    if args.batch:
+        plt.switch_backend('Agg')     # No windows, only files.
+
+    files = []
+    names = []
+    for f in args.files:
+        dirname,filename = path.split(f)
+        basename, ext    = path.splitext(filename)
+        if ext.lower() != '.csv':
+            print("File {} does not appear to be a CSV file. Skipped.".format(filename))
+            continue
+        files.append(f)
+        names.append(basename)
+
+    p_data = list(zip(names,read_files(files,args.jobs)))
+
+    #
+    # Now plot the data. plt.plot returns a tuple (plot, )
+    #
+    if args.batch:
+        os.makedirs(args.outdir,exist_ok=True)
+        for name,dat in p_data:
+            fig = make_plot([(name,dat)],args)
+            fig.savefig(path.join(args.outdir,name+'.pdf'),orientation='landscape')
+            plt.close(fig)
+
+    fig = make_plot(p_data,args)
+    fig.savefig(path.join(args.outdir,args.output),orientation='landscape')
+    if args.batch:
+        plt.close(fig)
+    else:
+        plt.show()                         # show the plot.
 
 if __name__ == "__main__":  # This makes sure that main() is called when you
                             # run the script from the command line.
@@ -4,35 +4,24 @@
 # The data file is the saved curve from partsim.com of the low pass filter.
 # It was saved as xls file and then opened in Excel and exported to csv
 #
-# First import the csv parser, the numeric tools and plotting tools
-import csv
+# First import the csv loader, the numeric tools and plotting tools
+from CSV_Loader import load_csv   # The csv loader shared by the scripts in this directory.
 import numpy as np   # This gives numpy the shorthand np
 import matplotlib.pyplot as plt
 #
-# Open the file
+# Load the file. The loader reads the headers and units from the top of the file,
+# and puts the numbers in a 2D numpy array, dat.data, with one column for each header.
 #
-f = open("low_pass_filter.csv")
+dat = load_csv("low_pass_filter.csv")
+headers = dat.headers
+units = dat.units
 #
-# Pass the file to the csv parser
+# Each column is a numpy array. You can select them by number or by header name.
+# This is the same as dat.data[:,0], dat.data[:,1] and dat.data[:,2]
 #
-data = csv.reader(f)
-headers = data.next()
-units = data.next()
-#
-# Here is a "wicked" way in Python that does quicker what the
-# the more verbose code does below. It is "Matlab" like.
-# dat = np.array([ [float(z) for z in x] for x in data ]) # put the data in dat as floats.
-# x_ar  = dat[:,0]   # select the first column
-# y1_ar = dat[:,1]   # select the second column
-# y2_ar = dat[:,2]   # select the third column
-
-x_ar = [] # Create a new list (array) called dat to hold the data.
-y1_ar = []
-y2_ar = []
-for (x,y1,y2) in data:  # Unpack the csv data into x,y1,y2 variables.
-    x_ar.append( float(x))
-    y1_ar.append(float(y1))
-    y2_ar.append(float(y2)) # Convert the variable from string to float and add to dat
+x_ar = dat[0]    # select the first column
+y1_ar = dat[1]   # select the second column
+y2_ar = dat[2]   # select the third column
 
 #
 # Now plot the data. plt.plot returns a tuple (plot, )
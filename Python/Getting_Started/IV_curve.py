@@ -1,18 +1,15 @@
 # This Python script will take the I-V data from the partsim simulation and
 # create the I-V plot from it.
 #
-import numpy as np
 import matplotlib.pyplot as plt
-import csv
+from CSV_Loader import load_csv
 #
-f=open("Forward_biased_diode.csv")
-data = csv.reader(f)
-headers = data.next()
-units = data.next()
-dat = np.array([ [float(z) for z in x] for x in data ]) # put the data in dat as floats.
-x_ar  = dat[:,0]   # select the first column
-y1_ar = 1000*dat[:,1]   # select the second column
-y2_ar = dat[:,2]   # select the third column
+dat = load_csv("Forward_biased_diode.csv")
+headers = dat.headers
+units = dat.units
+x_ar  = dat[0]   # select the first column
+y1_ar = 1000*dat[1]   # select the second column
+y2_ar = dat[2]   # select the third column
 
 plt.plot(y2_ar,y1_ar)
 ax = plt.gca()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+#
+# Performance benchmark of the DevLib drivers, on the simulated buses of DevLib/backends/sim.py.
+#
+# Author: Maurik Holtrop
+#
+# Each case opens a driver on a fresh simulator, with a model of the chip attached, and repeats one logical
+# operation (read one ADC sample, show one frame on an LED strip, print one number on the LCD, ...).
+# For each case this reports:
+#  * ops/s          - operations per second of wall time on this computer. This is the Python cost of the
+#                     driver (plus the simulator), and the number to watch for regressions in the driver code.
+#  * bus ops/s      - operations per second of simulated bus time, i.e. what the bus traffic of the driver
+#                     would allow on the Raspberry Pi with the bus timing of the simulator.
+#  * p50/p99        - latency percentiles of one operation, wall time, and simulated bus time.
+#  * transactions   - GPIO calls, SPI transfers and I2C transactions per operation, for each bus and device.
+#                     These are deterministic, so any change is a real change in the driver.
+#  * allocations    - bytes allocated by Python (tracemalloc) per operation that are still held after it
+#                     (net), and the peak of the temporary allocations, in a separate run.
+# Note that drivers that wait with time.sleep() for the hardware (ADS1115) also wait here.
+#
+# The results can be written to a JSON file, and compared with an earlier file to find regressions:
+#
+# Usage:   python3 devlib_drivers.py --json results.json
+#          python3 devlib_drivers.py --compare results.json --tolerance 0.25
+#          python3 devlib_drivers.py --cases mcp320x_spi bme280 --scale 2
+#
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+PYTHON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, PYTHON_DIR)
+
+from DevLib import backends                                      # noqa: E402
+from DevLib.backends.sim import Simulator                        # noqa: E402
+from DevLib.backends import devices                              # noqa: E402
+
+
+# Each case: setup(sim) returns (op, check), where op(i) does one operation, and check() returns None, or a
+# string describing what went wrong. The number is the default number of operations.
+
+def case_mcp320x_spi(sim):
+    from DevLib import MCP320x
+    sim.attach_spi(0, 0, devices.MCP3208Model())
+    adc = MCP320x(0)
+    return lambda i: adc.read_adc(i & 7), None
+
+
+def case_mcp320x_scan_map(sim):
+    from DevLib import MCP320x
+    sim.attach_spi(0, 0, devices.MCP3208Model())
+    adc = MCP320x(0, channel_map=[0, 1, (2, 3), (4, 5), 6, 7])
+    return lambda i: adc.scan_map(), None
+
+
+def case_mcp320x_bitbang(sim):
+    from DevLib import MCP320x
+    sim.attach_gpio_spi(devices.MCP3208Model(), cs=8, clk=11, mosi=10, miso=9)
+    adc = MCP320x(8, 11, 10, 9)
+    return lambda i: adc.read_adc(i & 7), None
+
+
+def case_ads1115(sim):
+    from DevLib import ADS1115
+    sim.attach_i2c(1, 0x48, devices.ADS1115Model())
+    adc = ADS1115()
+    adc.set_rate(860)
+    return lambda i: adc.read_adc(i & 3), None
+
+
+def case_bme280(sim):
+    from DevLib import BME280
+    model = sim.attach_i2c(1, 0x76, devices.BME280Model(temperature=21.5))
+    bme = BME280()
+    bme.set_oversampling((1, 1, 1))
+    result = []
+
+    def op(i):
+        result[:] = bme.read_data()
+
+    def check():
+        if model.measurements == 0 or abs(result[0] - 21.5) > 0.01:
+            return "temperature {} does not match the model, 21.5".format(result[0] if result else None)
+    return op, check
+
+
+def case_apa102_show(sim):
+    from DevLib import APA102
+    model = sim.attach_spi(0, 0, devices.APA102Model())
+    strip = APA102(60)
+
+    def op(i):
+        strip[i % 60] = (31 << 24) | (i & 0xFFFFFF)
+        strip.show()
+
+    def check():
+        if len(model.leds) != 60 or model.frames == 0:
+            return "the strip model received {} LEDs".format(len(model.leds))
+    return op, check
+
+
+def case_max7219_write_int(sim):
+    from DevLib import MAX7219
+    model = sim.attach_spi(0, 0, devices.MAX7219Model())
+    display = MAX7219(0, 1000000, 0)
+    last = []
+
+    def op(i):
+        last[:] = [i * 7919 % 100000000]
+        display.write_int(last[0])
+
+    def check():
+        shown = int("".join(str(d & 0x0F) if d & 0x0F < 10 else "" for d in reversed(model.digits())))
+        if shown != last[0]:
+            return "display shows {}, expected {}".format(shown, last[0])
+    return op, check
+
+
+def case_charlcd_print(sim):
+    from DevLib import CharLCD
+    model = sim.attach_i2c(1, 0x27, devices.HD44780Model())
+    lcd = CharLCD(0x27, 1)
+    last = []
+
+    def op(i):
+        last[:] = [i % 4, "{:8d}".format(i * 7919)]
+        lcd.print(last[1], line=last[0], pos=4)
+
+    def check():
+        shown = model.lines()[last[0]][4:12]
+        if shown != last[1]:
+            return "LCD shows {!r}, expected {!r}".format(shown, last[1])
+    return op, check
+
+
+def case_sn74hc165_bitbang(sim):
+    from DevLib import SN74HC165
+    model = sim.attach_gpio(devices.SN74HC165Model(32), load=20, clk=19, data=18)
+    shifter = SN74HC165(18, 19, 20, 32)
+    errors = []
+
+    def op(i):
+        shifter.load_shifter()
+        if shifter.read_data() != model.loaded:
+            errors.append(i)
+    return op, lambda: "{} wrong reads".format(len(errors)) if errors else None
+
+
+def case_sn74hc165_spi(sim):
+    from DevLib import SN74HC165
+    model = sim.attach_spi(0, 0, devices.SN74HC165Model(32))
+    sim.attach_gpio(model, load=20)
+    shifter = SN74HC165.spi(20, 32)
+    errors = []
+
+    def op(i):
+        shifter.load_shifter()
+        if shifter.read_data() != model.loaded:
+            errors.append(i)
+    return op, lambda: "{} wrong reads".format(len(errors)) if errors else None
+
+
+def case_bbspidev_transfer(sim):
+    from DevLib import BBSpiDev
+    model = sim.attach_gpio_spi(devices.MCP3208Model(inputs={0: 1.0}), cs=8, clk=11, mosi=10, miso=9)
+    spi = BBSpiDev(8, 11, 10, 9)
+    result = []
+
+    def op(i):
+        result[:] = spi.transfer([0x06, 0x00, 0x00], xfer_mode=2)
+
+    def check():
+        code = ((result[1] & 0x0F) << 8) | result[2]
+        if code != int(1.0 / model.vref * 4096):
+            return "read {}, expected {}".format(code, int(1.0 / model.vref * 4096))
+    return op, check
+
+
+CASES = {
+    "mcp320x_spi": (case_mcp320x_spi, 20000),
+    "mcp320x_scan_map": (case_mcp320x_scan_map, 5000),
+    "mcp320x_bitbang": (case_mcp320x_bitbang, 2000),
+    "ads1115": (case_ads1115, 200),
+    "bme280": (case_bme280, 2000),
+    "apa102_show": (case_apa102_show, 1000),
+    "max7219_write_int": (case_max7219_write_int, 5000),
+    "charlcd_print": (case_charlcd_print, 2000),
+    "sn74hc165_bitbang": (case_sn74hc165_bitbang, 2000),
+    "sn74hc165_spi": (case_sn74hc165_spi, 20000),
+    "bbspidev_transfer": (case_bbspidev_transfer, 2000),
+}
+
+
+def run_case(setup, n_ops):
+    """Run one case, and return a dict with the results."""
+    sim = Simulator()
+    backends.set_simulator(sim)
+    op, check = setup(sim)
+    for i in range(max(1, n_ops // 10)):              # Warm up.
+        op(i)
+
+    clock = sim.clock
+    sim.reset_stats()
+    wall = np.empty(n_ops)
+    bus = np.empty(n_ops)
+    perf = time.perf_counter
+    sim_start = clock.time()
+    start = perf()
+    for i in range(n_ops):
+        t0 = perf()
+        s0 = clock.time()
+        op(i)
+        wall[i] = perf() - t0
+        bus[i] = clock.time() - s0
+    elapsed = perf() - start
+    sim_elapsed = clock.time() - sim_start
+    stats = sim.stats()
+
+    # Separate run for the allocations, since tracemalloc slows everything down.
+    n_alloc = min(n_ops, 500)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for i in range(n_alloc):
+        op(i)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    error = check() if check is not None else None
+    return {
+        "ops": n_ops,
+        "wall_s": elapsed,
+        "ops_per_s": n_ops / elapsed,
+        "bus_ops_per_s": n_ops / sim_elapsed if sim_elapsed > 0 else None,
+        "latency_us": {"p50": float(np.percentile(wall, 50) * 1e6), "p99": float(np.percentile(wall, 99) * 1e6)},
+        "bus_us": {"p50": float(np.percentile(bus, 50) * 1e6), "p99": float(np.percentile(bus, 99) * 1e6)},
+        "transactions_per_op": {name: s["transactions"] / n_ops for name, s in stats.items()},
+        "bytes_per_op": {name: s["bytes"] / n_ops for name, s in stats.items()},
+        "alloc_net_bytes_per_op": (current - before) / n_alloc,
+        "alloc_peak_bytes": peak - before,
+        "error": error,
+    }
+
+
+def bus_total(result):
+    """Transactions per operation on all the buses together (not counting the per device entries)."""
+    return sum(v for name, v in result["transactions_per_op"].items() if "." not in name and ":" not in name)
+
+
+def version():
+    """The git version of the code, if it is a git checkout."""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=PYTHON_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print the changes with respect to baseline. Returns the number of regressions: a case that is slower
+    by more than tolerance (fraction), or that needs more bus transactions per operation."""
+    print("\nCompared to {} ({}):".format(baseline.get("version"), baseline.get("timestamp")))
+    print("{:20s} {:>10s} {:>14s}  {}".format("case", "ops/s", "transactions", ""))
+    regressions = 0
+    for name, new in results.items():
+        old = baseline["cases"].get(name)
+        if old is None:
+            continue
+        speed = new["ops_per_s"] / old["ops_per_s"]
+        more = bus_total(new) - bus_total(old)
+        bad = speed < 1 - tolerance or more > 1e-9
+        regressions += bad
+        print("{:20s} {:9.2f}x {:+14.2f}  {}".format(name, speed, more, "REGRESSION" if bad else ""))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the DevLib drivers on simulated buses.")
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES), help='Cases to run.')
+    parser.add_argument('--scale', type=float, default=1., help='Multiply the number of operations by this.')
+    parser.add_argument('--json', help='Write the results to this JSON file ("-" for stdout).')
+    parser.add_argument('--compare', help='Compare with the results in this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slow down for --compare.')
+    args = parser.parse_args(argv)
+
+    backends.use("sim")
+    results = {}
+    for name in args.cases:
+        setup, n_ops = CASES[name]
+        results[name] = run_case(setup, max(1, int(n_ops * args.scale)))
+
+    print("{:20s} {:>7s} {:>11s} {:>11s} {:>9s} {:>9s} {:>9s} {:>9s} {:>8s}".format(
+        "case", "ops", "ops/s", "bus ops/s", "p50 [us]", "p99 [us]", "bus [us]", "trans/op", "B/op"))
+    for name, r in results.items():
+        print("{:20s} {:7d} {:11.4g} {:11.4g} {:9.1f} {:9.1f} {:9.1f} {:9.1f} {:8.1f}{}".format(
+            name, r["ops"], r["ops_per_s"], r["bus_ops_per_s"] or 0., r["latency_us"]["p50"],
+            r["latency_us"]["p99"], r["bus_us"]["p50"], bus_total(r), r["alloc_net_bytes_per_op"],
+            "  ERROR: " + r["error"] if r["error"] else ""))
+
+    output = {
+        "benchmark": "devlib_drivers",
+        "version": version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cases": results,
+    }
+    if args.json == "-":
+        json.dump(output, sys.stdout, indent=1)
+        print()
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(output, f, indent=1)
+
+    failed = sum(r["error"] is not None for r in results.values())
+    if args.compare:
+        with open(args.compare) as f:
+            failed += compare(results, json.load(f), args.tolerance)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#
+# Start-up time of a short script that uses one DevLib driver, with the lazy DevLib/__init__.py,
+# compared to loading all the drivers, which is what the old __init__.py did on "import DevLib".
+#
+# Author: Maurik Holtrop
+#
+# Each case is run as a fresh python process, as a cron job would, and the wall time of the whole
+# process is measured. The time of an empty python process is shown for reference.
+# Off the Raspberry Pi, the hardware libraries (RPi.GPIO, smbus, spidev) are not installed. Empty
+# stand-in modules are then written to a temporary directory, so that the drivers can be imported.
+#
+# Usage:   python3 devlib_import.py --runs 20
+#
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+STUBS = {
+    "RPi/__init__.py": "",
+    "RPi/GPIO.py": "BCM, BOARD, OUT, IN, HIGH, LOW = 11, 10, 0, 1, 1, 0\n"
+                   "def setmode(mode): pass\n"
+                   "def getmode(): return 11\n"
+                   "def setup(*args, **kwargs): pass\n"
+                   "def output(*args): pass\n"
+                   "def input(pin): return 0\n"
+                   "def cleanup(*args): pass\n",
+    "smbus.py": "class SMBus:\n    def __init__(self, *args): pass\n",
+    "spidev.py": "class SpiDev:\n    def __init__(self, *args): pass\n",
+}
+
+REPORT = "import sys, json; print(json.dumps([len(sys.modules), 'numpy' in sys.modules]))"
+
+CASES = [
+    ("python only", "pass"),
+    ("lazy: DS3231", "from DevLib import DS3231"),
+    ("lazy: MCP320x", "from DevLib import MCP320x"),
+    ("all drivers", "import DevLib\nfor name in DevLib._LAZY: getattr(DevLib, name)"),
+]
+
+
+def make_stubs(directory):
+    """Write stand-in modules for the hardware libraries that are not installed."""
+    for path, text in STUBS.items():
+        module = path.split("/")[0].replace(".py", "")
+        if importlib.util.find_spec(module) is not None:
+            continue
+        full = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w") as f:
+            f.write(text)
+
+
+def run_case(code, runs, env):
+    """Run code in a new python process runs times. Returns (median time, number of modules, numpy loaded)."""
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code + "\n" + REPORT], env=env, check=True,
+                             capture_output=True, text=True).stdout
+        times.append(time.perf_counter() - start)
+    n_modules, numpy = json.loads(out.strip().splitlines()[-1])
+    return statistics.median(times), n_modules, numpy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Start-up time of scripts that use DevLib.")
+    parser.add_argument('--runs', type=int, default=20, help='Number of runs of each case.')
+    args = parser.parse_args(argv)
+
+    python_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    with tempfile.TemporaryDirectory() as stubs:
+        make_stubs(stubs)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([python_dir, stubs] + ([env["PYTHONPATH"]] if "PYTHONPATH" in env else []))
+        results = [(name,) + run_case(code, args.runs, env) for name, code in CASES]
+
+    base = results[0][1]
+    print("Median wall time of a new python process, {} runs.".format(args.runs))
+    print("{:16s} {:>10s} {:>14s} {:>10s} {:>7s}".format("case", "time [ms]", "DevLib [ms]", "modules", "numpy"))
+    for name, t, n_modules, numpy in results:
+        print("{:16s} {:10.1f} {:14.1f} {:10d} {:>7s}".format(name, t * 1e3, (t - base) * 1e3, n_modules,
+                                                               "yes" if numpy else "no"))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
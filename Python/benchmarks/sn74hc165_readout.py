@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# Timing comparison of the SN74HC165 readout paths: bit-bang GPIO versus hardware SPI.
+#
+# Author: Maurik Holtrop
+#
+# This runs off the Raspberry Pi, on the simulated buses of DevLib/backends/sim.py, with an SN74HC165Model
+# chain on GPIO pins for the bit-bang readout, and on SPI 0 CE0 for the SPI readout. The simulator counts the
+# GPIO calls and SPI transfers, and its clock adds up their time on the Pi (--gpio-call-us, --spi-call-us and
+# the bits at --spi-speed). The Python time spent in the driver is measured. The estimate of the readout time
+# on the real system is this Python time plus the bus time. The Python time is that of this computer,
+# including the simulation, so on a slower Pi the bit-bang path, which makes the most Python calls, gains
+# the most from SPI.
+#
+# Usage:   python3 sn74hc165_readout.py --bits 32 --reads 2000
+#
+import argparse
+import os
+import sys
+import time
+
+PYTHON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, PYTHON_DIR)
+
+from DevLib import backends                                      # noqa: E402
+from DevLib.backends.sim import Simulator                        # noqa: E402
+from DevLib.backends import devices                              # noqa: E402
+
+
+def time_reads(sim, model, shifter, reads):
+    """Read the chain reads times, and check each value against the model. Returns the Python time and the
+    simulated bus time per read, and the transactions per read for each bus."""
+    sim.reset_stats()
+    clock = sim.clock
+    sim_start = clock.time()
+    start = time.perf_counter()
+    for i in range(reads):
+        shifter.load_shifter()
+        if shifter.read_data() != model.loaded:
+            raise RuntimeError("Readout error: the value read does not match the input.")
+    elapsed = time.perf_counter() - start
+    bus = clock.time() - sim_start
+    calls = {name: s["transactions"] / reads for name, s in sim.stats().items()}
+    return elapsed / reads, bus / reads, calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare SN74HC165 bit-bang and SPI readout on a simulated chain.")
+    parser.add_argument('--bits', type=int, default=32, help='Number of bits in the chain.')
+    parser.add_argument('--reads', type=int, default=2000, help='Number of reads to time.')
+    parser.add_argument('--gpio-call-us', type=float, default=1.0, help='Cost of one GPIO call on the Pi [us].')
+    parser.add_argument('--spi-call-us', type=float, default=30., help='Overhead of one SPI transfer on the Pi [us].')
+    parser.add_argument('--spi-speed', type=float, default=1e6, help='SPI clock speed [Hz].')
+    args = parser.parse_args(argv)
+
+    backends.use("sim")
+    from DevLib import SN74HC165
+
+    def simulator():
+        sim = Simulator(spi_overhead=args.spi_call_us * 1e-6, gpio_time=args.gpio_call_us * 1e-6)
+        backends.set_simulator(sim)
+        return sim
+
+    sim = simulator()
+    model = sim.attach_gpio(devices.SN74HC165Model(args.bits), load=20, clk=19, data=18)
+    bitbang = SN74HC165(18, 19, 20, args.bits)
+    t_bitbang, bus_bitbang, calls = time_reads(sim, model, bitbang, args.reads)
+    gpio_bitbang = calls.get("gpio", 0.)
+
+    sim = simulator()
+    model = sim.attach_spi(0, 0, devices.SN74HC165Model(args.bits))
+    sim.attach_gpio(model, load=20)
+    spi = SN74HC165.spi(20, args.bits, spi_speed=int(args.spi_speed))
+    t_spi, bus_spi, calls = time_reads(sim, model, spi, args.reads)
+    gpio_spi = calls.get("gpio", 0.)
+    spi_calls = calls.get("spi0", 0.)
+
+    # Model of the time on the Pi: Python time + simulated bus time.
+    model_bitbang = (t_bitbang + bus_bitbang) * 1e6
+    model_spi = (t_spi + bus_spi) * 1e6
+
+    print("SN74HC165 readout of {} bits, {} reads.".format(args.bits, args.reads))
+    print("{:10s} {:>12s} {:>12s} {:>12s} {:>16s}".format("path", "python [us]", "GPIO calls", "SPI calls",
+                                                          "model Pi [us]"))
+    print("{:10s} {:12.2f} {:12.1f} {:12.1f} {:16.1f}".format("bit-bang", t_bitbang * 1e6, gpio_bitbang, 0,
+                                                             model_bitbang))
+    print("{:10s} {:12.2f} {:12.1f} {:12.1f} {:16.1f}".format("spi", t_spi * 1e6, gpio_spi, spi_calls, model_spi))
+    print("Modeled speedup on the Pi: {:.1f}x".format(model_bitbang / model_spi))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
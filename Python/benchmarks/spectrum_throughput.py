@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# Throughput of the streaming spectrum analyzer in DevLib/Spectrum.py, on synthetic data.
+#
+# Author: Maurik Holtrop
+#
+# The same Welch PSD is computed in three ways:
+#  * naive     - each segment is cut from a Python list, windowed with a freshly computed window and
+#                transformed on its own, which is how a first version of such code usually looks.
+#  * streaming - StreamingSpectrum.push() with the data arriving in blocks of --block samples.
+#  * adc       - StreamingSpectrum.run() on an ADCSource, with a simulated ADC read function, to show the
+#                cost of reading one sample at a time from Python.
+# The results are checked to agree, and the throughput is printed in samples per second.
+#
+# Usage:   python3 spectrum_throughput.py --samples 2000000 --nfft 1024 --block 4096
+#
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+import numpy as np
+
+
+def load_spectrum():
+    """Load DevLib/Spectrum.py directly, without importing the hardware drivers in DevLib/__init__.py."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DevLib", "Spectrum.py")
+    spec = importlib.util.spec_from_file_location("Spectrum", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def naive_psd(data, nfft, hop, rate):
+    """Welch PSD, one segment at a time."""
+    samples = list(data)
+    total = None
+    count = 0
+    for start in range(0, len(samples) - nfft + 1, hop):
+        window = np.hanning(nfft + 1)[:nfft]
+        segment = np.array(samples[start:start + nfft]) * window
+        power = np.abs(np.fft.rfft(segment)) ** 2
+        total = power if total is None else total + power
+        count += 1
+    scale = np.full(nfft // 2 + 1, 2. / (rate * np.sum(window ** 2)))
+    scale[0] /= 2
+    if nfft % 2 == 0:
+        scale[-1] /= 2
+    return total / count * scale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of the streaming spectrum analyzer.")
+    parser.add_argument('--samples', type=int, default=2000000, help='Number of samples.')
+    parser.add_argument('--nfft', type=int, default=1024, help='FFT segment length.')
+    parser.add_argument('--block', type=int, default=4096, help='Block size for the streaming push.')
+    parser.add_argument('--rate', type=float, default=10000., help='Sample rate [Hz].')
+    args = parser.parse_args(argv)
+
+    spectrum = load_spectrum()
+    rng = np.random.default_rng(605)
+    t = np.arange(args.samples) / args.rate
+    data = np.sin(2 * np.pi * 1234.5 * t) + 0.1 * rng.standard_normal(args.samples)
+    results = []
+
+    start = time.perf_counter()
+    ref = naive_psd(data, args.nfft, args.nfft // 2, args.rate)
+    results.append(("naive", args.samples, time.perf_counter() - start))
+
+    spec = spectrum.StreamingSpectrum(args.nfft, args.rate)
+    start = time.perf_counter()
+    for i in range(0, args.samples, args.block):
+        spec.push(data[i:i + args.block])
+    results.append(("streaming", args.samples, time.perf_counter() - start))
+    if not np.allclose(spec.psd, ref):
+        raise RuntimeError("The streaming PSD does not agree with the naive PSD.")
+
+    n_adc = min(args.samples, 200000)
+    it = iter(data[:n_adc].tolist())
+    source = spectrum.ADCSource(lambda channel: next(it), rate=args.rate)
+    spec = spectrum.StreamingSpectrum(args.nfft, args.rate)
+    start = time.perf_counter()
+    spec.run(source, n_adc // args.block, block_size=args.block)
+    results.append(("adc", spec.n_samples, time.perf_counter() - start))
+
+    print("Welch PSD, nfft = {}, 50% overlap, Hann window.".format(args.nfft))
+    print("{:10s} {:>12s} {:>10s} {:>16s}".format("path", "samples", "time [s]", "samples/s"))
+    for name, n, elapsed in results:
+        print("{:10s} {:12d} {:10.3f} {:16.4g}".format(name, n, elapsed, n / elapsed))
+    print("Streaming speedup over naive: {:.1f}x".format((results[0][2] / results[0][1]) /
+                                                        (results[1][2] / results[1][1])))
+
+
+if __name__ == "__main__":
+    sys.exit(main())